@@ -1,2 +1,7 @@
 """SPLAT Exam Bot package"""
+from dotenv import load_dotenv
+
+# Before any module reads its settings from the environment at import
+load_dotenv()
+
 __version__ = "1.0.0"
@@ -1,5 +1,9 @@
 """Database package"""
-from .models import User, Question, UserAnswer, Quiz, Base
+from .models import (
+    User, Question, UserAnswer, Quiz, ReviewState, CoverageState,
+    Broadcast, BlockedUser, DailyChallengeQuestion, AnswerRollup, RollupState,
+    QuestionStats, Base
+)
 from .db import init_db, get_session, close_db, engine, async_session_maker
 
 __all__ = [
@@ -7,6 +11,14 @@ __all__ = [
     "Question",
     "UserAnswer",
     "Quiz",
+    "ReviewState",
+    "CoverageState",
+    "Broadcast",
+    "BlockedUser",
+    "DailyChallengeQuestion",
+    "AnswerRollup",
+    "RollupState",
+    "QuestionStats",
     "Base",
     "init_db",
     "get_session",
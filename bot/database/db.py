@@ -3,6 +3,7 @@ import os
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from .models import Base
+from .query_counter import install_query_counter
 
 # Get database URL from environment
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///data/bot.db")
@@ -14,6 +15,9 @@ engine = create_async_engine(
     future=True
 )
 
+# Statement counting is a no-op unless a counter is active for the current task
+install_query_counter(engine)
+
 # Create session factory
 async_session_maker = async_sessionmaker(
     engine,
@@ -0,0 +1,296 @@
+"""Streaming export of answers and statistics for offline analysis
+
+export() runs one dataset's query as a streamed result with yield_per, so
+rows come from the database cursor BATCH_SIZE at a time and are never all
+in memory. Each batch is formatted (CSV or JSON Lines, optionally gzipped)
+and written by a worker thread, so the event loop only waits for the
+database between batches. The file is written under a .part name and
+renamed when complete.
+
+Datasets:
+  answers  user_answers joined with their questions
+  users    per-user totals and streaks
+  items    question_stats (see bot.questions.item_analysis) with the questions
+
+With answer retention enabled, pruned answers are only in the archive
+files, not in the `answers` export.
+
+`python -m bot.database.export <dataset> <file.csv|file.jsonl>[.gz]`
+exports a dataset; `python -m bot.database.export bench [answers]`
+measures memory and event loop lag against loading the rows through the
+ORM.
+"""
+import asyncio
+import csv
+import gzip
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Sequence, Tuple
+
+from sqlalchemy import select
+
+from ..utils import codec
+from .models import Question, QuestionStats, User, UserAnswer
+
+# Rows per batch; each batch's Row objects are built on the event loop
+BATCH_SIZE = 1000
+
+
+def _answers():
+    return (
+        select(
+            UserAnswer.id,
+            UserAnswer.user_id,
+            UserAnswer.question_id,
+            Question.category,
+            Question.subcategory,
+            Question.difficulty,
+            UserAnswer.selected_answer,
+            Question.correct_answer,
+            UserAnswer.is_correct,
+            UserAnswer.answered_at,
+            UserAnswer.time_taken_seconds
+        )
+        .join(Question, Question.id == UserAnswer.question_id)
+        .order_by(UserAnswer.id)
+    )
+
+
+def _users():
+    return select(
+        User.id,
+        User.telegram_id,
+        User.username,
+        User.first_name,
+        User.created_at,
+        User.last_active,
+        User.total_questions_answered,
+        User.correct_answers,
+        User.current_streak,
+        User.best_streak
+    ).order_by(User.id)
+
+
+def _items():
+    return (
+        select(
+            QuestionStats.question_id,
+            Question.category,
+            Question.subcategory,
+            Question.difficulty,
+            QuestionStats.answers,
+            QuestionStats.p_value,
+            QuestionStats.discrimination,
+            QuestionStats.avg_time_seconds,
+            QuestionStats.suggested_difficulty,
+            QuestionStats.computed_at
+        )
+        .join(Question, Question.id == QuestionStats.question_id)
+        .order_by(QuestionStats.question_id)
+    )
+
+
+DATASETS: Dict[str, Callable] = {
+    'answers': _answers,
+    'users': _users,
+    'items': _items,
+}
+
+FORMATS = ('csv', 'jsonl')
+
+
+def output_format(path: Path) -> Tuple[str, bool]:
+    """(format, gzip) from a file name such as answers.csv.gz"""
+    suffixes = [suffix.lower() for suffix in path.suffixes]
+    compress = bool(suffixes) and suffixes[-1] == '.gz'
+    if compress:
+        suffixes.pop()
+    fmt = suffixes[-1].lstrip('.') if suffixes else ''
+    if fmt == 'ndjson':
+        fmt = 'jsonl'
+    if fmt not in FORMATS:
+        raise ValueError(f"Export file must end in .csv or .jsonl (optionally .gz): {path}")
+    return fmt, compress
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class _Writer:
+    """Incremental CSV/JSON Lines writer; used from a worker thread only"""
+
+    def __init__(self, path: Path, columns: Sequence[str]):
+        self.path = path
+        self.columns = list(columns)
+        self.format, compress = output_format(path)
+        self.tmp = path.with_name(path.name + '.part')
+        opener = gzip.open if compress else open
+        self.file = opener(self.tmp, 'wt', encoding='utf-8', newline='')
+        if self.format == 'csv':
+            self.csv = csv.writer(self.file)
+            self.csv.writerow(self.columns)
+
+    def write(self, rows: list):
+        if self.format == 'csv':
+            self.csv.writerows([_plain(value) for value in row] for row in rows)
+        else:
+            columns = self.columns
+            self.file.writelines(
+                codec.dumps_text(
+                    {name: _plain(value) for name, value in zip(columns, row)}
+                ) + '\n'
+                for row in rows
+            )
+
+    def close(self, complete: bool):
+        self.file.close()
+        if complete:
+            self.tmp.replace(self.path)
+        else:
+            self.tmp.unlink(missing_ok=True)
+
+
+async def export(
+    session_maker,
+    dataset: str,
+    path,
+    batch_size: int = BATCH_SIZE
+) -> int:
+    """Stream a dataset to a CSV or JSON Lines file; returns the row count"""
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown dataset {dataset!r}, expected one of {', '.join(DATASETS)}")
+    path = Path(path)
+    output_format(path)
+    statement = DATASETS[dataset]().execution_options(yield_per=batch_size)
+    columns = [column.name for column in statement.selected_columns]
+
+    writer = await asyncio.to_thread(_Writer, path, columns)
+    count = 0
+    complete = False
+    try:
+        async with session_maker() as session:
+            result = await session.stream(statement)
+            async for rows in result.partitions():
+                await asyncio.to_thread(writer.write, rows)
+                count += len(rows)
+        complete = True
+    finally:
+        await asyncio.to_thread(writer.close, complete)
+    return count
+
+
+def _generate(path: str, answers: int, questions: int = 500, users: int = 2000):
+    import random
+    import sqlite3
+
+    rng = random.Random(7)
+    connection = sqlite3.connect(path)
+    connection.executemany(
+        "INSERT INTO questions (id, category, question_text, option_a, option_b, "
+        "correct_answer, explanation, difficulty) VALUES (?, 'lexer', ?, 'a', 'b', 'A', '', "
+        "'medium')",
+        [(i + 1, f"Question {i + 1}") for i in range(questions)]
+    )
+    connection.executemany(
+        "INSERT INTO users (id, telegram_id, first_name, total_questions_answered, "
+        "correct_answers, current_streak, best_streak) VALUES (?, ?, ?, 0, 0, 0, 0)",
+        [(i + 1, 10_000 + i, f"User {i + 1}") for i in range(users)]
+    )
+    now = datetime.utcnow()
+    batch = 100_000
+    for start in range(0, answers, batch):
+        connection.executemany(
+            "INSERT INTO user_answers (user_id, question_id, selected_answer, is_correct, "
+            "answered_at, time_taken_seconds) VALUES (?, ?, 'A', ?, ?, ?)",
+            [
+                (rng.randrange(users) + 1, rng.randrange(questions) + 1, rng.random() < 0.6,
+                 now.isoformat(sep=' '), rng.randrange(5, 120))
+                for _ in range(min(batch, answers - start))
+            ]
+        )
+    connection.commit()
+    connection.close()
+
+
+async def _measure(label: str, job) -> None:
+    """Run a job twice: timed with a 10 ms ticker, then under tracemalloc"""
+    import time
+    import tracemalloc
+
+    lags = []
+
+    async def ticker():
+        while True:
+            expected = time.perf_counter() + 0.01
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - expected)
+
+    tick = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    rows = await job()
+    elapsed = time.perf_counter() - start
+    tick.cancel()
+
+    tracemalloc.start()
+    await job()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99)] if lags else 0.0
+    worst = lags[-1] if lags else 0.0
+    print(f"{label:<24}{rows:>9} rows {elapsed:7.2f} s   peak {peak / 2 ** 20:7.1f} MiB   "
+          f"loop lag p99 {p99 * 1000:6.1f} ms  max {worst * 1000:6.1f} ms")
+
+
+async def _benchmark(answers: int):
+    import os
+    import tempfile
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from .models import Base
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        _generate(path, answers)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        print(f"{answers} synthetic answers")
+
+        async def orm_load():
+            async with session_maker() as session:
+                result = await session.execute(
+                    select(UserAnswer, Question)
+                    .join(Question, Question.id == UserAnswer.question_id)
+                )
+                return len(result.all())
+
+        await _measure("ORM load into memory", orm_load)
+        for name in ("answers.csv.gz", "answers.jsonl"):
+            target = os.path.join(directory, name)
+            await _measure(f"export {name}", lambda: export(session_maker, "answers", target))
+            print(f"{'':<24}{os.path.getsize(target) / 2 ** 20:9.1f} MiB written")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "bench":
+        asyncio.run(_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 200_000))
+    elif command in DATASETS and len(sys.argv) > 2:
+        from .db import async_session_maker, init_db, close_db
+
+        async def _main(dataset: str, target: str):
+            await init_db()
+            rows = await export(async_session_maker, dataset, target)
+            await close_db()
+            print(f"Exported {rows} {dataset} rows to {target}")
+
+        asyncio.run(_main(command, sys.argv[2]))
+    else:
+        print("usage: python -m bot.database.export "
+              "[answers|users|items <file.csv|file.jsonl>[.gz] | bench [answers]]")
+        sys.exit(2)
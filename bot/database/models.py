@@ -1,6 +1,8 @@
 """Database models for SPLAT Exam Bot"""
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, Text, ForeignKey
+from sqlalchemy import (
+    Column, Integer, String, DateTime, Boolean, Float, Text, ForeignKey, LargeBinary
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -120,3 +122,89 @@ class Quiz(Base):
     def is_completed(self) -> bool:
         """Check if quiz is completed"""
         return self.completed_at is not None
+
+
+class ReviewState(Base):
+    """Packed spaced-repetition state (Leitner boxes and due times) per user"""
+    __tablename__ = "review_states"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class CoverageState(Base):
+    """Packed bitsets of the questions each quiz pool has served a user"""
+    __tablename__ = "coverage_states"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class Broadcast(Base):
+    """An announcement to all users and how far sending it has got"""
+    __tablename__ = "broadcasts"
+
+    id = Column(Integer, primary_key=True)
+    text = Column(Text, nullable=False)  # HTML
+    created_by = Column(Integer, nullable=False)  # admin telegram_id
+    created_at = Column(DateTime, default=datetime.utcnow)
+    status = Column(String(20), default="running", nullable=False)  # running, done, cancelled
+    last_user_id = Column(Integer, default=0, nullable=False)  # users.id checkpoint
+    sent = Column(Integer, default=0, nullable=False)
+    blocked = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class BlockedUser(Base):
+    """Users who blocked the bot or deleted their account; skipped by broadcasts"""
+    __tablename__ = "blocked_users"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    blocked_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DailyChallengeQuestion(Base):
+    """One question of a day's shared challenge with its running results"""
+    __tablename__ = "daily_challenge_questions"
+
+    day = Column(String(10), primary_key=True)  # YYYY-MM-DD (UTC)
+    position = Column(Integer, primary_key=True)
+    question_id = Column(Integer, ForeignKey("questions.id"), nullable=False)
+    answered = Column(Integer, default=0, nullable=False)
+    correct = Column(Integer, default=0, nullable=False)
+
+
+class AnswerRollup(Base):
+    """Answers of one user in one category on one day, folded from user_answers"""
+    __tablename__ = "answer_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(String(10), primary_key=True)  # YYYY-MM-DD (UTC)
+    category = Column(String(50), primary_key=True)
+    answered = Column(Integer, default=0, nullable=False)
+    correct = Column(Integer, default=0, nullable=False)
+
+
+class RollupState(Base):
+    """Watermark of a rollup job: rows up to last_id are folded in"""
+    __tablename__ = "rollup_state"
+
+    name = Column(String(50), primary_key=True)
+    last_id = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class QuestionStats(Base):
+    """Item statistics computed from user_answers by the item-analysis job"""
+    __tablename__ = "question_stats"
+
+    question_id = Column(Integer, ForeignKey("questions.id"), primary_key=True)
+    answers = Column(Integer, default=0, nullable=False)
+    p_value = Column(Float, nullable=True)  # share of correct answers
+    discrimination = Column(Float, nullable=True)  # point-biserial vs. rest ability
+    avg_time_seconds = Column(Float, nullable=True)
+    suggested_difficulty = Column(String(20), nullable=True)
+    computed_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,143 @@
+"""SQL statement and connection checkout counting for N+1 detection and query budgets"""
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Maximum number of statements a handler may issue for one update.
+# Worst case counts include creating the user row on first contact and
+# bootstrapping the review queue from answer history.
+HANDLER_QUERY_BUDGETS = {
+    'cmd_start': 2,
+    # user row and coverage state created on first contact: 2 + 2, questions, quiz
+    'start_quiz': 6,
+    # a cold review queue is loaded or replayed from history and inserted (+3),
+    # and a daily challenge answer is counted (+1)
+    'process_answer': 8,
+    'next_question': 1,
+    'end_quiz_callback': 2,
+    'process_poll_answer': 3,
+    'cmd_stats': 2,
+    'show_stats_callback': 2,
+    # the day's set generated (read, insert), user created, attempts counted
+    'cmd_daily': 7,
+    'daily_challenge_callback': 7,
+    'cmd_leaderboard': 2,
+    'show_leaderboard_callback': 2,
+    'cmd_search': 0,
+    'search_page_callback': 0,
+    'search_question_callback': 1,
+}
+
+_current_counter: ContextVar[Optional["QueryCounter"]] = ContextVar(
+    "query_counter", default=None
+)
+_installed_engines = set()
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_IN_LIST_RE = re.compile(r"IN \((?:\?|:\w+|%s)(?:, (?:\?|:\w+|%s))*\)", re.IGNORECASE)
+_POSTCOMPILE_RE = re.compile(r"\(__\[POSTCOMPILE_\w+\]\)")
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block issues more SQL statements than its budget"""
+
+    def __init__(self, name: str, budget: int, statements: list):
+        self.name = name
+        self.budget = budget
+        self.statements = statements
+        listing = "\n".join(f"  {i + 1}. {stmt}" for i, stmt in enumerate(statements))
+        super().__init__(
+            f"{name} issued {len(statements)} SQL statements (budget {budget}):\n{listing}"
+        )
+
+
+def normalize_statement(statement: str) -> str:
+    """Reduce a SQL statement to its shape so repeats can be grouped"""
+    shape = _WHITESPACE_RE.sub(" ", statement).strip()
+    shape = _POSTCOMPILE_RE.sub("(?)", shape)
+    return _IN_LIST_RE.sub("IN (?)", shape)
+
+
+class QueryCounter:
+    """Collect SQL statements executed within one unit of work"""
+
+    def __init__(self):
+        self.statements = []
+        self.checkouts = 0  # connections taken from the pool
+
+    def record(self, statement: str, executemany: bool = False):
+        """Record an executed statement"""
+        self.statements.append(_WHITESPACE_RE.sub(" ", statement).strip())
+
+    @property
+    def count(self) -> int:
+        """Number of statements issued"""
+        return len(self.statements)
+
+    def shapes(self) -> Counter:
+        """Statement shapes with the number of times each was issued"""
+        return Counter(normalize_statement(stmt) for stmt in self.statements)
+
+    def repeated(self) -> dict:
+        """Shapes issued more than once - the usual sign of an N+1 pattern"""
+        return {shape: n for shape, n in self.shapes().items() if n > 1}
+
+    def check_budget(self, budget: int, name: str = "block"):
+        """Raise QueryBudgetExceeded if more than budget statements were issued"""
+        if self.count > budget:
+            raise QueryBudgetExceeded(name, budget, list(self.statements))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    counter = _current_counter.get()
+    if counter is not None:
+        counter.record(statement, executemany)
+
+
+def _checkout(dbapi_connection, connection_record, connection_proxy):
+    counter = _current_counter.get()
+    if counter is not None:
+        counter.checkouts += 1
+
+
+def install_query_counter(engine: AsyncEngine):
+    """Attach the statement and checkout listeners to an engine (idempotent)"""
+    sync_engine = engine.sync_engine
+    if id(sync_engine) in _installed_engines:
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "checkout", _checkout)
+    _installed_engines.add(id(sync_engine))
+
+
+@contextmanager
+def count_queries():
+    """Count statements issued on instrumented engines inside the block
+
+    Counting follows the current asyncio task, so concurrent updates do not
+    mix their statements.
+    """
+    counter = QueryCounter()
+    token = _current_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _current_counter.reset(token)
+
+
+@contextmanager
+def query_budget(budget: int, name: str = "block"):
+    """Fail with the offending statement list if the block exceeds budget
+
+    Usage in tests:
+        with query_budget(HANDLER_QUERY_BUDGETS['process_answer'], 'process_answer'):
+            await process_answer(callback, state)
+    """
+    with count_queries() as counter:
+        yield counter
+    counter.check_budget(budget, name)
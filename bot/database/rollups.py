@@ -0,0 +1,275 @@
+"""Daily rollups and retention for user_answers
+
+roll_up() folds answers into (user, day, category) rows of answer_rollups.
+It walks user_answers by id from a watermark stored in rollup_state and
+only takes complete (UTC) days; each batch updates the rollups and the
+watermark in one transaction, so the job is incremental and can be stopped
+and restarted at any point.
+
+Readers combine rollups with the raw rows above the watermark in a single
+statement (answer_counts()), which gives exact totals whether or not the
+job has run. prune() removes raw rows that are both rolled up and older
+than the retention window, writing them to gzipped JSONL files first when
+an archive directory is configured.
+
+`python -m bot.database.rollups` runs one pass.
+"""
+import asyncio
+import gzip
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import select, delete, func, cast, union_all, Integer, String
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..utils import codec
+from .models import AnswerRollup, RollupState, UserAnswer, Question
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = 'user_answers'
+BATCH_SIZE = 5000
+
+
+_ARCHIVE_COLUMNS = (
+    'id', 'user_id', 'question_id', 'selected_answer', 'is_correct',
+    'answered_at', 'time_taken_seconds'
+)
+
+
+def _day(moment: Optional[datetime], fallback: str) -> str:
+    return moment.strftime('%Y-%m-%d') if moment is not None else fallback
+
+
+def _watermark():
+    """Scalar subquery: last user_answers id folded into the rollups"""
+    return (
+        select(func.coalesce(func.max(RollupState.last_id), 0))
+        .where(RollupState.name == JOB_NAME)
+        .scalar_subquery()
+    )
+
+
+def answer_counts(user_id: int = None):
+    """Per (user_id, category, day) answered/correct from rollups plus the raw tail
+
+    A subquery; the same day can appear twice (rolled up and tail) while the
+    job is catching up, so callers aggregate over it.
+    """
+    rolled = select(
+        AnswerRollup.user_id,
+        AnswerRollup.category,
+        AnswerRollup.day,
+        AnswerRollup.answered,
+        AnswerRollup.correct
+    )
+    day = func.substr(cast(UserAnswer.answered_at, String), 1, 10)
+    tail = (
+        select(
+            UserAnswer.user_id,
+            Question.category,
+            day.label('day'),
+            func.count(UserAnswer.id).label('answered'),
+            func.sum(cast(UserAnswer.is_correct, Integer)).label('correct')
+        )
+        .join(Question, UserAnswer.question_id == Question.id)
+        .where(UserAnswer.id > _watermark())
+        .group_by(UserAnswer.user_id, Question.category, day)
+    )
+    if user_id is not None:
+        rolled = rolled.where(AnswerRollup.user_id == user_id)
+        tail = tail.where(UserAnswer.user_id == user_id)
+    return union_all(rolled, tail).subquery('answer_counts')
+
+
+async def _state(session: AsyncSession) -> RollupState:
+    state = await session.get(RollupState, JOB_NAME)
+    if state is None:
+        state = RollupState(name=JOB_NAME, last_id=0)
+        session.add(state)
+    return state
+
+
+async def roll_up(
+    session: AsyncSession,
+    now: datetime = None,
+    batch_size: int = BATCH_SIZE
+) -> int:
+    """Fold answers from complete days into answer_rollups; returns rows folded"""
+    now = now or datetime.utcnow()
+    cutoff = datetime(now.year, now.month, now.day)
+    fallback_day = _day(cutoff - timedelta(days=1), '')
+    folded = 0
+
+    while True:
+        state = await _state(session)
+        result = await session.execute(
+            select(
+                UserAnswer.id,
+                UserAnswer.user_id,
+                Question.category,
+                UserAnswer.answered_at,
+                UserAnswer.is_correct
+            )
+            .join(Question, UserAnswer.question_id == Question.id)
+            .where(UserAnswer.id > state.last_id)
+            .order_by(UserAnswer.id)
+            .limit(batch_size)
+        )
+        rows = result.all()
+
+        # Stop at the first answer from today so the watermark stays contiguous
+        groups = {}
+        last_id = None
+        for answer_id, user_id, category, answered_at, is_correct in rows:
+            if answered_at is not None and answered_at >= cutoff:
+                break
+            key = (user_id, _day(answered_at, fallback_day), category)
+            counts = groups.setdefault(key, [0, 0])
+            counts[0] += 1
+            counts[1] += int(bool(is_correct))
+            last_id = answer_id
+
+        if last_id is None:
+            await session.commit()
+            return folded
+
+        user_ids = {key[0] for key in groups}
+        days = {key[1] for key in groups}
+        existing = await session.execute(
+            select(AnswerRollup)
+            .where(AnswerRollup.user_id.in_(user_ids), AnswerRollup.day.in_(days))
+        )
+        rollups = {
+            (row.user_id, row.day, row.category): row for row in existing.scalars()
+        }
+        for key, (answered, correct) in groups.items():
+            rollup = rollups.get(key)
+            if rollup is None:
+                user_id, day, category = key
+                session.add(AnswerRollup(
+                    user_id=user_id, day=day, category=category,
+                    answered=answered, correct=correct
+                ))
+            else:
+                rollup.answered += answered
+                rollup.correct += correct
+
+        state.last_id = last_id
+        await session.commit()
+        folded += sum(answered for answered, _ in groups.values())
+
+        if len(rows) < batch_size or last_id != rows[-1][0]:
+            return folded
+
+
+def _write_archive(path: Path, rows: list):
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+        for row in rows:
+            record = dict(zip(_ARCHIVE_COLUMNS, row))
+            if record['answered_at'] is not None:
+                record['answered_at'] = record['answered_at'].isoformat()
+            f.write(codec.dumps_text(record) + '\n')
+    tmp.replace(path)
+
+
+async def prune(
+    session: AsyncSession,
+    retention_days: int = 0,
+    archive_dir: str = "",
+    now: datetime = None,
+    batch_size: int = BATCH_SIZE
+) -> int:
+    """Archive and delete raw answers that are rolled up and past retention
+
+    retention_days=0 keeps every raw row; an empty archive_dir deletes
+    without archiving.
+    """
+    if retention_days <= 0:
+        return 0
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    directory = Path(archive_dir) if archive_dir else None
+    if directory is not None:
+        directory.mkdir(parents=True, exist_ok=True)
+    pruned = 0
+
+    while True:
+        state = await _state(session)
+        result = await session.execute(
+            select(*(getattr(UserAnswer, name) for name in _ARCHIVE_COLUMNS))
+            .where(UserAnswer.id <= state.last_id, UserAnswer.answered_at < cutoff)
+            .order_by(UserAnswer.id)
+            .limit(batch_size)
+        )
+        rows = result.all()
+        if not rows:
+            await session.commit()
+            return pruned
+
+        # File names come from the id range, so a retried batch overwrites its file
+        ids = [row[0] for row in rows]
+        if directory is not None:
+            path = directory / f"user_answers-{ids[0]:010d}-{ids[-1]:010d}.jsonl.gz"
+            await asyncio.to_thread(_write_archive, path, rows)
+
+        await session.execute(delete(UserAnswer).where(UserAnswer.id.in_(ids)))
+        await session.commit()
+        pruned += len(ids)
+
+
+def settings() -> dict:
+    """maintain() arguments from the environment, read when the task is started
+
+    ROLLUP_INTERVAL_MINUTES, ANSWER_RETENTION_DAYS (0 keeps raw rows) and
+    ANSWER_ARCHIVE_DIR (empty deletes without archiving).
+    """
+    return {
+        'interval': float(os.getenv("ROLLUP_INTERVAL_MINUTES", "60")) * 60,
+        'retention_days': int(os.getenv("ANSWER_RETENTION_DAYS", "0")),
+        'archive_dir': os.getenv("ANSWER_ARCHIVE_DIR", ""),
+    }
+
+
+async def run_once(session_maker, retention_days: int = 0, archive_dir: str = "") -> tuple:
+    """One rollup pass followed by retention; returns (folded, pruned)"""
+    async with session_maker() as session:
+        folded = await roll_up(session)
+        pruned = await prune(session, retention_days, archive_dir)
+    if folded or pruned:
+        logger.info(f"Rolled up {folded} answers, pruned {pruned}")
+    return folded, pruned
+
+
+async def maintain(
+    session_maker,
+    interval: float = 3600,
+    retention_days: int = 0,
+    archive_dir: str = ""
+):
+    """Run rollups and retention every `interval` seconds"""
+    while True:
+        try:
+            await run_once(session_maker, retention_days, archive_dir)
+        except Exception as e:
+            logger.error(f"Answer rollup failed: {e}", exc_info=True)
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    from .db import async_session_maker, init_db, close_db
+
+    async def _main():
+        await init_db()
+        options = settings()
+        folded, pruned = await run_once(
+            async_session_maker, options['retention_days'], options['archive_dir']
+        )
+        print(f"Rolled up {folded} answers, pruned {pruned}")
+        await close_db()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -1,4 +1,4 @@
 """Handlers package"""
-from . import start, quiz, stats
+from . import start, quiz, stats, leaderboard, daily, search, admin
 
-__all__ = ["start", "quiz", "stats"]
+__all__ = ["start", "quiz", "stats", "leaderboard", "daily", "search", "admin"]
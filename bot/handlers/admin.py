@@ -0,0 +1,173 @@
+"""Admin handlers: announcements, cache metrics, question reloads and profiling"""
+import os
+
+from aiogram import Bot, Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+
+from ..database.models import Broadcast
+from ..questions.reload import bank_watcher
+from ..utils.broadcast import broadcaster
+from ..utils.loop_monitor import loop_monitor
+from ..utils.profiler import (
+    DEFAULT_SECONDS, MAX_SECONDS, ProfileReport, format_report, profiler
+)
+from ..utils.readiness import DATABASE, QUESTIONS
+from ..utils.stats_cache import stats_views
+from ..utils.text import escape_html
+
+# Telegram ids allowed to use admin commands (comma or space separated)
+ADMIN_IDS = frozenset(int(part) for part in os.getenv("ADMIN_IDS", "").replace(",", " ").split())
+
+router = Router()
+router.message.filter(F.from_user.id.in_(ADMIN_IDS))
+
+USAGE_TEXT = (
+    "📣 <b>Broadcast</b>\n\n"
+    "<code>/broadcast &lt;text&gt;</code> - send a message to every user\n"
+    "<code>/broadcast_status [id]</code> - progress of a broadcast\n"
+    "<code>/broadcast_cancel &lt;id&gt;</code> - stop a broadcast"
+)
+
+
+def format_broadcast(broadcast: Broadcast) -> str:
+    """Progress summary of a broadcast"""
+    running = " (sending)" if broadcaster.is_running(broadcast.id) else ""
+    return (
+        f"📣 <b>Broadcast #{broadcast.id}</b>: {broadcast.status}{running}\n\n"
+        f"✅ Sent: {broadcast.sent}\n"
+        f"🚫 Blocked: {broadcast.blocked}\n"
+        f"❌ Failed: {broadcast.failed}"
+    )
+
+
+@router.message(Command("broadcast"))
+async def cmd_broadcast(message: Message, bot: Bot):
+    """Handle /broadcast <text>: send the text (with its formatting) to every user"""
+    parts = message.html_text.split(maxsplit=1)
+    if len(parts) < 2:
+        await message.answer(USAGE_TEXT, parse_mode="HTML")
+        return
+
+    broadcast = await broadcaster.create(parts[1], message.from_user.id)
+    broadcaster.start(bot, broadcast.id)
+    await message.answer(
+        f"📣 Broadcast #{broadcast.id} started.\n"
+        f"Check it with /broadcast_status {broadcast.id}"
+    )
+
+
+@router.message(Command("broadcast_status"))
+async def cmd_broadcast_status(message: Message, command: CommandObject):
+    """Handle /broadcast_status [id] (the latest broadcast by default)"""
+    args = (command.args or "").strip()
+    if args and not args.isdigit():
+        await message.answer(USAGE_TEXT, parse_mode="HTML")
+        return
+
+    broadcast = await broadcaster.get(int(args) if args else None)
+    if broadcast is None:
+        await message.answer("No such broadcast.")
+        return
+    await message.answer(format_broadcast(broadcast), parse_mode="HTML")
+
+
+@router.message(Command("broadcast_cancel"))
+async def cmd_broadcast_cancel(message: Message, command: CommandObject):
+    """Handle /broadcast_cancel <id>"""
+    args = (command.args or "").strip()
+    if not args.isdigit():
+        await message.answer(USAGE_TEXT, parse_mode="HTML")
+        return
+
+    if await broadcaster.cancel(int(args)):
+        await message.answer(f"🛑 Broadcast #{args} cancelled.")
+    else:
+        await message.answer(f"Broadcast #{args} is not running.")
+
+
+@router.message(Command("cache_stats"), flags={"requires": ()})
+async def cmd_cache_stats(message: Message):
+    """Handle /cache_stats: hit ratio of the stats view cache"""
+    metrics = stats_views.metrics()
+    await message.answer(
+        f"🗂 <b>Stats view cache</b>\n\n"
+        f"Users: {metrics['users']}/{stats_views.max_users}\n"
+        f"Hits: {metrics['hits']}  Misses: {metrics['misses']}\n"
+        f"Hit ratio: {metrics['hit_ratio'] * 100:.1f}%\n"
+        f"Evictions: {metrics['evictions']}",
+        parse_mode="HTML"
+    )
+
+
+@router.message(Command("reload_questions"), flags={"requires": (DATABASE, QUESTIONS)})
+async def cmd_reload_questions(message: Message):
+    """Handle /reload_questions: apply the question JSON files without a restart"""
+    try:
+        diff = await bank_watcher.reload(force=True)
+    except Exception as e:
+        await message.answer(f"❌ Reload failed, questions unchanged: {escape_html(str(e))}",
+                             parse_mode="HTML")
+        return
+
+    if diff is None:
+        await message.answer("⏳ The changes are not in the database yet, try again shortly.")
+        return
+    await message.answer(
+        f"🔄 <b>Questions reloaded</b>\n\n"
+        f"➕ New: {diff.inserted}\n"
+        f"✏️ Changed: {diff.updated}\n"
+        f"➖ Removed: {diff.retired}",
+        parse_mode="HTML"
+    )
+
+
+@router.message(Command("profile"), flags={"requires": ()})
+async def cmd_profile(message: Message, command: CommandObject, bot: Bot):
+    """Handle /profile [seconds]: sample the event loop and report where time goes"""
+    args = (command.args or "").strip()
+    try:
+        seconds = float(args) if args else DEFAULT_SECONDS
+    except ValueError:
+        seconds = 0
+    if not 0 < seconds <= MAX_SECONDS:
+        await message.answer(f"Usage: /profile [seconds], at most {MAX_SECONDS:g}")
+        return
+
+    chat_id = message.chat.id
+
+    async def notify(report: ProfileReport):
+        await bot.send_message(
+            chat_id,
+            f"🔬 <b>Profile</b>\n\n<pre>{escape_html(format_report(report))}</pre>",
+            parse_mode="HTML"
+        )
+
+    try:
+        profiler.start(seconds, notify)
+    except RuntimeError as e:
+        await message.answer(f"❌ {e}")
+        return
+    await message.answer(f"🔬 Profiling the bot for {seconds:g}s...")
+
+
+@router.message(Command("loop_stats"), flags={"requires": ()})
+async def cmd_loop_stats(message: Message):
+    """Handle /loop_stats: event loop lag and the last stall"""
+    metrics = loop_monitor.metrics()
+    if not loop_monitor.running:
+        await message.answer("The event loop monitor is off (LOOP_STALL_MS=0).")
+        return
+
+    text = (
+        f"⏱ <b>Event loop</b>\n\n"
+        f"Lag p50: {metrics['lag_p50_ms']:.1f} ms  p99: {metrics['lag_p99_ms']:.1f} ms\n"
+        f"Max lag: {metrics['lag_max_ms']:.0f} ms\n"
+        f"Stalls over {loop_monitor.threshold * 1000:.0f} ms: {metrics['stalls']}"
+    )
+    if metrics['last_stall_owner'] is not None:
+        text += (
+            f"\nLast: {metrics['last_stall_ms']:.0f} ms in "
+            f"<code>{escape_html(metrics['last_stall_owner'])}</code>"
+        )
+    await message.answer(text, parse_mode="HTML")
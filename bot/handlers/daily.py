@@ -0,0 +1,111 @@
+"""Daily challenge handlers"""
+from datetime import datetime
+
+from aiogram import Router, F
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message, CallbackQuery
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import User, Quiz
+from ..keyboards.inline import get_back_button
+from ..questions.daily import daily_challenges, today
+from ..utils.readiness import DATABASE, QUESTIONS
+from .quiz import QuizStates, show_question
+
+router = Router()
+
+REQUIRES_QUESTIONS = {"requires": (DATABASE, QUESTIONS)}
+
+
+async def start_daily_challenge(
+    message: Message,
+    from_user,
+    state: FSMContext,
+    session: AsyncSession,
+    edit: bool
+):
+    """Start today's shared challenge for a user"""
+    day = today()
+
+    challenge = await daily_challenges.get(session, day)
+
+    if not challenge.question_ids:
+        text = "❌ The daily challenge is not available yet. Please try again later."
+        if edit:
+            await message.edit_text(text, reply_markup=get_back_button())
+        else:
+            await message.answer(text, reply_markup=get_back_button())
+        return
+
+    try:
+        # Get or create user
+        user_result = await session.execute(
+            select(User).where(User.telegram_id == from_user.id)
+        )
+        user = user_result.scalar_one_or_none()
+
+        if not user:
+            user = User(
+                telegram_id=from_user.id,
+                username=from_user.username,
+                first_name=from_user.first_name
+            )
+            session.add(user)
+            await session.flush()  # Flush to get user.id
+
+        # Only the first attempt of the day counts towards today's results
+        day_start = datetime.strptime(day, '%Y-%m-%d')
+        attempts = await session.scalar(
+            select(func.count(Quiz.id)).where(
+                Quiz.user_id == user.id,
+                Quiz.quiz_type == 'daily',
+                Quiz.started_at >= day_start
+            )
+        )
+
+        quiz = Quiz(
+            user_id=user.id,
+            quiz_type='daily',
+            category='daily',
+            total_questions=len(challenge.question_ids)
+        )
+        session.add(quiz)
+        await session.commit()
+    except Exception:
+        # A day generated by this request was rolled back with it
+        daily_challenges.forget(day)
+        raise
+
+    await state.update_data(
+        quiz_id=quiz.id,
+        questions=list(challenge.question_ids),
+        current_index=0,
+        correct_count=0,
+        start_time=datetime.utcnow().timestamp(),
+        daily_day=day,
+        daily_counted=attempts == 0
+    )
+
+    await state.set_state(QuizStates.in_quiz)
+    await show_question(message, state, session, edit=edit)
+
+
+@router.message(Command("daily"), flags=REQUIRES_QUESTIONS)
+async def cmd_daily(message: Message, state: FSMContext, session: AsyncSession):
+    """Handle /daily command"""
+    await start_daily_challenge(message, message.from_user, state, session, edit=False)
+
+
+@router.callback_query(F.data == "daily_challenge", flags=REQUIRES_QUESTIONS)
+async def daily_challenge_callback(
+    callback: CallbackQuery,
+    state: FSMContext,
+    session: AsyncSession
+):
+    """Start the daily challenge from the menu"""
+    await start_daily_challenge(
+        callback.message, callback.from_user, state, session, edit=True
+    )
+    await callback.answer()
@@ -0,0 +1,77 @@
+"""Leaderboard handlers"""
+from aiogram import Router, F
+from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..keyboards.inline import get_leaderboard_keyboard, LEADERBOARD_BOARDS
+from ..utils.leaderboard import leaderboards, GLOBAL_BOARD
+from ..utils.text import escape_html
+from ..utils.readiness import DATABASE, LEADERBOARDS
+
+router = Router()
+
+TOP_N = 10
+MEDALS = {1: "🥇", 2: "🥈", 3: "🥉"}
+REQUIRES_LEADERBOARDS = {"requires": (DATABASE, LEADERBOARDS)}
+
+
+def format_leaderboard(category: str, telegram_id: int) -> str:
+    """Format a leaderboard with the caller's own rank"""
+    board = leaderboards.board(category)
+    title = LEADERBOARD_BOARDS.get(category, category.capitalize())
+
+    text = f"🏆 <b>Leaderboard - {title}</b>\n<i>Ranked by correct answers</i>\n\n"
+
+    top = board.top(TOP_N)
+    if not top:
+        text += "<i>No one is ranked here yet. Be the first!</i>\n"
+
+    for member, score in top:
+        rank = board.rank(member)
+        place = MEDALS.get(rank, f"{rank}.")
+        name = escape_html(leaderboards.names.get(member, str(member)))
+        you = " ← you" if member == telegram_id else ""
+        text += f"{place} {name} - <b>{score}</b>{you}\n"
+
+    rank = board.rank(telegram_id)
+    if rank is None:
+        text += "\n📍 You are not ranked yet. Answer a question correctly to join!"
+    else:
+        text += (
+            f"\n📍 <b>Your rank:</b> #{rank} of {len(board)} "
+            f"({board.score(telegram_id)} correct)"
+        )
+    return text
+
+
+@router.message(Command("leaderboard"), flags=REQUIRES_LEADERBOARDS)
+async def cmd_leaderboard(message: Message, session: AsyncSession):
+    """Show the global leaderboard"""
+    if not leaderboards.loaded:
+        await leaderboards.ensure_loaded(session)
+
+    await message.answer(
+        format_leaderboard(GLOBAL_BOARD, message.from_user.id),
+        reply_markup=get_leaderboard_keyboard(),
+        parse_mode="HTML"
+    )
+
+
+@router.callback_query(F.data.startswith("lb_"), flags=REQUIRES_LEADERBOARDS)
+async def show_leaderboard_callback(callback: CallbackQuery, session: AsyncSession):
+    """Show the global or a per-category leaderboard"""
+    category = callback.data[len("lb_"):]
+    if category not in LEADERBOARD_BOARDS:
+        await callback.answer()
+        return
+
+    if not leaderboards.loaded:
+        await leaderboards.ensure_loaded(session)
+
+    await callback.message.edit_text(
+        format_leaderboard(category, callback.from_user.id),
+        reply_markup=get_leaderboard_keyboard(),
+        parse_mode="HTML"
+    )
+    await callback.answer()
@@ -1,34 +1,42 @@
 """Quiz handlers"""
-from aiogram import Router, F
-from aiogram.types import CallbackQuery
+import os
+import random
+import time
+from dataclasses import replace
+from aiogram import Bot
+from aiogram.filters import Command
+from aiogram.types import CallbackQuery, Message, PollAnswer
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.utils.markdown import html_decoration as hd
-from sqlalchemy import select
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
+from typing import Optional
 
 from ..database.models import User, UserAnswer, Quiz
-from ..database.db import async_session_maker
+from ..questions.catalog import get_catalog, question_html
+from ..questions.coverage import coverage_store
 from ..questions.loader import QuestionLoader
+from ..questions.review import review_store
+from ..questions.daily import daily_challenges
+from ..questions.answer_writer import answer_writer, AnswerRecord
+from ..utils.leaderboard import leaderboards
+from ..utils.stats_cache import stats_views
+from ..utils.text import escape_html
+from ..utils.readiness import DATABASE, QUESTIONS
+from ..utils.callbacks import CallbackRouter, Action, AnswerPayload
+from ..utils.polls import poll_map, PollEntry
 from ..keyboards.inline import (
     get_answer_options,
     get_explanation_keyboard,
+    get_poll_keyboard,
     get_back_button,
     get_main_menu
 )
 
-router = Router()
-
-
-def escape_html(text: str) -> str:
-    """Escape HTML special characters"""
-    if not text:
-        return ""
-    return (text
-            .replace("&", "&amp;")
-            .replace("<", "&lt;")
-            .replace(">", "&gt;")
-            .replace('"', "&quot;"))
+# Quiz callbacks are resolved by dict lookup instead of the filter chain
+router = CallbackRouter()
 
 
 class QuizStates(StatesGroup):
@@ -38,6 +46,60 @@ class QuizStates(StatesGroup):
     viewing_explanation = State()
 
 
+ALREADY_ANSWERED_TEXT = "Already answered"
+
+# Quiz mode for users who never used /polls: "buttons" or "polls"
+QUIZ_MODE = os.getenv("QUIZ_MODE", "buttons")
+SETTINGS_DESTINY = "settings"
+
+# Telegram limits for quiz polls
+POLL_QUESTION_LENGTH = 300
+POLL_OPTION_LENGTH = 100
+POLL_EXPLANATION_LENGTH = 200
+
+
+def answer_key(data: dict) -> Optional[list]:
+    """Idempotency key of the current question: [quiz_id, question index]
+
+    Stored as `answered_key` in the FSM data once an answer is accepted; a
+    list so it round-trips through JSON-serializing storages.
+    """
+    if 'questions' not in data or 'current_index' not in data:
+        return None
+    return [data.get('quiz_id'), data['current_index']]
+
+
+def _settings(state: FSMContext) -> FSMContext:
+    """Per-user settings, stored apart from quiz data so state.clear() keeps them"""
+    return FSMContext(storage=state.storage, key=replace(state.key, destiny=SETTINGS_DESTINY))
+
+
+async def poll_mode_enabled(state: FSMContext) -> bool:
+    """Whether the user gets questions as Telegram quiz polls"""
+    data = await _settings(state).get_data()
+    return data.get('quiz_mode', QUIZ_MODE) == 'polls'
+
+
+def _truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+@router.message(Command("polls"), flags={"requires": ()})
+async def cmd_polls(message: Message, state: FSMContext):
+    """Handle /polls: switch between answer buttons and quiz polls"""
+    enabled = not await poll_mode_enabled(state)
+    await _settings(state).update_data(quiz_mode='polls' if enabled else 'buttons')
+    if enabled:
+        text = (
+            "📊 <b>Poll mode on</b>\n\n"
+            "Questions now arrive as Telegram quiz polls: tap an option to answer "
+            "and the next question follows right away. Send /polls again for buttons."
+        )
+    else:
+        text = "🔘 <b>Poll mode off</b>\n\nQuestions use answer buttons again."
+    await message.answer(text, parse_mode="HTML")
+
+
 # Mapping of callback_data to category/subcategory
 QUIZ_CATEGORIES = {
     'quiz_lexer': ('lexer', None),
@@ -47,6 +109,7 @@ QUIZ_CATEGORIES = {
     'quiz_cfg': ('cfg', None),
     'quiz_java': ('java', None),
     'quiz_mixed': (None, None),
+    'quiz_review': ('review', None),
     'splat_badlex': ('lexer', 'badlex'),
     'splat_badparse': ('parser', 'badparse'),
     'splat_badsemantics': ('semantics', 'badsemantics'),
@@ -56,73 +119,98 @@ QUIZ_CATEGORIES = {
 }
 
 
-@router.callback_query(F.data.in_(QUIZ_CATEGORIES.keys()))
-async def start_quiz(callback: CallbackQuery, state: FSMContext):
+@router.callback_query.exact(*QUIZ_CATEGORIES, flags={"requires": (DATABASE, QUESTIONS)})
+async def start_quiz(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Start a quiz based on selected category"""
     category, subcategory = QUIZ_CATEGORIES[callback.data]
 
-    async with async_session_maker() as session:
-        loader = QuestionLoader()
+    loader = QuestionLoader()
 
+    # Get or create user
+    user_result = await session.execute(
+        select(User).where(User.telegram_id == callback.from_user.id)
+    )
+    user = user_result.scalar_one_or_none()
+
+    if not user:
+        user = User(
+            telegram_id=callback.from_user.id,
+            username=callback.from_user.username,
+            first_name=callback.from_user.first_name
+        )
+        session.add(user)
+        await session.flush()  # Flush to get user.id
+
+    try:
         # Load questions based on category/subcategory
-        if callback.data == 'splat_random':
+        if callback.data == 'quiz_review':
+            # Questions due in the user's spaced-repetition queue
+            question_ids = await review_store.due_question_ids(session, user.id, limit=10)
+            # Skip questions removed from the bank since they were answered
+            catalog = get_catalog()
+            question_ids = [qid for qid in question_ids if catalog is None or qid in catalog]
+            questions = await loader.get_questions_by_ids(session, question_ids)
+        elif callback.data == 'splat_random':
             # Special handling for random SPLAT tests
-            questions = await loader.get_splat_random_questions(session, limit=20)
+            questions = await loader.get_splat_random_questions(
+                session, limit=20, user_id=user.id
+            )
         elif subcategory:
-            questions = await loader.get_questions_by_subcategory(session, subcategory, limit=10)
+            questions = await loader.get_questions_by_subcategory(
+                session, subcategory, limit=10, user_id=user.id
+            )
         elif category:
-            questions = await loader.get_questions_by_category(session, category, limit=10)
-        else:
-            questions = await loader.get_random_questions(session, limit=10)
-
-        if not questions:
-            await callback.message.edit_text(
-                "❌ No questions available for this category yet.\n\n"
-                "Please try another topic or contact the developer.",
-                reply_markup=get_back_button()
+            questions = await loader.get_questions_by_category(
+                session, category, limit=10, user_id=user.id
             )
-            await callback.answer()
-            return
-
-        # Get or create user
-        user_result = await session.execute(
-            select(User).where(User.telegram_id == callback.from_user.id)
-        )
-        user = user_result.scalar_one_or_none()
-
-        if not user:
-            user = User(
-                telegram_id=callback.from_user.id,
-                username=callback.from_user.username,
-                first_name=callback.from_user.first_name
+        else:
+            questions = await loader.get_random_questions(session, limit=10, user_id=user.id)
+
+        if questions:
+            quiz = Quiz(
+                user_id=user.id,
+                quiz_type='review' if callback.data == 'quiz_review' else 'topic',
+                category=category or 'mixed',
+                total_questions=len(questions)
             )
-            session.add(user)
-            await session.flush()  # Flush to get user.id
-
-        quiz = Quiz(
-            user_id=user.id,
-            quiz_type='topic',
-            category=category or 'mixed',
-            total_questions=len(questions)
-        )
-        session.add(quiz)
+            session.add(quiz)
         await session.commit()
+    except Exception:
+        # The cached coverage already counts the rolled back draw as seen
+        coverage_store.forget(user.id)
+        raise
+
+    if not questions:
+        if callback.data == 'quiz_review':
+            text = (
+                "🔁 Nothing is due for review right now.\n\n"
+                "Questions you answer in other quizzes come back here "
+                "when it is time to review them."
+            )
+        else:
+            text = (
+                "❌ No questions available for this category yet.\n\n"
+                "Please try another topic or contact the developer."
+            )
+        await callback.message.edit_text(text, reply_markup=get_back_button())
+        await callback.answer()
+        return
 
-        # Store quiz data in state
-        await state.update_data(
-            quiz_id=quiz.id,
-            questions=[q.id for q in questions],
-            current_index=0,
-            correct_count=0,
-            start_time=datetime.utcnow().timestamp()
-        )
+    # Store quiz data in state
+    await state.update_data(
+        quiz_id=quiz.id,
+        questions=[q.id for q in questions],
+        current_index=0,
+        correct_count=0,
+        start_time=datetime.utcnow().timestamp()
+    )
 
     await state.set_state(QuizStates.in_quiz)
-    await show_question(callback.message, state, edit=True)
+    await show_question(callback.message, state, session, edit=True)
     await callback.answer()
 
 
-async def show_question(message, state: FSMContext, edit: bool = False):
+async def show_question(message, state: FSMContext, session: AsyncSession, edit: bool = False):
     """Show current question"""
     data = await state.get_data()
 
@@ -136,56 +224,77 @@ async def show_question(message, state: FSMContext, edit: bool = False):
         await state.clear()
         return
 
+    if await poll_mode_enabled(state):
+        await send_poll_question(message.bot, message.chat.id, state, session)
+        return
+
     current_index = data['current_index']
     questions = data['questions']
 
     if current_index >= len(questions):
         # Quiz complete
-        await end_quiz(message, state, edit=edit)
+        await end_quiz(message, state, session, edit=edit)
         return
 
-    async with async_session_maker() as session:
-        loader = QuestionLoader()
-        question = await loader.get_question_by_id(session, questions[current_index])
+    loader = QuestionLoader()
+    question = await loader.get_question_by_id(session, questions[current_index])
 
-        # Format question text
-        question_text = f"📝 <b>Question {current_index + 1}/{len(questions)}</b>\n\n"
+    # Format question text
+    question_text = f"📝 <b>Question {current_index + 1}/{len(questions)}</b>\n\n"
+    text_html, code_html, _ = question_html(question)
 
-        if question.code:
-            question_text += f"<b>{escape_html(question.question_text)}</b>\n\n"
-            question_text += f"<pre>{escape_html(question.code)}</pre>\n\n"
-        else:
-            question_text += f"{escape_html(question.question_text)}\n\n"
+    if question.code:
+        question_text += f"<b>{text_html}</b>\n\n"
+        question_text += f"<pre>{code_html}</pre>\n\n"
+    else:
+        question_text += f"{text_html}\n\n"
 
-        question_text += "Select your answer:"
+    question_text += "Select your answer:"
 
-        if edit:
-            await message.edit_text(
-                question_text,
-                reply_markup=get_answer_options(question),
-                parse_mode="HTML"
-            )
-        else:
-            await message.answer(
-                question_text,
-                reply_markup=get_answer_options(question),
-                parse_mode="HTML"
-            )
+    if edit:
+        await message.edit_text(
+            question_text,
+            reply_markup=get_answer_options(question),
+            parse_mode="HTML"
+        )
+    else:
+        await message.answer(
+            question_text,
+            reply_markup=get_answer_options(question),
+            parse_mode="HTML"
+        )
 
 
-@router.callback_query(F.data.startswith("answer_"))
-async def process_answer(callback: CallbackQuery, state: FSMContext):
+@router.callback_query.action(Action.ANSWER)
+async def process_answer(
+    callback: CallbackQuery,
+    state: FSMContext,
+    payload: AnswerPayload,
+    session: AsyncSession
+):
     """Process user's answer"""
-    # Parse callback data: answer_{question_id}_{selected_option}
-    parts = callback.data.split('_')
-    question_id = int(parts[1])
-    selected_option = parts[2]
+    question_id, selected_option = payload
 
     data = await state.get_data()
+
+    # A double tap or a stale button: acknowledge without touching the database
+    key = answer_key(data)
+    if key is not None:
+        questions, index = data['questions'], data['current_index']
+        if (
+            data.get('answered_key') == key
+            or index >= len(questions)
+            or questions[index] != question_id
+        ):
+            await callback.answer(ALREADY_ANSWERED_TEXT)
+            return
+        await state.update_data(answered_key=key)
+
     current_time = datetime.utcnow().timestamp()
     time_taken = int(current_time - data.get('question_start_time', current_time))
 
-    async with async_session_maker() as session:
+    user_id = None
+    try:
         # Get question
         loader = QuestionLoader()
         question = await loader.get_question_by_id(session, question_id)
@@ -193,11 +302,6 @@ async def process_answer(callback: CallbackQuery, state: FSMContext):
         # Check if answer is correct
         is_correct = (selected_option == question.correct_answer)
 
-        # Update state
-        if is_correct:
-            correct_count = data.get('correct_count', 0) + 1
-            await state.update_data(correct_count=correct_count)
-
         # Get or create user
         user_result = await session.execute(
             select(User).where(User.telegram_id == callback.from_user.id)
@@ -212,10 +316,15 @@ async def process_answer(callback: CallbackQuery, state: FSMContext):
             )
             session.add(user)
             await session.flush()  # Flush to get user.id
+        user_id = user.id
+
+        # Reschedule the question in the user's review queue (before the new
+        # answer is flushed, so bootstrapping from history does not count it twice)
+        await review_store.record_answer(session, user_id, question_id, is_correct)
 
         # Record answer
         user_answer = UserAnswer(
-            user_id=user.id,
+            user_id=user_id,
             question_id=question_id,
             selected_answer=selected_option,
             is_correct=is_correct,
@@ -223,6 +332,12 @@ async def process_answer(callback: CallbackQuery, state: FSMContext):
         )
         session.add(user_answer)
 
+        # Count the first daily attempt towards today's shared results
+        daily_day = data.get('daily_day')
+        daily_position = data.get('current_index', 0)
+        if daily_day and data.get('daily_counted'):
+            await daily_challenges.record_answer(session, daily_day, daily_position, is_correct)
+
         # Update user stats
         user.total_questions_answered += 1
         if is_correct:
@@ -234,6 +349,24 @@ async def process_answer(callback: CallbackQuery, state: FSMContext):
             user.current_streak = 0
 
         await session.commit()
+    except Exception:
+        # The cached review queue already includes the rolled back answer
+        if user_id is not None:
+            review_store.forget(user_id)
+        # Release the claim so the user can answer again
+        await state.update_data(answered_key=None)
+        raise
+
+    stats_views.bump(callback.from_user.id)
+    if is_correct:
+        await state.update_data(correct_count=data.get('correct_count', 0) + 1)
+
+    if daily_day and data.get('daily_counted'):
+        daily_challenges.apply_answer(daily_day, daily_position, is_correct)
+
+    leaderboards.record_answer(
+        callback.from_user.id, callback.from_user.first_name, question.category, is_correct
+    )
 
     # Show explanation
     selected_text = question.get_options()[ord(selected_option) - ord('A')]
@@ -246,7 +379,13 @@ async def process_answer(callback: CallbackQuery, state: FSMContext):
         result_text += f"<b>Your answer:</b> {selected_option}) {escape_html(selected_text)}\n"
         result_text += f"<b>Correct answer:</b> {question.correct_answer}) {escape_html(correct_text)}\n\n"
 
-    result_text += f"<b>📖 Explanation:</b>\n{escape_html(question.explanation)}\n\n"
+    result_text += f"<b>📖 Explanation:</b>\n{question_html(question)[2]}\n\n"
+
+    if daily_day:
+        challenge = daily_challenges.cached(daily_day)
+        percent = challenge.percent_correct(daily_position) if challenge else None
+        if percent is not None:
+            result_text += f"📊 <b>{percent:.0f}%</b> of students got this right today\n\n"
 
     if question.source_file:
         result_text += f"<i>Source: {escape_html(question.source_file)}</i>"
@@ -260,8 +399,8 @@ async def process_answer(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.callback_query(F.data == "next_question")
-async def next_question(callback: CallbackQuery, state: FSMContext):
+@router.callback_query.action(Action.NEXT)
+async def next_question(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Move to next question"""
     data = await state.get_data()
 
@@ -276,6 +415,11 @@ async def next_question(callback: CallbackQuery, state: FSMContext):
         await callback.answer("Quiz session expired")
         return
 
+    # Repeated taps on the same Next button: the new question is not answered yet
+    if 'answered_key' in data and data['answered_key'] != answer_key(data):
+        await callback.answer()
+        return
+
     current_index = data['current_index'] + 1
 
     await state.update_data(
@@ -283,19 +427,147 @@ async def next_question(callback: CallbackQuery, state: FSMContext):
         question_start_time=datetime.utcnow().timestamp()
     )
 
-    await show_question(callback.message, state, edit=True)
+    await show_question(callback.message, state, session, edit=True)
     await callback.answer()
 
 
-@router.callback_query(F.data == "end_quiz")
-async def end_quiz_callback(callback: CallbackQuery, state: FSMContext):
+async def send_poll_question(bot: Bot, chat_id: int, state: FSMContext, session: AsyncSession):
+    """Send the current question as a Telegram quiz poll (poll mode)"""
+    data = await state.get_data()
+    current_index = data['current_index']
+    questions = data['questions']
+
+    if current_index >= len(questions):
+        result_text = await finish_quiz(state, session)
+        if result_text is not None:
+            await bot.send_message(
+                chat_id, result_text, reply_markup=get_main_menu(), parse_mode="HTML"
+            )
+        return
+
+    loader = QuestionLoader()
+    question = await loader.get_question_by_id(session, questions[current_index])
+
+    # Polls are plain text with short limits, so code goes in a message first
+    if question.code:
+        await bot.send_message(
+            chat_id, f"<pre>{question_html(question)[1]}</pre>", parse_mode="HTML"
+        )
+
+    options = [
+        (letter, text) for letter, text in zip("ABCDE", (
+            question.option_a, question.option_b, question.option_c,
+            question.option_d, question.option_e
+        )) if text
+    ]
+    random.shuffle(options)
+    letters = "".join(letter for letter, _ in options)
+
+    message = await bot.send_poll(
+        chat_id=chat_id,
+        question=_truncate(
+            f"{current_index + 1}/{len(questions)}. {question.question_text}",
+            POLL_QUESTION_LENGTH
+        ),
+        options=[_truncate(text, POLL_OPTION_LENGTH) for _, text in options],
+        type="quiz",
+        correct_option_ids=[letters.index(question.correct_answer)],
+        is_anonymous=False,
+        explanation=_truncate(question.explanation, POLL_EXPLANATION_LENGTH) or None,
+        reply_markup=get_poll_keyboard()
+    )
+    poll_map.add(message.poll.id, PollEntry(
+        user_id=state.key.user_id,
+        chat_id=chat_id,
+        quiz_id=data.get('quiz_id'),
+        index=current_index,
+        question_id=question.id,
+        category=question.category,
+        letters=letters,
+        correct=question.correct_answer,
+        sent_at=time.monotonic()
+    ))
+
+
+@router.poll_answer()
+async def process_poll_answer(
+    poll_answer: PollAnswer,
+    state: FSMContext,
+    bot: Bot,
+    session: AsyncSession
+):
+    """Queue a quiz poll answer for the database and send the next question"""
+    entry = poll_map.pop(poll_answer.poll_id)
+    if (
+        entry is None
+        or not poll_answer.option_ids
+        or poll_answer.user is None
+        or poll_answer.user.id != entry.user_id
+    ):
+        return
+
+    # Only the current question of a running quiz counts
+    data = await state.get_data()
+    key = [entry.quiz_id, entry.index]
+    if answer_key(data) != key or data.get('answered_key') == key:
+        return
+
+    selected_option = entry.letters[poll_answer.option_ids[0]]
+    is_correct = selected_option == entry.correct
+    daily_day = data.get('daily_day')
+    answer_writer.submit(AnswerRecord(
+        telegram_id=poll_answer.user.id,
+        username=poll_answer.user.username,
+        first_name=poll_answer.user.first_name,
+        question_id=entry.question_id,
+        category=entry.category,
+        selected_answer=selected_option,
+        is_correct=is_correct,
+        time_taken_seconds=int(time.monotonic() - entry.sent_at),
+        daily_day=daily_day,
+        daily_position=entry.index,
+        daily_counted=bool(daily_day and data.get('daily_counted'))
+    ))
+
+    await state.update_data(
+        answered_key=key,
+        current_index=entry.index + 1,
+        correct_count=data.get('correct_count', 0) + int(is_correct)
+    )
+    await send_poll_question(bot, entry.chat_id, state, session)
+
+
+@router.callback_query.action(Action.END)
+async def end_quiz_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """End quiz from callback"""
-    await end_quiz(callback.message, state, edit=True)
+    # A poll message cannot be edited into text: results go in a new message
+    is_poll = getattr(callback.message, 'poll', None) is not None
+    await end_quiz(callback.message, state, session, edit=not is_poll)
     await callback.answer("Quiz ended!")
 
 
-async def end_quiz(message, state: FSMContext, edit: bool = False):
+async def end_quiz(message, state: FSMContext, session: AsyncSession, edit: bool = False):
     """End quiz and show results"""
+    result_text = await finish_quiz(state, session)
+    if result_text is None:
+        return
+
+    if edit:
+        await message.edit_text(
+            result_text,
+            reply_markup=get_main_menu(),
+            parse_mode="HTML"
+        )
+    else:
+        await message.answer(
+            result_text,
+            reply_markup=get_main_menu(),
+            parse_mode="HTML"
+        )
+
+
+async def finish_quiz(state: FSMContext, session: AsyncSession) -> Optional[str]:
+    """Store the quiz result, clear the quiz state and return the results text"""
     data = await state.get_data()
     quiz_id = data.get('quiz_id')
     correct_count = data.get('correct_count', 0)
@@ -303,22 +575,19 @@ async def end_quiz(message, state: FSMContext, edit: bool = False):
 
     if total_questions == 0:
         await state.clear()
-        return
+        return None
 
     score = (correct_count / total_questions) * 100
 
-    async with async_session_maker() as session:
-        # Update quiz record
-        quiz_result = await session.execute(
-            select(Quiz).where(Quiz.id == quiz_id)
+    # Update quiz record in one statement
+    await session.execute(
+        update(Quiz).where(Quiz.id == quiz_id).values(
+            completed_at=datetime.utcnow(),
+            correct_answers=correct_count,
+            score=score
         )
-        quiz = quiz_result.scalar_one()
-
-        quiz.completed_at = datetime.utcnow()
-        quiz.correct_answers = correct_count
-        quiz.score = score
-
-        await session.commit()
+    )
+    await session.commit()
 
     # Determine result emoji and message
     if score >= 90:
@@ -357,16 +626,4 @@ async def end_quiz(message, state: FSMContext, edit: bool = False):
 """
 
     await state.clear()
-
-    if edit:
-        await message.edit_text(
-            result_text,
-            reply_markup=get_main_menu(),
-            parse_mode="HTML"
-        )
-    else:
-        await message.answer(
-            result_text,
-            reply_markup=get_main_menu(),
-            parse_mode="HTML"
-        )
+    return result_text
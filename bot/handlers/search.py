@@ -0,0 +1,129 @@
+"""Question search handlers"""
+from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message, CallbackQuery
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..keyboards.inline import (
+    get_search_results_keyboard,
+    get_search_result_back,
+    get_back_button
+)
+from ..questions.catalog import question_html
+from ..questions.loader import QuestionLoader
+from ..questions.search import get_search_index
+from ..utils.text import escape_html
+from ..utils.readiness import DATABASE, QUESTIONS
+
+router = Router()
+
+PAGE_SIZE = 5
+REQUIRES_QUESTIONS = {"requires": (DATABASE, QUESTIONS)}
+
+CATEGORY_EMOJIS = {
+    'lexer': '🔤',
+    'parser': '🌳',
+    'semantics': '🔍',
+    'executor': '⚡',
+    'cfg': '📝',
+    'java': '☕',
+    'concepts': '💡',
+    'splat': '💻'
+}
+
+USAGE_TEXT = (
+    "🔎 <b>Search questions</b>\n\n"
+    "Send <code>/search</code> followed by a few words, for example:\n"
+    "<code>/search ambiguous grammar</code>"
+)
+
+
+def format_results(query: str, page: int):
+    """Text and keyboard for one page of results"""
+    index = get_search_index()
+    if index is None:
+        return "❌ Search is not available yet. Please try again later.", get_back_button()
+
+    results = index.search(query, offset=page * PAGE_SIZE, limit=PAGE_SIZE)
+    if not results.total:
+        text = (
+            f"🔎 No questions found for <b>{escape_html(query)}</b>.\n\n"
+            "Try fewer or different words."
+        )
+        return text, get_back_button()
+
+    pages = (results.total + PAGE_SIZE - 1) // PAGE_SIZE
+    text = f"🔎 <b>{escape_html(query)}</b> - {results.total} found"
+    if pages > 1:
+        text += f" (page {page + 1}/{pages})"
+    text += "\n"
+    for number, hit in enumerate(results.hits, start=page * PAGE_SIZE + 1):
+        emoji = CATEGORY_EMOJIS.get(hit.category, '📖')
+        text += f"\n<b>{number}.</b> {emoji} {escape_html(hit.title)}"
+    text += "\n\n<i>Tap a number to open the question.</i>"
+    return text, get_search_results_keyboard(results.hits, page, pages, PAGE_SIZE)
+
+
+@router.message(Command("search"), flags=REQUIRES_QUESTIONS)
+async def cmd_search(message: Message, command: CommandObject, state: FSMContext):
+    """Handle /search <words>"""
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer(USAGE_TEXT, parse_mode="HTML")
+        return
+
+    await state.update_data(search_query=query, search_page=0)
+    text, keyboard = format_results(query, 0)
+    await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+
+
+@router.callback_query(F.data.startswith("search_page_"), flags=REQUIRES_QUESTIONS)
+async def search_page_callback(callback: CallbackQuery, state: FSMContext):
+    """Show another page of the last search"""
+    data = await state.get_data()
+    query = data.get('search_query')
+    if not query:
+        await callback.answer("Search expired. Please search again.", show_alert=True)
+        return
+
+    page = int(callback.data[len("search_page_"):])
+    await state.update_data(search_page=page)
+    text, keyboard = format_results(query, page)
+    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("search_q_"), flags=REQUIRES_QUESTIONS)
+async def search_question_callback(
+    callback: CallbackQuery,
+    state: FSMContext,
+    session: AsyncSession
+):
+    """Show a found question with its answer and explanation"""
+    question_id = int(callback.data[len("search_q_"):])
+
+    question = await QuestionLoader().get_question_by_id(session, question_id)
+
+    if question is None:
+        await callback.answer("Question not found.", show_alert=True)
+        return
+
+    text_html, code_html, explanation_html = question_html(question)
+    text = f"📝 <b>{text_html}</b>\n\n"
+    if question.code:
+        text += f"<pre>{code_html}</pre>\n\n"
+    for letter in "ABCDE":
+        option = getattr(question, f"option_{letter.lower()}")
+        if option:
+            marker = "✅" if letter == question.correct_answer else "▫️"
+            text += f"{marker} {escape_html(option)}\n"
+    text += f"\n💡 <b>Explanation:</b>\n{explanation_html}"
+
+    data = await state.get_data()
+    await callback.message.edit_text(
+        text,
+        reply_markup=get_search_result_back(data.get('search_page', 0)),
+        parse_mode="HTML"
+    )
+    await callback.answer()
@@ -2,34 +2,39 @@
 from aiogram import Router, F
 from aiogram.filters import CommandStart, Command
 from aiogram.types import Message, CallbackQuery
-from sqlalchemy import select
+from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database.models import User
-from ..database.db import async_session_maker
+from ..database.models import User, BlockedUser
 from ..keyboards.inline import get_main_menu, get_quiz_topics, get_splat_test_types, get_back_button
 
+# Handlers that only render static menus can run before startup warm-up finishes
+NO_DEPENDENCIES = {"requires": ()}
+
 router = Router()
 
 
 @router.message(CommandStart())
-async def cmd_start(message: Message):
+async def cmd_start(message: Message, session: AsyncSession):
     """Handle /start command"""
-    async with async_session_maker() as session:
-        # Get or create user
-        result = await session.execute(
-            select(User).where(User.telegram_id == message.from_user.id)
-        )
-        user = result.scalar_one_or_none()
+    # Get or create user
+    result = await session.execute(
+        select(User).where(User.telegram_id == message.from_user.id)
+    )
+    user = result.scalar_one_or_none()
 
-        if not user:
-            user = User(
-                telegram_id=message.from_user.id,
-                username=message.from_user.username,
-                first_name=message.from_user.first_name
-            )
-            session.add(user)
-            await session.commit()
+    if not user:
+        user = User(
+            telegram_id=message.from_user.id,
+            username=message.from_user.username,
+            first_name=message.from_user.first_name
+        )
+        session.add(user)
+        await session.commit()
+    else:
+        # Back after blocking the bot: receive broadcasts again
+        await session.execute(delete(BlockedUser).where(BlockedUser.user_id == user.id))
+        await session.commit()
 
     welcome_text = f"""
 🎓 <b>Welcome to SPLAT Final Exam Prep Bot!</b>
@@ -67,7 +72,7 @@ Good luck with your exam! 🚀
     )
 
 
-@router.message(Command("menu"))
+@router.message(Command("menu"), flags=NO_DEPENDENCIES)
 async def cmd_menu(message: Message):
     """Handle /menu command"""
     await message.answer(
@@ -77,7 +82,7 @@ async def cmd_menu(message: Message):
     )
 
 
-@router.callback_query(F.data == "back_to_menu")
+@router.callback_query(F.data == "back_to_menu", flags=NO_DEPENDENCIES)
 async def back_to_menu(callback: CallbackQuery):
     """Handle back to menu button"""
     await callback.message.edit_text(
@@ -88,7 +93,7 @@ async def back_to_menu(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data == "menu_quiz")
+@router.callback_query(F.data == "menu_quiz", flags=NO_DEPENDENCIES)
 async def menu_quiz(callback: CallbackQuery):
     """Show quiz topics"""
     await callback.message.edit_text(
@@ -101,7 +106,7 @@ async def menu_quiz(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data == "menu_splat_tests")
+@router.callback_query(F.data == "menu_splat_tests", flags=NO_DEPENDENCIES)
 async def menu_splat_tests(callback: CallbackQuery):
     """Show SPLAT test types"""
     await callback.message.edit_text(
@@ -120,7 +125,7 @@ async def menu_splat_tests(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data == "help")
+@router.callback_query(F.data == "help", flags=NO_DEPENDENCIES)
 async def show_help(callback: CallbackQuery):
     """Show help information"""
     help_text = """
@@ -130,6 +135,10 @@ async def show_help(callback: CallbackQuery):
 /start - Welcome message and main menu
 /menu - Show main menu
 /stats - View your statistics
+/daily - Today's challenge (same 5 questions for everyone)
+/leaderboard - See how you rank against other students
+/search - Find questions by keywords
+/polls - Answer with Telegram quiz polls (toggle)
 /help - Show this help message
 
 <b>How to Use:</b>
@@ -169,7 +178,7 @@ Need more help? Contact your instructor or TA!
     await callback.answer()
 
 
-@router.message(Command("help"))
+@router.message(Command("help"), flags=NO_DEPENDENCIES)
 async def cmd_help(message: Message):
     """Handle /help command"""
     help_text = """
@@ -179,6 +188,8 @@ async def cmd_help(message: Message):
 /start - Welcome message and main menu
 /menu - Show main menu
 /stats - View your statistics
+/search - Find questions by keywords
+/polls - Answer with Telegram quiz polls (toggle)
 /help - Show this help message
 
 <b>How to Use:</b>
@@ -2,90 +2,112 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
-from sqlalchemy import select, func, cast, Integer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
+from typing import Optional
 
-from ..database.models import User, UserAnswer, Question
-from ..database.db import async_session_maker
+from ..database.models import User
+from ..database.rollups import answer_counts
 from ..keyboards.inline import get_back_button
+from ..utils.stats_cache import stats_views
 
 router = Router()
 
+NO_STATS_TEXT = "❌ No statistics available yet. Start a quiz to begin tracking your progress!"
 
-@router.message(Command("stats"))
-async def cmd_stats(message: Message):
-    """Show user statistics"""
-    async with async_session_maker() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == message.from_user.id)
-        )
-        user = result.scalar_one_or_none()
-
-        if not user:
-            await message.answer("❌ No statistics available yet. Start a quiz to begin tracking your progress!")
-            return
 
-        # Get category breakdown
-        category_stats = await get_category_stats(session, user.id)
+async def render_stats(session: AsyncSession, telegram_id: int) -> Optional[str]:
+    """Stats message for a user (None if unknown), cached until their next answer"""
+    cached = stats_views.get(telegram_id)
+    if cached is not None:
+        return cached
 
-        stats_text = format_stats(user, category_stats)
-
-        await message.answer(
-            stats_text,
-            parse_mode="HTML",
-            reply_markup=get_back_button()
-        )
+    version = stats_views.version(telegram_id)
+    result = await session.execute(
+        select(User).where(User.telegram_id == telegram_id)
+    )
+    user = result.scalar_one_or_none()
 
+    if not user:
+        return None
 
-@router.callback_query(F.data == "my_stats")
-async def show_stats_callback(callback: CallbackQuery):
-    """Show stats from callback"""
-    async with async_session_maker() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == callback.from_user.id)
-        )
-        user = result.scalar_one_or_none()
+    # Get category breakdown and recent activity
+    category_stats, recent = await get_answer_stats(session, user.id)
 
-        if not user:
-            await callback.message.edit_text(
-                "❌ No statistics available yet. Start a quiz to begin tracking your progress!",
-                reply_markup=get_back_button()
-            )
-            await callback.answer()
-            return
+    stats_text = format_stats(user, category_stats, recent)
+    stats_views.put(telegram_id, version, stats_text)
+    return stats_text
 
-        # Get category breakdown
-        category_stats = await get_category_stats(session, user.id)
 
-        stats_text = format_stats(user, category_stats)
+@router.message(Command("stats"))
+async def cmd_stats(message: Message, session: AsyncSession):
+    """Show user statistics"""
+    stats_text = await render_stats(session, message.from_user.id)
+    if stats_text is None:
+        await message.answer(NO_STATS_TEXT)
+        return
+
+    await message.answer(
+        stats_text,
+        parse_mode="HTML",
+        reply_markup=get_back_button()
+    )
 
-        await callback.message.edit_text(
-            stats_text,
-            parse_mode="HTML",
-            reply_markup=get_back_button()
-        )
 
+@router.callback_query(F.data == "my_stats")
+async def show_stats_callback(callback: CallbackQuery, session: AsyncSession):
+    """Show stats from callback"""
+    stats_text = await render_stats(session, callback.from_user.id)
+    if stats_text is None:
+        await callback.message.edit_text(NO_STATS_TEXT, reply_markup=get_back_button())
+        await callback.answer()
+        return
+
+    await callback.message.edit_text(
+        stats_text,
+        parse_mode="HTML",
+        reply_markup=get_back_button()
+    )
     await callback.answer()
 
 
-async def get_category_stats(session, user_id: int) -> dict:
-    """Get statistics breakdown by category"""
+async def get_answer_stats(session, user_id: int) -> tuple:
+    """Get the breakdown by category and answers over the last two weeks
+
+    Reads daily rollups plus answers not rolled up yet, in one statement.
+    Returns (category_stats, recent) where recent holds answered/correct
+    totals for 'last_7' days (including today) and the 'prev_7' before them.
+    """
+    counts = answer_counts(user_id)
     result = await session.execute(
-        select(
-            Question.category,
-            func.count(UserAnswer.id).label('total'),
-            func.sum(cast(UserAnswer.is_correct, Integer)).label('correct')
-        )
-        .join(UserAnswer, UserAnswer.question_id == Question.id)
-        .where(UserAnswer.user_id == user_id)
-        .group_by(Question.category)
+        select(counts.c.category, counts.c.day, counts.c.answered, counts.c.correct)
     )
 
+    today = datetime.utcnow().date()
+    last_7_from = (today - timedelta(days=6)).isoformat()
+    prev_7_from = (today - timedelta(days=13)).isoformat()
+
+    totals = {}
+    recent = {'last_7': [0, 0], 'prev_7': [0, 0]}
+    for category, day, answered, correct in result:
+        correct = correct or 0
+        category_totals = totals.setdefault(category, [0, 0])
+        category_totals[0] += answered
+        category_totals[1] += correct
+        if not day:
+            continue
+        if day >= last_7_from:
+            window = recent['last_7']
+        elif day >= prev_7_from:
+            window = recent['prev_7']
+        else:
+            continue
+        window[0] += answered
+        window[1] += correct
+
     stats = {}
-    for row in result:
-        category = row.category
-        total = row.total
-        correct = row.correct or 0
+    for category, (total, correct) in totals.items():
         accuracy = (correct / total * 100) if total > 0 else 0
 
         stats[category] = {
@@ -94,10 +116,32 @@ async def get_category_stats(session, user_id: int) -> dict:
             'accuracy': accuracy
         }
 
-    return stats
+    return stats, {
+        name: {'total': total, 'correct': correct}
+        for name, (total, correct) in recent.items()
+    }
+
+
+def format_recent(recent: dict) -> str:
+    """Format last-7-days activity with the trend against the week before"""
+    last, prev = recent['last_7'], recent['prev_7']
+    if not last['total'] and not prev['total']:
+        return ""
+
+    text = f"<b>🗓 Last 7 days:</b> {last['total']} answered"
+    if last['total']:
+        accuracy = last['correct'] / last['total'] * 100
+        text += f", {accuracy:.1f}% correct"
+        if prev['total']:
+            prev_accuracy = prev['correct'] / prev['total'] * 100
+            trend = "📈" if accuracy > prev_accuracy else "📉" if accuracy < prev_accuracy else "➡️"
+            text += f" {trend} (previous week {prev_accuracy:.1f}%)"
+    else:
+        text += f" (previous week {prev['total']})"
+    return text + "\n\n"
 
 
-def format_stats(user: User, category_stats: dict) -> str:
+def format_stats(user: User, category_stats: dict, recent: dict = None) -> str:
     """Format statistics message"""
     stats_text = f"""
 📊 <b>Your Statistics</b>
@@ -113,6 +157,9 @@ def format_stats(user: User, category_stats: dict) -> str:
 
 """
 
+    if recent:
+        stats_text += format_recent(recent)
+
     if category_stats:
         stats_text += "<b>📚 Performance by Topic:</b>\n"
 
@@ -2,6 +2,8 @@
 import random
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+from ..utils.callbacks import encode_answer, NEXT_QUESTION, END_QUIZ
+
 
 def get_main_menu() -> InlineKeyboardMarkup:
     """Main menu keyboard"""
@@ -10,10 +12,12 @@ def get_main_menu() -> InlineKeyboardMarkup:
             InlineKeyboardButton(text="📚 Start Quiz", callback_data="menu_quiz"),
             InlineKeyboardButton(text="💡 SPLAT Tests", callback_data="menu_splat_tests")
         ],
+        [InlineKeyboardButton(text="🎯 Daily Challenge", callback_data="daily_challenge")],
         [
             InlineKeyboardButton(text="📊 My Stats", callback_data="my_stats"),
-            InlineKeyboardButton(text="❓ Help", callback_data="help")
-        ]
+            InlineKeyboardButton(text="🏆 Leaderboard", callback_data="lb_all")
+        ],
+        [InlineKeyboardButton(text="❓ Help", callback_data="help")]
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
@@ -28,6 +32,7 @@ def get_quiz_topics() -> InlineKeyboardMarkup:
         [InlineKeyboardButton(text="📝 CFG & Grammar", callback_data="quiz_cfg")],
         [InlineKeyboardButton(text="☕ Java Basics", callback_data="quiz_java")],
         [InlineKeyboardButton(text="🎲 Mixed (All Topics)", callback_data="quiz_mixed")],
+        [InlineKeyboardButton(text="🔁 Review (Spaced Repetition)", callback_data="quiz_review")],
         [InlineKeyboardButton(text="« Back to Menu", callback_data="back_to_menu")]
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
@@ -62,6 +67,29 @@ def get_learn_topics() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+# Leaderboard id -> title; 'all' is the global board
+LEADERBOARD_BOARDS = {
+    'all': '🌍 All Topics',
+    'lexer': '🔤 Lexer',
+    'parser': '🌳 Parser',
+    'semantics': '🔍 Semantics',
+    'executor': '⚡ Executor',
+    'cfg': '📝 CFG',
+    'java': '☕ Java',
+}
+
+
+def get_leaderboard_keyboard() -> InlineKeyboardMarkup:
+    """Leaderboard board selection"""
+    buttons = [
+        InlineKeyboardButton(text=title, callback_data=f"lb_{board}")
+        for board, title in LEADERBOARD_BOARDS.items()
+    ]
+    keyboard = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    keyboard.append([InlineKeyboardButton(text="« Back to Menu", callback_data="back_to_menu")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
 def get_quiz_navigation(current_q: int, total_q: int, question_id: int) -> InlineKeyboardMarkup:
     """Navigation buttons during quiz"""
     keyboard = [
@@ -70,7 +98,7 @@ def get_quiz_navigation(current_q: int, total_q: int, question_id: int) -> Inlin
             callback_data="show_progress"
         )],
         [
-            InlineKeyboardButton(text="❌ End Quiz", callback_data="end_quiz"),
+            InlineKeyboardButton(text="❌ End Quiz", callback_data=END_QUIZ),
             InlineKeyboardButton(text="⏭ Skip Question", callback_data=f"skip_{question_id}")
         ]
     ]
@@ -100,7 +128,7 @@ def get_answer_options(question) -> InlineKeyboardMarkup:
         keyboard.append([
             InlineKeyboardButton(
                 text=f"{text[:60]}{'...' if len(text) > 60 else ''}",
-                callback_data=f"answer_{question.id}_{opt}"
+                callback_data=encode_answer(question.id, opt)
             )
         ])
 
@@ -111,14 +139,56 @@ def get_explanation_keyboard() -> InlineKeyboardMarkup:
     """Keyboard after showing explanation"""
     keyboard = [
         [
-            InlineKeyboardButton(text="➡️ Next Question", callback_data="next_question"),
-            InlineKeyboardButton(text="❌ End Quiz", callback_data="end_quiz")
+            InlineKeyboardButton(text="➡️ Next Question", callback_data=NEXT_QUESTION),
+            InlineKeyboardButton(text="❌ End Quiz", callback_data=END_QUIZ)
         ]
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+def get_poll_keyboard() -> InlineKeyboardMarkup:
+    """Keyboard under a quiz poll"""
+    keyboard = [[InlineKeyboardButton(text="❌ End Quiz", callback_data=END_QUIZ)]]
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
 def get_back_button() -> InlineKeyboardMarkup:
     """Simple back button"""
     keyboard = [[InlineKeyboardButton(text="« Back to Menu", callback_data="back_to_menu")]]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def get_search_results_keyboard(
+    hits: list,
+    page: int,
+    pages: int,
+    page_size: int
+) -> InlineKeyboardMarkup:
+    """Numbered buttons opening each result plus page navigation"""
+    keyboard = [[
+        InlineKeyboardButton(text=str(number), callback_data=f"search_q_{hit.question_id}")
+        for number, hit in enumerate(hits, start=page * page_size + 1)
+    ]] if hits else []
+
+    navigation = []
+    if page > 0:
+        navigation.append(
+            InlineKeyboardButton(text="« Prev", callback_data=f"search_page_{page - 1}")
+        )
+    if page + 1 < pages:
+        navigation.append(
+            InlineKeyboardButton(text="Next »", callback_data=f"search_page_{page + 1}")
+        )
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([InlineKeyboardButton(text="« Back to Menu", callback_data="back_to_menu")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def get_search_result_back(page: int) -> InlineKeyboardMarkup:
+    """Back to a page of search results"""
+    keyboard = [
+        [InlineKeyboardButton(text="« Back to Results", callback_data=f"search_page_{page}")],
+        [InlineKeyboardButton(text="« Back to Menu", callback_data="back_to_menu")]
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
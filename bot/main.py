@@ -2,17 +2,36 @@
 import asyncio
 import logging
 import os
+from typing import Tuple
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from dotenv import load_dotenv
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.fsm.storage.base import BaseStorage
 
 from .database.db import init_db, close_db
 from .database import async_session_maker
+from .database import rollups
 from .questions.loader import QuestionLoader
-from .handlers import start, quiz, stats
-
-# Load environment variables
-load_dotenv()
+from .questions.answer_writer import answer_writer
+from .questions.reload import bank_watcher, reload_interval
+from .handlers import start, quiz, stats, leaderboard, daily, search, admin
+from .utils import codec
+from .utils.broadcast import broadcaster
+from .utils.event_loop import run, loop_name
+from .utils.fsm_storage import BoundedMemoryStorage
+from .utils.loop_monitor import loop_monitor, STRICT as LOOP_STRICT
+from .utils.profiler import profiler
+from .utils.leaderboard import leaderboards
+from .utils.stats_cache import stats_views
+from .utils.readiness import readiness, DATABASE, QUESTIONS, LEADERBOARDS
+from .middlewares import (
+    QueryCounterMiddleware,
+    SendScheduler,
+    ReadinessMiddleware,
+    UserLockMiddleware,
+    DbSessionMiddleware,
+    LoopBudgetMiddleware
+)
+from .middlewares.send_scheduler import GLOBAL_RATE
 
 # Configure logging
 logging.basicConfig(
@@ -30,43 +49,179 @@ async def load_questions_to_db():
         logger.info(f"Loaded {total} questions into database")
 
 
-async def main():
-    """Main bot function"""
-    # Get bot token
+async def load_leaderboards():
+    """Build in-memory leaderboards from the database"""
+    async with async_session_maker() as session:
+        await leaderboards.load(session)
+        logger.info(f"Loaded leaderboards for {len(leaderboards.names)} ranked users")
+
+
+async def maintain_answers():
+    """Roll up and prune user_answers on a schedule once the database is up"""
+    await readiness.wait((DATABASE,))
+    await rollups.maintain(async_session_maker, **rollups.settings())
+
+
+async def watch_questions():
+    """Reload the question bank when its JSON files change"""
+    await readiness.wait((QUESTIONS,))
+    bank_watcher.interval = reload_interval()
+    await bank_watcher.run()
+
+
+async def resume_broadcasts(bot: Bot, owns=None):
+    """Continue broadcasts a previous run did not finish"""
+    await readiness.wait((DATABASE,))
+    resumed = await broadcaster.resume(bot, owns)
+    if resumed:
+        logger.info(f"Resumed {resumed} broadcasts")
+
+
+async def warm_up():
+    """Initialize the database and build in-memory state in the background"""
+    logger.info("Initializing database...")
+    await readiness.run(DATABASE, init_db())
+
+    # Sequential: both steps write through the same SQLite database, and a
+    # failed question import should not keep leaderboards from loading
+    for name, step in ((QUESTIONS, load_questions_to_db), (LEADERBOARDS, load_leaderboards)):
+        try:
+            await readiness.run(name, step())
+        except Exception:
+            # Handlers that need it get ComponentFailed; the other steps still run
+            logger.warning(f"Continuing warm-up without {name}", exc_info=True)
+
+
+def get_bot_token() -> str:
+    """Bot token from the environment"""
     bot_token = os.getenv("BOT_TOKEN")
     if not bot_token:
         raise ValueError("BOT_TOKEN not found in environment variables")
+    return bot_token
+
+
+def create_api_session() -> AiohttpSession:
+    """Bot API session encoding requests and parsing responses with the fast codec"""
+    return AiohttpSession(json_loads=codec.loads, json_dumps=codec.dumps_text)
 
-    # Initialize bot and dispatcher
-    bot = Bot(token=bot_token)
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
+
+def create_bot(global_rate: float = GLOBAL_RATE) -> Tuple[Bot, SendScheduler]:
+    """Bot whose outbound calls go through a SendScheduler"""
+    bot = Bot(token=get_bot_token(), session=create_api_session())
+    send_scheduler = SendScheduler(global_rate=global_rate)
+    bot.session.middleware(send_scheduler)
+    return bot, send_scheduler
+
+
+def create_storage() -> BaseStorage:
+    """FSM storage selected by FSM_STORAGE: memory (bounded, per process) or redis"""
+    if os.getenv("FSM_STORAGE", "memory") == "redis":
+        from aiogram.fsm.storage.redis import RedisStorage
+        return RedisStorage.from_url(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            json_loads=codec.loads,
+            json_dumps=codec.dumps_text
+        )
+    return BoundedMemoryStorage(
+        ttl=float(os.getenv("FSM_IDLE_TTL_HOURS", "24")) * 3600,
+        max_entries=int(os.getenv("FSM_MAX_SESSIONS", "100000"))
+    )
+
+
+def create_dispatcher() -> Dispatcher:
+    """Dispatcher with all routers and update middlewares registered"""
+    dp = Dispatcher(storage=create_storage())
+    stats_views.max_users = int(os.getenv("STATS_CACHE_SIZE", "10000"))
 
     # Register routers
-    dp.include_router(start.router)
+    # The quiz router resolves its callbacks by table lookup, so it goes first
     dp.include_router(quiz.router)
+    dp.include_router(admin.router)
+    dp.include_router(start.router)
     dp.include_router(stats.router)
+    dp.include_router(leaderboard.router)
+    dp.include_router(daily.router)
+    dp.include_router(search.router)
 
-    # Initialize database
-    logger.info("Initializing database...")
-    await init_db()
+    # One update per user at a time, so double taps cannot interleave
+    dp.update.outer_middleware(UserLockMiddleware())
+
+    # Hold each update until the components its handler needs are ready
+    readiness_middleware = ReadinessMiddleware()
+    dp.message.middleware(readiness_middleware)
+    dp.callback_query.middleware(readiness_middleware)
+
+    # Optional SQL statement counting per update (QUERY_DEBUG=1, strict=2)
+    query_debug = os.getenv("QUERY_DEBUG", "0")
+    if query_debug != "0":
+        query_counter = QueryCounterMiddleware(strict=query_debug == "2")
+        dp.message.middleware(query_counter)
+        dp.callback_query.middleware(query_counter)
+        dp.poll_answer.middleware(query_counter)
+
+    # Test mode: handlers that block the event loop past LOOP_STALL_MS fail
+    if LOOP_STRICT:
+        loop_budget = LoopBudgetMiddleware(loop_monitor)
+        dp.message.middleware(loop_budget)
+        dp.callback_query.middleware(loop_budget)
+        dp.poll_answer.middleware(loop_budget)
+
+    # One lazily connected database session per update, committed at the end
+    db_session = DbSessionMiddleware(async_session_maker)
+    dp.message.middleware(db_session)
+    dp.callback_query.middleware(db_session)
+    dp.poll_answer.middleware(db_session)
+
+    return dp
+
+
+async def main():
+    """Main bot function"""
+    # Initialize bot and dispatcher
+    bot, send_scheduler = create_bot()
+    dp = create_dispatcher()
+
+    # SIGUSR2 profiles the event loop for a few seconds (see bot.utils.profiler)
+    profiler.install_signal_handler()
+    loop_monitor.start()
 
-    # Load questions
-    logger.info("Loading questions into database...")
-    await load_questions_to_db()
+    # Warm up in the background so polling starts immediately
+    warm_up_task = asyncio.create_task(warm_up())
+    maintenance_task = asyncio.create_task(maintain_answers())
+    writer_task = asyncio.create_task(answer_writer.run())
+    broadcast_task = asyncio.create_task(resume_broadcasts(bot))
+    watch_task = asyncio.create_task(watch_questions())
 
     # Start polling
-    logger.info("Bot started!")
+    logger.info(
+        f"Bot started! Polling {readiness.elapsed():.3f}s after start "
+        f"({loop_name()} loop, {codec.JSON_BACKEND} JSON)"
+    )
     try:
         await dp.start_polling(bot)
     finally:
+        warm_up_task.cancel()
+        maintenance_task.cancel()
+        writer_task.cancel()
+        broadcast_task.cancel()
+        watch_task.cancel()
+        loop_monitor.stop()
+        await broadcaster.close()
+        await answer_writer.close()
+        await send_scheduler.close()
+        await dp.storage.close()
         await close_db()
         await bot.session.close()
 
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        workers = int(os.getenv("WORKERS", "1"))
+        if workers > 1:
+            from .sharding import run_supervisor
+            run(run_supervisor(workers))
+        else:
+            run(main())
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
@@ -0,0 +1,16 @@
+"""Middlewares package"""
+from .query_counter import QueryCounterMiddleware
+from .send_scheduler import SendScheduler
+from .readiness import ReadinessMiddleware
+from .user_lock import UserLockMiddleware
+from .db_session import DbSessionMiddleware
+from .loop_budget import LoopBudgetMiddleware
+
+__all__ = [
+    "QueryCounterMiddleware",
+    "SendScheduler",
+    "ReadinessMiddleware",
+    "UserLockMiddleware",
+    "DbSessionMiddleware",
+    "LoopBudgetMiddleware"
+]
@@ -0,0 +1,46 @@
+"""One database session per update (unit of work)"""
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """Give handlers that take a `session` argument one AsyncSession per update
+
+    The session is shared by the handler and the helpers it calls, and only
+    checks out a connection at its first statement, so updates answered
+    from memory never touch the pool. What the handler leaves uncommitted
+    is committed after it returns and rolled back if it raises. Handlers
+    that write still commit before acting on the result (editing messages,
+    updating in-memory state), so no write transaction stays open across a
+    Telegram API call.
+    """
+
+    def __init__(self, session_maker=None):
+        self.session_maker = session_maker
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        if handler_object is None or "session" not in handler_object.params:
+            return await handler(event, data)
+
+        if self.session_maker is None:
+            from ..database.db import async_session_maker
+            self.session_maker = async_session_maker
+
+        async with self.session_maker() as session:
+            data["session"] = session
+            try:
+                result = await handler(event, data)
+            except Exception:
+                await session.rollback()
+                raise
+            if session.in_transaction():
+                await session.commit()
+            return result
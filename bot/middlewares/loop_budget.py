@@ -0,0 +1,34 @@
+"""Test-mode middleware failing handlers that block the event loop"""
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from ..utils.loop_monitor import LoopBlockedError, LoopMonitor, loop_monitor
+
+
+class LoopBudgetMiddleware(BaseMiddleware):
+    """Fail handlers that blocked the event loop for longer than the stall threshold
+
+    Test mode only (LOOP_STRICT=1): the offending handler raises
+    LoopBlockedError with the stack that was running when the budget ran out.
+    """
+
+    def __init__(self, monitor: LoopMonitor = loop_monitor):
+        self.monitor = monitor
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        callback = getattr(handler_object, "callback", None)
+        code = getattr(callback, "__code__", None)
+        seen = self.monitor.stall_count
+        result = await handler(event, data)
+        for stall in self.monitor.stalls_since(seen):
+            if code in stall.codes:
+                raise LoopBlockedError(callback.__name__, self.monitor.threshold, stall)
+        return result
@@ -0,0 +1,52 @@
+"""Per-update SQL statement counting middleware"""
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from ..database.query_counter import HANDLER_QUERY_BUDGETS, count_queries
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounterMiddleware(BaseMiddleware):
+    """Count SQL statements per handler call
+
+    Repeated statement shapes are logged as possible N+1 patterns. Handlers
+    listed in HANDLER_QUERY_BUDGETS are checked against their budget; with
+    strict=True a violation raises QueryBudgetExceeded instead of logging.
+    """
+
+    def __init__(self, budgets: dict = None, strict: bool = False):
+        self.budgets = HANDLER_QUERY_BUDGETS if budgets is None else budgets
+        self.strict = strict
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+
+        with count_queries() as counter:
+            result = await handler(event, data)
+
+        for shape, times in counter.repeated().items():
+            logger.warning(f"{name}: statement issued {times} times in one update: {shape}")
+
+        budget = self.budgets.get(name)
+        if budget is not None and counter.count > budget:
+            if self.strict:
+                counter.check_budget(budget, name)
+            logger.warning(
+                f"{name}: {counter.count} SQL statements exceeds budget of {budget}"
+            )
+        else:
+            logger.debug(
+                f"{name}: {counter.count} SQL statements, {counter.checkouts} connection checkouts"
+            )
+
+        return result
@@ -0,0 +1,48 @@
+"""Hold updates until the components their handler needs are warmed up"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import TelegramObject, CallbackQuery
+
+from ..utils.readiness import readiness, ComponentFailed, DATABASE
+
+logger = logging.getLogger(__name__)
+
+NOT_READY_TEXT = "⏳ The bot is still starting up. Please try again in a moment."
+
+
+class ReadinessMiddleware(BaseMiddleware):
+    """Wait on readiness events declared by the handler's `requires` flag
+
+    Handlers declare dependencies with flags={"requires": (...)}; handlers
+    without the flag require the database. An empty tuple means the handler
+    can run before anything is warmed up.
+    """
+
+    def __init__(self, timeout: float = 60.0):
+        self.timeout = timeout
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        requires = get_flag(data, "requires", default=(DATABASE,))
+        if not all(readiness.is_ready(name) for name in requires):
+            try:
+                await readiness.wait(requires, timeout=self.timeout)
+            except (asyncio.TimeoutError, ComponentFailed) as e:
+                logger.warning(f"Update dropped, dependencies not ready: {e}")
+                if isinstance(event, CallbackQuery):
+                    await event.answer(NOT_READY_TEXT, show_alert=True)
+                else:
+                    await event.answer(NOT_READY_TEXT)
+                return None
+
+        result = await handler(event, data)
+        readiness.record_response()
+        return result
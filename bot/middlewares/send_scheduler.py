@@ -0,0 +1,218 @@
+"""Outbound Bot API scheduler with flood-limit aware rate limiting"""
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import deque
+from typing import Any, Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageText
+
+logger = logging.getLogger(__name__)
+
+# Telegram flood limits are about 1 message per second in a group or channel and
+# 30 per second overall; stay slightly below them so timer jitter does not trip a 429
+GLOBAL_RATE = 28.0
+CHAT_RATE = 0.95
+
+
+def is_group_chat(chat_id: Any) -> bool:
+    """Groups and channels have negative ids (or are addressed by @username)"""
+    return not isinstance(chat_id, int) or chat_id < 0
+
+
+class _Job:
+    """A queued API call and the future its callers wait on"""
+
+    __slots__ = ("make_request", "bot", "method", "future", "edit_key", "attempts")
+
+    def __init__(self, make_request, bot, method, future: asyncio.Future, edit_key):
+        self.make_request = make_request
+        self.bot = bot
+        self.method = method
+        self.future = future
+        self.edit_key = edit_key
+        self.attempts = 0
+
+
+class SendScheduler(BaseRequestMiddleware):
+    """Queue chat-bound API calls behind per-chat and global send rates
+
+    Register on the bot session:
+        bot.session.middleware(SendScheduler())
+
+    Calls that target a chat are queued per chat and released by a single
+    dispatcher no faster than the global rate, and in groups and channels
+    no faster than the per-chat rate (private chats are not paced, so a
+    reply follows an answer at once). A flood error
+    puts the call back at the head of its chat queue and holds the chat for
+    `retry_after` seconds. While an editMessageText for a message is queued,
+    newer edits of the same message replace it; every caller gets the result
+    of the edit that was actually sent. Calls without a chat (getUpdates,
+    answerCallbackQuery, ...) pass straight through.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE,
+        chat_rate: float = CHAT_RATE,
+        max_retries: int = 3
+    ):
+        self.global_interval = 1.0 / global_rate
+        self.chat_interval = 1.0 / chat_rate
+        self.max_retries = max_retries
+        self._queues = {}
+        self._chat_ready_at = {}
+        self._ready = []
+        self._sequence = itertools.count()
+        self._edits = {}
+        self._global_ready_at = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._in_flight = set()
+        self.sent = 0
+        self.coalesced = 0
+        self.retried = 0
+
+    @staticmethod
+    def _edit_key(method) -> Optional[tuple]:
+        if isinstance(method, EditMessageText) and method.message_id is not None:
+            return (method.chat_id, method.message_id)
+        return None
+
+    def _chat_interval(self, chat_id: Any) -> float:
+        return self.chat_interval if is_group_chat(chat_id) else 0.0
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    def _enqueue(self, chat_id: Any, job: _Job, front: bool = False):
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = self._queues[chat_id] = deque()
+            ready_at = self._chat_ready_at.get(chat_id, 0.0)
+            heapq.heappush(self._ready, (ready_at, next(self._sequence), chat_id))
+        if front:
+            queue.appendleft(job)
+        else:
+            queue.append(job)
+        if job.edit_key is not None:
+            self._edits[job.edit_key] = job
+        self._ensure_worker()
+        self._wakeup.set()
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        edit_key = self._edit_key(method)
+        if edit_key is not None:
+            job = self._edits.get(edit_key)
+            if job is not None:
+                # Superseded edits are never sent; the queued edit carries the latest text
+                job.method = method
+                job.make_request = make_request
+                self.coalesced += 1
+                return await asyncio.shield(job.future)
+
+        job = _Job(make_request, bot, method, asyncio.get_running_loop().create_future(), edit_key)
+        self._enqueue(chat_id, job)
+        return await asyncio.shield(job.future)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._ready:
+                now = loop.time()
+                self._chat_ready_at = {
+                    chat_id: ready_at for chat_id, ready_at in self._chat_ready_at.items()
+                    if ready_at > now
+                }
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            ready_at, _, chat_id = self._ready[0]
+            delay = max(ready_at, self._global_ready_at) - loop.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._ready)
+            now = loop.time()
+            chat_ready_at = self._chat_ready_at.get(chat_id, 0.0)
+            if chat_ready_at > now:
+                # The chat was held back by a flood error after it was scheduled
+                heapq.heappush(self._ready, (chat_ready_at, next(self._sequence), chat_id))
+                continue
+
+            queue = self._queues[chat_id]
+            job = queue.popleft()
+            if job.edit_key is not None and self._edits.get(job.edit_key) is job:
+                del self._edits[job.edit_key]
+            if queue:
+                heapq.heappush(
+                    self._ready,
+                    (now + self._chat_interval(chat_id), next(self._sequence), chat_id)
+                )
+            else:
+                del self._queues[chat_id]
+
+            self._global_ready_at = now + self.global_interval
+            self._chat_ready_at[chat_id] = now + self._chat_interval(chat_id)
+            task = loop.create_task(self._dispatch(chat_id, job))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, chat_id: Any, job: _Job):
+        try:
+            result = await job.make_request(job.bot, job.method)
+        except TelegramRetryAfter as e:
+            if job.attempts < self.max_retries:
+                job.attempts += 1
+                self.retried += 1
+                logger.warning(
+                    f"Flood limit on {type(job.method).__name__} for chat {chat_id}, "
+                    f"retrying in {e.retry_after}s"
+                )
+                hold_until = asyncio.get_running_loop().time() + e.retry_after
+                self._chat_ready_at[chat_id] = max(
+                    self._chat_ready_at.get(chat_id, 0.0), hold_until
+                )
+                self._enqueue(chat_id, job, front=True)
+                return
+            self._fail(job, e)
+        except Exception as e:
+            self._fail(job, e)
+        else:
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+
+    @staticmethod
+    def _fail(job: _Job, error: Exception):
+        if not job.future.done():
+            job.future.set_exception(error)
+            # Mark as retrieved: the caller may have been cancelled meanwhile
+            job.future.exception()
+
+    async def close(self):
+        """Stop the dispatcher; queued calls that were not sent are cancelled"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        for queue in self._queues.values():
+            for job in queue:
+                job.future.cancel()
+        self._queues.clear()
+        self._ready.clear()
+        self._edits.clear()
@@ -0,0 +1,44 @@
+"""Run the updates of one user one at a time"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+
+class UserLockMiddleware(BaseMiddleware):
+    """Serialize updates per user, in arrival order
+
+    Polling handles updates as concurrent tasks, so a double tap could run
+    a handler twice at once. asyncio.Lock wakes waiters first in, first out.
+    A user's lock exists only while they have updates in flight, so memory
+    grows with concurrent users, not with every user ever seen.
+    """
+
+    def __init__(self):
+        self._locks: Dict[int, list] = {}  # user id -> [lock, updates holding or waiting]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        entry = self._locks.get(user.id)
+        if entry is None:
+            entry = self._locks[user.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                return await handler(event, data)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[user.id]
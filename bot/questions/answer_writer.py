@@ -0,0 +1,189 @@
+"""Batched persistence of quiz answers
+
+Poll answers arrive as PollAnswer updates that need no reply, so their
+database work is taken off the update path: handlers submit an
+AnswerRecord and AnswerWriter writes everything pending in one transaction
+every ANSWER_FLUSH_INTERVAL seconds, or as soon as ANSWER_BATCH_SIZE
+records are waiting. A batch loads its users with one query, writes each
+user's review state once and inserts the answers together; user totals,
+streaks and daily counters are applied in submission order.
+"""
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import select
+
+from ..database.models import User, UserAnswer
+from ..utils.leaderboard import leaderboards
+from ..utils.stats_cache import stats_views
+from .daily import daily_challenges
+from .review import review_store
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv("ANSWER_BATCH_SIZE", "200"))
+FLUSH_INTERVAL = float(os.getenv("ANSWER_FLUSH_INTERVAL", "0.5"))
+MAX_PENDING = 50_000  # oldest records are dropped past this while the database is down
+
+
+class AnswerRecord(NamedTuple):
+    """One answer waiting to be written"""
+    telegram_id: int
+    username: Optional[str]
+    first_name: Optional[str]
+    question_id: int
+    category: str
+    selected_answer: str
+    is_correct: bool
+    time_taken_seconds: int
+    daily_day: Optional[str] = None
+    daily_position: int = 0
+    daily_counted: bool = False
+
+
+class AnswerWriter:
+    """Queue of answers flushed to the database in batches"""
+
+    def __init__(
+        self,
+        session_maker=None,
+        batch_size: int = BATCH_SIZE,
+        interval: float = FLUSH_INTERVAL
+    ):
+        self.session_maker = session_maker
+        self.batch_size = batch_size
+        self.interval = interval
+        self.flushes = 0
+        self._pending: List[AnswerRecord] = []
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def submit(self, record: AnswerRecord):
+        self._pending.append(record)
+        if len(self._pending) > MAX_PENDING:
+            dropped = len(self._pending) - MAX_PENDING
+            del self._pending[:dropped]
+            logger.error(f"Answer writer backlog full, dropped {dropped} answers")
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+
+    async def flush(self) -> int:
+        """Write all pending records; returns how many were written"""
+        async with self._lock:
+            records, self._pending = self._pending, []
+            self._full.clear()
+            if not records:
+                return 0
+            try:
+                await self._write(records)
+            except Exception:
+                # Keep them for the next flush, ahead of newer answers
+                self._pending[:0] = records
+                raise
+            self.flushes += 1
+
+        for record in records:
+            if record.daily_day and record.daily_counted:
+                daily_challenges.apply_answer(
+                    record.daily_day, record.daily_position, record.is_correct
+                )
+            leaderboards.record_answer(
+                record.telegram_id, record.first_name, record.category, record.is_correct
+            )
+            stats_views.bump(record.telegram_id)
+        return len(records)
+
+    async def _write(self, records: List[AnswerRecord]):
+        if self.session_maker is None:
+            from ..database.db import async_session_maker
+            self.session_maker = async_session_maker
+
+        async with self.session_maker() as session:
+            telegram_ids = {record.telegram_id for record in records}
+            result = await session.execute(
+                select(User).where(User.telegram_id.in_(telegram_ids))
+            )
+            users = {user.telegram_id: user for user in result.scalars()}
+            for record in records:
+                if record.telegram_id not in users:
+                    users[record.telegram_id] = User(
+                        telegram_id=record.telegram_id,
+                        username=record.username,
+                        first_name=record.first_name
+                    )
+                    session.add(users[record.telegram_id])
+            await session.flush()
+
+            # Review queues before the answers are staged, so a queue
+            # bootstrapped from history does not count them twice
+            by_user = defaultdict(list)
+            for record in records:
+                by_user[users[record.telegram_id].id].append(
+                    (record.question_id, record.is_correct)
+                )
+            try:
+                await self._write_answers(session, records, users, by_user)
+            except Exception:
+                # Cached queues already include the batch; reload them on retry
+                for user_id in by_user:
+                    review_store.forget(user_id)
+                raise
+
+    @staticmethod
+    async def _write_answers(session, records: List[AnswerRecord], users: dict, by_user: dict):
+        for user_id, answers in by_user.items():
+            await review_store.record_answers(session, user_id, answers)
+
+        for record in records:
+            user = users[record.telegram_id]
+            session.add(UserAnswer(
+                user_id=user.id,
+                question_id=record.question_id,
+                selected_answer=record.selected_answer,
+                is_correct=record.is_correct,
+                time_taken_seconds=record.time_taken_seconds
+            ))
+            if record.daily_day and record.daily_counted:
+                await daily_challenges.record_answer(
+                    session, record.daily_day, record.daily_position, record.is_correct
+                )
+
+            user.total_questions_answered += 1
+            if record.is_correct:
+                user.correct_answers += 1
+                user.current_streak += 1
+                if user.current_streak > user.best_streak:
+                    user.best_streak = user.current_streak
+            else:
+                user.current_streak = 0
+
+        await session.commit()
+
+    async def run(self):
+        """Flush every `interval` seconds, or early when a batch is full"""
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Writing {len(self._pending)} answers failed: {e}", exc_info=True)
+                await asyncio.sleep(self.interval)
+
+    async def close(self):
+        """Write what is still pending (on shutdown)"""
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Answers lost on shutdown: {e}", exc_info=True)
+
+
+answer_writer = AnswerWriter()
@@ -0,0 +1,123 @@
+"""In-memory catalog of question ids for sampling without ORDER BY RANDOM()"""
+import random
+from typing import Collection, Dict, Iterable, List, Optional, Tuple
+
+from ..utils.text import escape_html
+
+SPLAT_SUBCATEGORIES = ['badlex', 'badparse', 'badsemantics', 'badexecution', 'goodexecution']
+SPLAT_POOL = "splat"
+ALL_POOL = "all"
+
+
+class QuestionCatalog:
+    """Question ids grouped by category and subcategory
+
+    Built once after the bank is imported; quiz selection samples ids here
+    and fetches only the chosen rows. `html` maps ids to the snapshot's
+    pre-escaped (question_text, code, explanation), see question_html().
+    """
+
+    def __init__(
+        self,
+        by_category: Dict[str, List[int]],
+        by_subcategory: Dict[str, List[int]],
+        html: Dict[int, tuple] = None
+    ):
+        self.by_category = by_category
+        self.by_subcategory = by_subcategory
+        self.html = html or {}
+        self.all_ids = sorted({qid for ids in by_category.values() for qid in ids})
+        self._members = frozenset(self.all_ids)
+        self.splat_ids = sorted(
+            {qid for name in SPLAT_SUBCATEGORIES for qid in by_subcategory.get(name, [])}
+        )
+
+    def __contains__(self, question_id: int) -> bool:
+        """Whether a question is in the published bank (not removed or suppressed)"""
+        return question_id in self._members
+
+    @classmethod
+    def from_bank(
+        cls,
+        bank,
+        id_by_key: dict,
+        exclude: Collection[int] = ()
+    ) -> "QuestionCatalog":
+        """Map a QuestionBank's position indexes to database ids, skipping `exclude`"""
+        def resolve(index):
+            resolved = {}
+            for name, positions in index.items():
+                ids = [
+                    id_by_key[bank.key(p)] for p in positions
+                    if p not in exclude and bank.key(p) in id_by_key
+                ]
+                resolved[name] = sorted(set(ids))
+            return resolved
+
+        # Excluded questions are not drawn, but may still be shown (search, quizzes in flight)
+        html = {}
+        for position in range(len(bank)):
+            key = bank.key(position)
+            if key in id_by_key:
+                html[id_by_key[key]] = bank.html[position]
+        return cls(resolve(bank.by_category), resolve(bank.by_subcategory), html)
+
+    @staticmethod
+    def _sample(ids: List[int], limit: int) -> List[int]:
+        return random.sample(ids, min(limit, len(ids)))
+
+    def pool(self, name: str) -> List[int]:
+        """Ids of a named pool: category:<name>, subcategory:<name>, splat or all"""
+        kind, _, key = name.partition(":")
+        if kind == "category":
+            return self.by_category.get(key, [])
+        if kind == "subcategory":
+            return self.by_subcategory.get(key, [])
+        return self.splat_ids if name == SPLAT_POOL else self.all_ids
+
+    def sample_category(self, category: str, limit: int) -> List[int]:
+        """Random ids from a category"""
+        return self._sample(self.by_category.get(category, []), limit)
+
+    def sample_subcategory(self, subcategory: str, limit: int) -> List[int]:
+        """Random ids from a subcategory"""
+        return self._sample(self.by_subcategory.get(subcategory, []), limit)
+
+    def sample_subcategories(self, subcategories: Iterable[str], limit: int) -> List[int]:
+        """Random ids drawn from several subcategories together"""
+        ids = [qid for name in subcategories for qid in self.by_subcategory.get(name, [])]
+        return self._sample(ids, limit)
+
+    def sample_all(self, limit: int) -> List[int]:
+        """Random ids from the whole bank"""
+        return self._sample(self.all_ids, limit)
+
+
+_catalog: Optional[QuestionCatalog] = None
+
+
+def get_catalog() -> Optional[QuestionCatalog]:
+    """The current catalog, or None until the bank has been imported"""
+    return _catalog
+
+
+def set_catalog(catalog: Optional[QuestionCatalog]):
+    """Publish a new catalog (a single reference swap)"""
+    global _catalog
+    _catalog = catalog
+
+
+def question_html(question) -> Tuple[str, str, str]:
+    """Escaped question_text, code and explanation of a Question row
+
+    Taken from the published bank (escaped once, when the snapshot was
+    built) and escaped here only for questions outside it.
+    """
+    html = _catalog.html.get(question.id) if _catalog is not None else None
+    if html is None:
+        html = (
+            escape_html(question.question_text),
+            escape_html(question.code),
+            escape_html(question.explanation)
+        )
+    return html
@@ -0,0 +1,209 @@
+"""Per-user question coverage, so quizzes do not repeat questions
+
+For every sampling pool (a category, a subcategory, the SPLAT mix or the
+whole bank) each user has a bitset of the question ids it has served them
+(loaded on their first quiz, saved with the quiz row).
+Quizzes draw unseen questions first; when fewer unseen questions are left
+than a quiz needs, the quiz takes them all, the pool starts a new round and
+the rest of the quiz comes from the fresh round.
+
+A draw is a random pick from the pool's id list and an O(1) bit test, so a
+quiz of k questions costs O(k) expected picks while a fifth or more of the
+pool is unseen. After MAX_MISSES_PER_PICK * k repeated picks the pool's ids
+are scanned once in memory instead; the answer history is never read.
+"""
+import random
+import struct
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import select, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import CoverageState
+
+MAX_MISSES_PER_PICK = 4
+
+STATE_VERSION = 1
+_HEADER = struct.Struct("<B")
+_POOL = struct.Struct("<BI")  # pool name length, bitset length
+
+
+class SeenBits:
+    """Bitset over question ids; bit i of byte j is question id 8 * j + i"""
+    __slots__ = ('bits',)
+
+    def __init__(self, bits: bytes = b""):
+        self.bits = bytearray(bits)
+
+    def __contains__(self, question_id: int) -> bool:
+        byte = question_id >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] >> (question_id & 7) & 1)
+
+    def __len__(self) -> int:
+        return int.from_bytes(self.bits, "little").bit_count()
+
+    def add(self, question_id: int):
+        byte = question_id >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        self.bits[byte] |= 1 << (question_id & 7)
+
+    def clear(self):
+        self.bits = bytearray()
+
+
+def sample_unseen(
+    ids: Sequence[int],
+    seen: SeenBits,
+    limit: int,
+    rng: random.Random = random
+) -> Tuple[List[int], bool]:
+    """Up to `limit` distinct ids, unseen ones first, marked as seen
+
+    Returns the ids and whether the pool was exhausted and started over.
+    """
+    limit = min(limit, len(ids))
+    picked: List[int] = []
+    chosen = set()
+    misses = 0
+    while len(picked) < limit and misses < MAX_MISSES_PER_PICK * limit:
+        question_id = ids[rng.randrange(len(ids))]
+        if question_id in seen or question_id in chosen:
+            misses += 1
+            continue
+        picked.append(question_id)
+        chosen.add(question_id)
+
+    if len(picked) < limit:
+        rest = [qid for qid in ids if qid not in seen and qid not in chosen]
+        extra = rng.sample(rest, min(limit - len(picked), len(rest)))
+        picked.extend(extra)
+        chosen.update(extra)
+
+    reset = len(picked) < limit
+    if reset:
+        seen.clear()
+        rest = [qid for qid in ids if qid not in chosen]
+        picked.extend(rng.sample(rest, limit - len(picked)))
+        rng.shuffle(picked)
+
+    for question_id in picked:
+        seen.add(question_id)
+    return picked, reset
+
+
+class Coverage:
+    """A user's seen-bitsets by pool name"""
+
+    def __init__(self, pools: Dict[str, SeenBits] = None):
+        self.pools = pools or {}
+
+    def seen(self, pool: str) -> SeenBits:
+        bits = self.pools.get(pool)
+        if bits is None:
+            bits = self.pools[pool] = SeenBits()
+        return bits
+
+    def to_bytes(self) -> bytes:
+        """Pack as a version byte followed by (name, bitset) records"""
+        parts = [_HEADER.pack(STATE_VERSION)]
+        for name, bits in self.pools.items():
+            encoded = name.encode()
+            parts.append(_POOL.pack(len(encoded), len(bits.bits)))
+            parts.append(encoded)
+            parts.append(bytes(bits.bits))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Coverage":
+        """Unpack state written by to_bytes"""
+        if not data or _HEADER.unpack_from(data)[0] != STATE_VERSION:
+            return cls()
+        pools = {}
+        offset = _HEADER.size
+        while offset < len(data):
+            name_length, bits_length = _POOL.unpack_from(data, offset)
+            offset += _POOL.size
+            name = data[offset:offset + name_length].decode()
+            offset += name_length
+            pools[name] = SeenBits(data[offset:offset + bits_length])
+            offset += bits_length
+        return cls(pools)
+
+
+class CoverageStore:
+    """Load, cache and persist coverage
+
+    Loaded lazily from `coverage_states` (a user without a row starts with
+    nothing seen); LRU cache bounded by `max_users`, written through.
+    """
+
+    def __init__(self, max_users: int = 5000):
+        self.max_users = max_users
+        self._cache: "OrderedDict[int, Tuple[Coverage, bool]]" = OrderedDict()
+
+    async def get_coverage(self, session: AsyncSession, user_id: int) -> Coverage:
+        """Coverage of a user, loading it on first use"""
+        cached = self._cache.get(user_id)
+        if cached is not None:
+            self._cache.move_to_end(user_id)
+            return cached[0]
+
+        result = await session.execute(
+            select(CoverageState.data).where(CoverageState.user_id == user_id)
+        )
+        data = result.scalar_one_or_none()
+        coverage = Coverage.from_bytes(data) if data is not None else Coverage()
+        self._cache[user_id] = (coverage, data is not None)
+        while len(self._cache) > self.max_users:
+            self._cache.popitem(last=False)
+        return coverage
+
+    async def sample(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        pool: str,
+        ids: Sequence[int],
+        limit: int
+    ) -> List[int]:
+        """Draw ids from a pool for a user and stage the updated coverage"""
+        if not ids:
+            return []
+        coverage = await self.get_coverage(session, user_id)
+        picked, _ = sample_unseen(ids, coverage.seen(pool), limit)
+
+        persisted = self._cache[user_id][1]
+        values = {'data': coverage.to_bytes(), 'updated_at': datetime.utcnow()}
+        if persisted:
+            await session.execute(
+                update(CoverageState).where(CoverageState.user_id == user_id).values(**values)
+            )
+        else:
+            await session.execute(insert(CoverageState).values(user_id=user_id, **values))
+            self._cache[user_id] = (coverage, True)
+        return picked
+
+    def forget(self, user_id: int):
+        """Drop cached coverage, e.g. after a rolled back transaction"""
+        self._cache.pop(user_id, None)
+
+
+coverage_store = CoverageStore()
+
+
+def _demo(pool_size: int = 8, quizzes: int = 6, limit: int = 3):
+    """Print the draws of consecutive quizzes from one small pool"""
+    ids = list(range(100, 100 + pool_size))
+    seen = SeenBits()
+    for number in range(1, quizzes + 1):
+        picked, reset = sample_unseen(ids, seen, limit)
+        print(f"quiz {number}: {sorted(picked)}{'  (new round)' if reset else ''}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    _demo(*(int(arg) for arg in sys.argv[1:4]))
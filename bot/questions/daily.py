@@ -0,0 +1,195 @@
+"""Shared daily challenge - one deterministic question set per day"""
+import asyncio
+import random
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import DailyChallengeQuestion
+from .catalog import get_catalog
+
+DAILY_SIZE = 5
+
+
+def today() -> str:
+    """Challenge day key (UTC date)"""
+    return datetime.utcnow().strftime('%Y-%m-%d')
+
+
+def select_daily_questions(
+    day: str,
+    ids_by_category: Dict[str, List[int]],
+    size: int
+) -> List[int]:
+    """Pick a deterministic set of question ids spread across categories
+
+    The same day and question bank always give the same set, so every
+    process and every restart agrees on the challenge without coordination.
+    """
+    rng = random.Random(f"splat-daily-{day}")
+    categories = sorted(c for c, ids in ids_by_category.items() if ids)
+    rng.shuffle(categories)
+    pools = {c: sorted(ids_by_category[c]) for c in categories}
+
+    picked = []
+    while len(picked) < size and any(pools.values()):
+        for category in categories:
+            pool = pools[category]
+            if not pool or len(picked) == size:
+                continue
+            picked.append(pool.pop(rng.randrange(len(pool))))
+    return picked
+
+
+class DailyChallenge:
+    """A day's question set with per-question answered/correct counters"""
+
+    def __init__(self, day: str, question_ids: List[int], answered: List[int], correct: List[int]):
+        self.day = day
+        self.question_ids = question_ids
+        self.answered = answered
+        self.correct = correct
+
+    def percent_correct(self, position: int) -> Optional[float]:
+        """Share of counted answers that were correct, or None if unanswered"""
+        if not 0 <= position < len(self.answered) or self.answered[position] == 0:
+            return None
+        return self.correct[position] / self.answered[position] * 100
+
+
+class DailyChallengeService:
+    """Generate, cache and aggregate the daily challenge
+
+    The set is generated by the first request of the day, persisted in
+    `daily_challenge_questions` and served from memory afterwards. Results
+    are counted with atomic SQL increments mirrored in memory, so showing
+    "X% got this right" needs no aggregation query.
+    """
+
+    def __init__(self, size: int = DAILY_SIZE):
+        self.size = size
+        self._current: Optional[DailyChallenge] = None
+        self._lock = asyncio.Lock()
+
+    def cached(self, day: str) -> Optional[DailyChallenge]:
+        """The in-memory challenge for a day, if loaded"""
+        if self._current is not None and self._current.day == day:
+            return self._current
+        return None
+
+    async def get(self, session: AsyncSession, day: str = None) -> DailyChallenge:
+        """Challenge for a day (today by default), generating it if needed"""
+        day = day or today()
+        challenge = self.cached(day)
+        if challenge is not None:
+            return challenge
+
+        async with self._lock:
+            challenge = self.cached(day)
+            if challenge is not None:
+                return challenge
+            return await self._load_or_generate(session, day)
+
+    def forget(self, day: str):
+        """Drop the cached day, e.g. after a rolled back transaction"""
+        if self.cached(day) is not None:
+            self._current = None
+
+    async def _select_rows(self, session: AsyncSession, day: str) -> list:
+        result = await session.execute(
+            select(DailyChallengeQuestion)
+            .where(DailyChallengeQuestion.day == day)
+            .order_by(DailyChallengeQuestion.position)
+        )
+        return result.scalars().all()
+
+    async def _load_or_generate(self, session: AsyncSession, day: str) -> DailyChallenge:
+        rows = await self._select_rows(session, day)
+
+        if not rows:
+            try:
+                rows = await self._generate(session, day)
+            except IntegrityError:
+                # Another worker process generated the same day first
+                await session.rollback()
+                rows = await self._select_rows(session, day)
+
+        challenge = DailyChallenge(
+            day,
+            [row.question_id for row in rows],
+            [row.answered for row in rows],
+            [row.correct for row in rows]
+        )
+        if rows:
+            self._current = challenge
+        return challenge
+
+    async def _generate(self, session: AsyncSession, day: str) -> list:
+        # The published bank, without removed or suppressed questions
+        catalog = get_catalog()
+        if catalog is None:
+            return []
+        question_ids = select_daily_questions(day, catalog.by_category, self.size)
+        if not question_ids:
+            return []
+        rows = [
+            DailyChallengeQuestion(
+                day=day, position=position, question_id=question_id, answered=0, correct=0
+            )
+            for position, question_id in enumerate(question_ids)
+        ]
+        session.add_all(rows)
+        await session.flush()
+        return rows
+
+    async def record_answer(
+        self,
+        session: AsyncSession,
+        day: str,
+        position: int,
+        is_correct: bool
+    ):
+        """Count an answer; the in-memory mirror is updated after commit"""
+        values = {'answered': DailyChallengeQuestion.answered + 1}
+        if is_correct:
+            values['correct'] = DailyChallengeQuestion.correct + 1
+        await session.execute(
+            update(DailyChallengeQuestion)
+            .where(
+                DailyChallengeQuestion.day == day,
+                DailyChallengeQuestion.position == position
+            )
+            .values(**values)
+        )
+
+    async def refresh(self, session: AsyncSession):
+        """Re-read the cached day's counters (answers counted by other workers)"""
+        if self._current is None:
+            return
+        result = await session.execute(
+            select(
+                DailyChallengeQuestion.position,
+                DailyChallengeQuestion.answered,
+                DailyChallengeQuestion.correct
+            ).where(DailyChallengeQuestion.day == self._current.day)
+        )
+        challenge = self._current
+        for position, answered, correct in result:
+            if 0 <= position < len(challenge.answered):
+                challenge.answered[position] = answered
+                challenge.correct[position] = correct
+
+    def apply_answer(self, day: str, position: int, is_correct: bool):
+        """Mirror a committed answer in the cached counters"""
+        challenge = self.cached(day)
+        if challenge is None or not 0 <= position < len(challenge.answered):
+            return
+        challenge.answered[position] += 1
+        if is_correct:
+            challenge.correct[position] += 1
+
+
+daily_challenges = DailyChallengeService()
@@ -0,0 +1,286 @@
+"""Near-duplicate detection across the question bank (MinHash + LSH)
+
+Every record becomes a set of token 3-shingles over its question text, code
+and options. MinHash signatures (SIGNATURE_SIZE hashes) are computed for
+all records at once with NumPy; LSH splits each signature into BANDS bands
+and only records sharing a band bucket become candidates (small buckets
+pairwise, larger ones against their first record, so the work stays linear
+in the number of records). Candidates are verified by exact Jaccard
+similarity of their shingle sets and merged into clusters with union-find.
+
+With SUPPRESS_NEAR_DUPLICATES=1 the loader keeps only the first record of
+each cluster in the sampling catalog.
+
+`python -m bot.questions.dedup report [threshold] [output.json]` lists the
+clusters in the current bank, `python -m bot.questions.dedup bench [n]`
+times a synthetic bank and checks it against exact Jaccard on a sample.
+"""
+import re
+from typing import Dict, List, Set
+
+import numpy as np
+
+from .snapshot import FIELDS
+
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+SHINGLE_SIZE = 3
+SIGNATURE_SIZE = 64
+BANDS = 16  # 4 rows per band: pairs above ~0.5 similarity become candidates
+DEFAULT_THRESHOLD = 0.8
+MAX_BUCKET_PAIRS = 32  # larger buckets only pair members with the first one
+ESTIMATE_MARGIN = 0.2  # ~4 standard errors of a 64-hash estimate
+
+DEDUP_FIELDS = (
+    'question_text', 'code', 'option_a', 'option_b', 'option_c', 'option_d', 'option_e'
+)
+_FIELD_INDEXES = tuple(FIELDS.index(name) for name in DEDUP_FIELDS)
+
+_SHIFT32 = np.uint64(32)
+_rng = np.random.default_rng(0x5EED)
+# Multiply-shift hash family; odd multipliers, arithmetic wraps modulo 2**64
+_SHINGLE_MULTIPLIERS = _rng.integers(1, 2 ** 63, SHINGLE_SIZE, dtype=np.uint64) | np.uint64(1)
+_HASH_A = _rng.integers(1, 2 ** 63, SIGNATURE_SIZE, dtype=np.uint64) | np.uint64(1)
+_HASH_B = _rng.integers(0, 2 ** 63, SIGNATURE_SIZE, dtype=np.uint64)
+_BAND_MULTIPLIERS = _rng.integers(1, 2 ** 63, SIGNATURE_SIZE, dtype=np.uint64) | np.uint64(1)
+
+
+def record_text(record: tuple) -> str:
+    """The fields compared for duplicates, joined"""
+    return "\n".join(record[i] for i in _FIELD_INDEXES if record[i])
+
+
+def _shingle_hashes(texts: List[str]):
+    """32-bit hashes of all token shingles and each document's start offset"""
+    vocabulary: Dict[str, int] = {}
+    token_ids: List[int] = []
+    starts = []
+    pad = [0] * (SHINGLE_SIZE - 1)  # id 0 is reserved padding
+    for text in texts:
+        starts.append(len(token_ids))
+        tokens = TOKEN_RE.findall(text.lower()) or [""]
+        token_ids.extend(vocabulary.setdefault(token, len(vocabulary) + 1) for token in tokens)
+        token_ids.extend(pad)
+
+    ids = np.array(token_ids, dtype=np.uint64)
+    # Shingles start at every real token; padding closes the last ones
+    valid = np.ones(len(ids), dtype=bool)
+    for offset in range(1, SHINGLE_SIZE):
+        valid[np.array(starts[1:] + [len(ids)], dtype=np.int64) - offset] = False
+    positions = np.flatnonzero(valid)
+
+    hashes = np.zeros(len(positions), dtype=np.uint64)
+    for offset, multiplier in enumerate(_SHINGLE_MULTIPLIERS):
+        hashes += ids[positions + offset] * multiplier
+    hashes >>= _SHIFT32
+
+    # Shingles of document d are the valid positions at or after its start
+    shingle_starts = np.searchsorted(positions, np.array(starts, dtype=np.int64))
+    return hashes, shingle_starts
+
+
+def _signatures(hashes: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    signatures = np.empty((len(starts), SIGNATURE_SIZE), dtype=np.uint64)
+    for k in range(SIGNATURE_SIZE):
+        permuted = (hashes * _HASH_A[k] + _HASH_B[k]) >> _SHIFT32
+        signatures[:, k] = np.minimum.reduceat(permuted, starts)
+    return signatures
+
+
+def minhash_signatures(texts: List[str]) -> np.ndarray:
+    """(documents x SIGNATURE_SIZE) MinHash signatures"""
+    return _signatures(*_shingle_hashes(texts))
+
+
+def candidate_pairs(signatures: np.ndarray) -> np.ndarray:
+    """(pairs x 2) positions sharing at least one LSH band bucket, lower first"""
+    count = len(signatures)
+    rows = SIGNATURE_SIZE // BANDS
+    left, right = [], []
+    for band in range(BANDS):
+        columns = slice(band * rows, (band + 1) * rows)
+        keys = (signatures[:, columns] * _BAND_MULTIPLIERS[columns]).sum(axis=1)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        # Runs of equal keys are the buckets
+        run_starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        run_sizes = np.diff(np.r_[run_starts, count])
+        shared = run_sizes > 1
+        for start, size in zip(run_starts[shared].tolist(), run_sizes[shared].tolist()):
+            members = sorted(order[start:start + size].tolist())
+            if size <= MAX_BUCKET_PAIRS:
+                for i in range(size - 1):
+                    left.extend([members[i]] * (size - 1 - i))
+                    right.extend(members[i + 1:])
+            else:
+                left.extend([members[0]] * (size - 1))
+                right.extend(members[1:])
+    if not left:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.unique(np.stack([left, right], axis=1), axis=0)
+
+
+def _find(parents: list, x: int) -> int:
+    while parents[x] != x:
+        parents[x] = parents[parents[x]]
+        x = parents[x]
+    return x
+
+
+def _clusters(count: int, pairs) -> List[List[int]]:
+    """Connected components with more than one member, each sorted"""
+    parents = list(range(count))
+    for a, b in pairs:
+        root_a, root_b = _find(parents, a), _find(parents, b)
+        if root_a != root_b:
+            parents[max(root_a, root_b)] = min(root_a, root_b)
+
+    clusters: Dict[int, List[int]] = {}
+    for position in range(count):
+        clusters.setdefault(_find(parents, position), []).append(position)
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def cluster_texts(texts: List[str], threshold: float = DEFAULT_THRESHOLD) -> List[List[int]]:
+    """Clusters (lists of positions, lowest first) of near-duplicate texts"""
+    if len(texts) < 2:
+        return []
+    hashes, starts = _shingle_hashes(texts)
+    signatures = _signatures(hashes, starts)
+    pairs = candidate_pairs(signatures)
+
+    # The signature estimate only drops clearly dissimilar candidates; the
+    # rest are decided by exact Jaccard of their shingle sets
+    estimate = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+    pairs = pairs[estimate >= threshold - ESTIMATE_MARGIN]
+    ends = np.r_[starts[1:], len(hashes)].tolist()
+    starts = starts.tolist()
+    shingles: Dict[int, np.ndarray] = {}
+
+    def shingle_set(position: int) -> np.ndarray:
+        if position not in shingles:
+            shingles[position] = np.unique(hashes[starts[position]:ends[position]])
+        return shingles[position]
+
+    verified = []
+    for a, b in pairs.tolist():
+        set_a, set_b = shingle_set(a), shingle_set(b)
+        common = len(np.intersect1d(set_a, set_b, assume_unique=True))
+        if common >= threshold * (len(set_a) + len(set_b) - common):
+            verified.append((a, b))
+    return _clusters(len(texts), verified)
+
+
+def find_near_duplicates(bank, threshold: float = DEFAULT_THRESHOLD) -> List[List[int]]:
+    """Near-duplicate clusters of QuestionBank record positions"""
+    return cluster_texts([record_text(record) for record in bank.records], threshold)
+
+
+def duplicate_positions(bank, threshold: float = DEFAULT_THRESHOLD) -> Set[int]:
+    """Positions to leave out of sampling: all but the first of each cluster"""
+    return {
+        position
+        for cluster in find_near_duplicates(bank, threshold)
+        for position in cluster[1:]
+    }
+
+
+def _exact_jaccard_clusters(texts: List[str], threshold: float) -> Set[tuple]:
+    """Pairs above the threshold by exact Jaccard (quadratic reference)"""
+    sets = []
+    for text in texts:
+        tokens = TOKEN_RE.findall(text.lower()) or [""]
+        tokens += [None] * (SHINGLE_SIZE - 1)
+        sets.append({tuple(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - 2)})
+    pairs = set()
+    for i in range(len(sets)):
+        for j in range(i + 1, len(sets)):
+            union = len(sets[i] | sets[j])
+            if union and len(sets[i] & sets[j]) / union >= threshold:
+                pairs.add((i, j))
+    return pairs
+
+
+def _synthetic_texts(size: int) -> List[str]:
+    """Bank texts repeated with word edits: some copies near-identical, most not"""
+    import random
+    from pathlib import Path
+    from .loader import QuestionLoader
+
+    bank = QuestionLoader(str(Path(__file__).parent)).load_bank(use_snapshot=False)
+    base = [record_text(record) for record in bank.records]
+    words = sorted({word for text in base for word in text.split()})
+    rng = random.Random(11)
+    texts = []
+    for i in range(size):
+        tokens = base[i % len(base)].split()
+        # Every 10th copy gets one edit (a near duplicate), the rest are rewritten
+        edits = 1 if i % 10 == 0 else max(3, len(tokens) // 2)
+        for _ in range(edits):
+            tokens[rng.randrange(len(tokens))] = rng.choice(words)
+        texts.append(f"{' '.join(tokens)} v{i}")
+    return texts
+
+
+def _benchmark(size: int, sample: int = 1500):
+    import time
+
+    texts = _synthetic_texts(size)
+    start = time.perf_counter()
+    signatures = minhash_signatures(texts)
+    signed = time.perf_counter()
+    pairs = candidate_pairs(signatures)
+    paired = time.perf_counter()
+    clusters = cluster_texts(texts)
+    total = time.perf_counter() - start
+    print(f"{size} questions: signatures {signed - start:.2f} s, "
+          f"LSH {paired - signed:.2f} s ({len(pairs)} candidate pairs), "
+          f"full pipeline {total:.2f} s, {len(clusters)} clusters")
+
+    # Quality against exact Jaccard on a sample
+    subset = texts[:sample]
+    start = time.perf_counter()
+    exact = _exact_jaccard_clusters(subset, DEFAULT_THRESHOLD)
+    elapsed = time.perf_counter() - start
+    found = set()
+    for cluster in cluster_texts(subset):
+        found.update((a, b) for i, a in enumerate(cluster) for b in cluster[i + 1:])
+    recall = len(exact & found) / len(exact) if exact else 1.0
+    precision = len(exact & found) / len(found) if found else 1.0
+    print(f"exact Jaccard on {sample}: {elapsed:.2f} s "
+          f"(~{elapsed * (size / sample) ** 2 / 60:.0f} min at {size}); "
+          f"{len(exact)} pairs, MinHash recall {recall:.1%}, precision {precision:.1%}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    if command == "report":
+        from pathlib import Path
+        from .loader import QuestionLoader
+
+        threshold = float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_THRESHOLD
+        bank = QuestionLoader(str(Path(__file__).parent)).load_bank()
+        clusters = find_near_duplicates(bank, threshold)
+        report = []
+        for cluster in clusters:
+            members = [bank.record_dict(position) for position in cluster]
+            report.append([
+                {'source_file': m['source_file'], 'category': m['category'],
+                 'question_text': m['question_text'], 'code': m['code']}
+                for m in members
+            ])
+            print(f"\n{len(cluster)} near-duplicates:")
+            for m in members:
+                print(f"  [{m['category']}] {m['source_file'] or '-'}: "
+                      f"{m['question_text'][:60]!r}")
+        print(f"\n{len(clusters)} clusters, {sum(len(c) - 1 for c in clusters)} "
+              f"suppressible questions of {len(bank)}")
+        if len(sys.argv) > 3:
+            from ..utils import codec
+            codec.dump_file(sys.argv[3], report, indent=True)
+    elif command == "bench":
+        _benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 100_000)
+    else:
+        print("usage: python -m bot.questions.dedup [report [threshold] [output.json]|bench [n]]")
+        sys.exit(2)
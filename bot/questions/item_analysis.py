@@ -0,0 +1,297 @@
+"""Item analysis: empirical difficulty and discrimination per question
+
+analyze() loads user_answers into NumPy arrays and computes per question
+  - p-value: share of correct answers
+  - discrimination: point-biserial correlation between answering the
+    question correctly and the user's accuracy on their other answers
+  - average time_taken_seconds
+with bincount reductions over all answers at once. Results replace the
+rows of question_stats; with apply=True, questions with at least
+MIN_ANSWERS answers get `difficulty` rewritten from their p-value.
+
+Only raw answers are analysed, so with answer retention enabled the
+statistics cover the retention window.
+
+`python -m bot.questions.item_analysis run [--apply]` runs the job,
+`python -m bot.questions.item_analysis bench [answers]` compares it with
+a per-question ORM loop on synthetic data.
+"""
+import math
+import time
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import select, delete, insert, update, func, cast, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import Question, QuestionStats, UserAnswer
+
+MIN_ANSWERS = 30
+
+# A question at least EASY_P answered correctly is easy, below HARD_P hard
+EASY_P = 0.8
+HARD_P = 0.5
+
+
+class ItemStats(NamedTuple):
+    """Per-question statistics as parallel arrays ordered by question id"""
+    question_ids: np.ndarray
+    answers: np.ndarray
+    p_value: np.ndarray
+    discrimination: np.ndarray  # NaN where undefined
+    avg_time: np.ndarray  # NaN where no timings
+
+
+def suggest_difficulty(p_value: float, answers: int) -> Optional[str]:
+    """Difficulty label from a p-value, None with too few answers"""
+    if answers < MIN_ANSWERS:
+        return None
+    if p_value >= EASY_P:
+        return "easy"
+    if p_value < HARD_P:
+        return "hard"
+    return "medium"
+
+
+def compute_item_stats(
+    user_ids: np.ndarray,
+    question_ids: np.ndarray,
+    correct: np.ndarray,
+    times: np.ndarray
+) -> ItemStats:
+    """Item statistics from one row per answer (times < 0 mean unknown)"""
+    questions, q = np.unique(question_ids, return_inverse=True)
+    _, u = np.unique(user_ids, return_inverse=True)
+    size = len(questions)
+    x = correct.astype(np.float64)
+
+    # Ability of the answering user, excluding this answer
+    user_answers = np.bincount(u).astype(np.float64)
+    user_correct = np.bincount(u, weights=x)
+    rest_answers = user_answers[u] - 1
+    has_rest = rest_answers > 0
+    rest = np.where(has_rest, (user_correct[u] - x) / np.maximum(rest_answers, 1), 0.0)
+
+    answers = np.bincount(q, minlength=size)
+    p_value = np.bincount(q, weights=x, minlength=size) / answers
+
+    # Point-biserial = Pearson correlation of x and rest, from per-question sums
+    w = has_rest.astype(np.float64)
+    n = np.bincount(q, weights=w, minlength=size)
+    sum_x = np.bincount(q, weights=x * w, minlength=size)
+    sum_y = np.bincount(q, weights=rest * w, minlength=size)
+    sum_xy = np.bincount(q, weights=x * rest * w, minlength=size)
+    sum_yy = np.bincount(q, weights=rest * rest * w, minlength=size)
+    var_x = n * sum_x - sum_x * sum_x  # x * x == x for 0/1
+    var_y = n * sum_yy - sum_y * sum_y
+    denominator = np.sqrt(np.clip(var_x, 0, None) * np.clip(var_y, 0, None))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        discrimination = np.where(
+            denominator > 1e-12, (n * sum_xy - sum_x * sum_y) / denominator, np.nan
+        )
+
+    timed = times >= 0
+    timed_count = np.bincount(q, weights=timed, minlength=size)
+    time_sum = np.bincount(q, weights=np.where(timed, times, 0), minlength=size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_time = np.where(timed_count > 0, time_sum / timed_count, np.nan)
+
+    return ItemStats(questions, answers, p_value, discrimination, avg_time)
+
+
+def _fetch_rows(connection) -> list:
+    # Plain DBAPI tuples: building Row objects costs more than the analysis
+    statement = select(
+        UserAnswer.user_id,
+        UserAnswer.question_id,
+        cast(UserAnswer.is_correct, Integer),
+        func.coalesce(UserAnswer.time_taken_seconds, -1)
+    )
+    sql = str(statement.compile(connection, compile_kwargs={"literal_binds": True}))
+    return connection.exec_driver_sql(sql).cursor.fetchall()
+
+
+async def load_answers(session: AsyncSession) -> Dict[str, np.ndarray]:
+    """user_answers as column arrays (time -1 where unknown)"""
+    connection = await session.connection()
+    rows = await connection.run_sync(_fetch_rows)
+    data = np.array(rows, dtype=np.int64).reshape(-1, 4)
+    return {
+        'user_ids': data[:, 0],
+        'question_ids': data[:, 1],
+        'correct': data[:, 2],
+        'times': data[:, 3]
+    }
+
+
+def _optional(value: float) -> Optional[float]:
+    return None if math.isnan(value) else float(value)
+
+
+async def store_item_stats(session: AsyncSession, stats: ItemStats, apply: bool = False) -> int:
+    """Replace question_stats; optionally rewrite Question.difficulty"""
+    now = datetime.utcnow()
+    rows = []
+    difficulties = []
+    for i, question_id in enumerate(stats.question_ids.tolist()):
+        answers = int(stats.answers[i])
+        suggested = suggest_difficulty(float(stats.p_value[i]), answers)
+        rows.append({
+            'question_id': question_id,
+            'answers': answers,
+            'p_value': float(stats.p_value[i]),
+            'discrimination': _optional(stats.discrimination[i]),
+            'avg_time_seconds': _optional(stats.avg_time[i]),
+            'suggested_difficulty': suggested,
+            'computed_at': now
+        })
+        if suggested is not None:
+            difficulties.append({'id': question_id, 'difficulty': suggested})
+
+    await session.execute(delete(QuestionStats))
+    if rows:
+        await session.execute(insert(QuestionStats), rows)
+    if apply and difficulties:
+        await session.execute(update(Question), difficulties)
+    await session.commit()
+    return len(difficulties) if apply else 0
+
+
+async def analyze(session: AsyncSession, apply: bool = False) -> ItemStats:
+    """Run the item analysis and store the results"""
+    answers = await load_answers(session)
+    stats = compute_item_stats(**answers)
+    await store_item_stats(session, stats, apply=apply)
+    return stats
+
+
+async def _orm_loop(session: AsyncSession) -> ItemStats:
+    """Reference implementation: per-question ORM queries and Python loops"""
+    user_totals = {}
+    result = await session.execute(
+        select(UserAnswer.user_id, func.count(UserAnswer.id),
+               func.sum(cast(UserAnswer.is_correct, Integer)))
+        .group_by(UserAnswer.user_id)
+    )
+    for user_id, answers, correct in result:
+        user_totals[user_id] = (answers, correct or 0)
+
+    question_ids = (await session.execute(
+        select(UserAnswer.question_id).distinct().order_by(UserAnswer.question_id)
+    )).scalars().all()
+
+    columns: List[list] = [[], [], [], [], []]
+    for question_id in question_ids:
+        answers = (await session.execute(
+            select(UserAnswer).where(UserAnswer.question_id == question_id)
+        )).scalars().all()
+        n = sx = sy = sxy = syy = 0.0
+        correct = timed = time_sum = 0
+        for answer in answers:
+            x = 1.0 if answer.is_correct else 0.0
+            correct += x
+            if answer.time_taken_seconds is not None:
+                timed += 1
+                time_sum += answer.time_taken_seconds
+            user_answers, user_correct = user_totals[answer.user_id]
+            if user_answers > 1:
+                y = (user_correct - x) / (user_answers - 1)
+                n += 1
+                sx += x
+                sy += y
+                sxy += x * y
+                syy += y * y
+        denominator = math.sqrt(max(n * sx - sx * sx, 0) * max(n * syy - sy * sy, 0))
+        columns[0].append(question_id)
+        columns[1].append(len(answers))
+        columns[2].append(correct / len(answers))
+        columns[3].append((n * sxy - sx * sy) / denominator if denominator > 1e-12 else math.nan)
+        columns[4].append(time_sum / timed if timed else math.nan)
+    return ItemStats(*(np.array(column) for column in columns))
+
+
+def _generate_answers(path: str, answers: int, users: int = 5000, questions: int = 150):
+    """Write synthetic answers (logistic ability/difficulty model) with sqlite3"""
+    import sqlite3
+
+    rng = np.random.default_rng(42)
+    ability = rng.normal(0, 1, users)
+    difficulty = rng.normal(0, 1, questions)
+    user_ids = rng.integers(0, users, answers)
+    question_ids = rng.integers(0, questions, answers)
+    chance = 1 / (1 + np.exp(difficulty[question_ids] - ability[user_ids]))
+    correct = rng.random(answers) < chance
+    times = rng.integers(5, 120, answers)
+
+    connection = sqlite3.connect(path)
+    connection.executemany(
+        "INSERT INTO user_answers (user_id, question_id, selected_answer, is_correct, "
+        "time_taken_seconds) VALUES (?, ?, 'A', ?, ?)",
+        zip((user_ids + 1).tolist(), (question_ids + 1).tolist(),
+            correct.tolist(), times.tolist())
+    )
+    connection.commit()
+    connection.close()
+
+
+async def _benchmark(answers: int):
+    import os
+    import tempfile
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from ..database.models import Base
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        _generate_answers(path, answers)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        print(f"{answers} synthetic answers")
+
+        async with session_maker() as session:
+            start = time.perf_counter()
+            data = await load_answers(session)
+            loaded = time.perf_counter()
+            fast = compute_item_stats(**data)
+            computed = time.perf_counter()
+        numpy_elapsed = computed - start
+        print(f"{'numpy: load':<28}{(loaded - start) * 1000:10.1f} ms")
+        print(f"{'numpy: compute':<28}{(computed - loaded) * 1000:10.1f} ms")
+
+        async with session_maker() as session:
+            start = time.perf_counter()
+            slow = await _orm_loop(session)
+            elapsed = time.perf_counter() - start
+        print(f"{'ORM per-question loop':<28}{elapsed * 1000:10.1f} ms")
+        print(f"speedup: {elapsed / numpy_elapsed:.1f}x")
+
+        for name in ItemStats._fields:
+            if not np.allclose(getattr(fast, name), getattr(slow, name), equal_nan=True):
+                print(f"MISMATCH in {name}")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "run"
+    if command == "run":
+        from ..database.db import async_session_maker, init_db, close_db
+
+        async def _run(apply: bool):
+            await init_db()
+            async with async_session_maker() as session:
+                stats = await analyze(session, apply=apply)
+            await close_db()
+            print(f"Analysed {int(stats.answers.sum())} answers "
+                  f"for {len(stats.question_ids)} questions")
+
+        asyncio.run(_run("--apply" in sys.argv))
+    elif command == "bench":
+        asyncio.run(_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000))
+    else:
+        print("usage: python -m bot.questions.item_analysis [run [--apply]|bench [answers]]")
+        sys.exit(2)
@@ -1,10 +1,38 @@
 """Question loader - Load questions from JSON files into database"""
-import json
+import asyncio
 import os
 from pathlib import Path
-from sqlalchemy import select
+from typing import NamedTuple, Optional, Tuple
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..database.models import Question
+from ..utils import codec
+from .snapshot import FIELDS, QUESTION_FILES, QuestionBank, load_snapshot
+from .catalog import (
+    QuestionCatalog, SPLAT_SUBCATEGORIES, SPLAT_POOL, ALL_POOL, get_catalog, set_catalog
+)
+from .coverage import coverage_store
+from .search import SearchIndex, set_search_index
+from .dedup import duplicate_positions
+
+# Leave all but one question of each near-duplicate cluster out of quizzes
+SUPPRESS_NEAR_DUPLICATES = os.getenv("SUPPRESS_NEAR_DUPLICATES", "0") == "1"
+
+# Set from the JSON files on insert only: item analysis may rewrite them in the database
+DB_MANAGED_FIELDS = ('difficulty',)
+
+_SOURCE_FILE = FIELDS.index('source_file')
+_QUESTION_TEXT = FIELDS.index('question_text')
+
+
+class BankDiff(NamedTuple):
+    """Records of a bank compared with the questions table by stable key"""
+    inserted: int
+    updated: int
+    retired: int  # rows whose key is no longer in the bank
+
+    def __str__(self) -> str:
+        return f"{self.inserted} new, {self.updated} changed, {self.retired} removed"
 
 
 class QuestionLoader:
@@ -18,76 +46,148 @@ class QuestionLoader:
         else:
             self.questions_dir = Path(questions_dir)
 
-    def load_json_file(self, filename: str) -> list:
-        """Load questions from a JSON file"""
+    def load_json_file(self, filename: str, strict: bool = False) -> list:
+        """Load questions from a JSON file (a parse error raises if strict)"""
         filepath = self.questions_dir / filename
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return codec.load_file(filepath)
         except FileNotFoundError:
             print(f"Warning: {filepath} not found")
             return []
-        except json.JSONDecodeError as e:
+        except codec.DecodeError as e:
+            if strict:
+                raise
             print(f"Error parsing {filepath}: {e}")
             return []
 
-    async def load_all_questions(self, session: AsyncSession):
-        """Load all questions from JSON files into database"""
-        question_files = [
-            'splat_tests.json',
-            'cfg_grammar.json',
-            'compiler_phases.json',
-            'java_basics.json'
-        ]
-
-        total_loaded = 0
-
-        for filename in question_files:
-            questions_data = self.load_json_file(filename)
-            for q_data in questions_data:
-                # Check if question already exists
-                result = await session.execute(
-                    select(Question).where(
-                        Question.source_file == q_data.get('source_file'),
-                        Question.question_text == q_data.get('question_text')
-                    )
-                )
-                existing = result.scalar_one_or_none()
-
-                if not existing:
-                    question = Question(
-                        category=q_data.get('category'),
-                        subcategory=q_data.get('subcategory'),
-                        question_text=q_data.get('question_text'),
-                        code=q_data.get('code'),
-                        option_a=q_data.get('option_a'),
-                        option_b=q_data.get('option_b'),
-                        option_c=q_data.get('option_c'),
-                        option_d=q_data.get('option_d'),
-                        option_e=q_data.get('option_e'),
-                        correct_answer=q_data.get('correct_answer'),
-                        explanation=q_data.get('explanation'),
-                        difficulty=q_data.get('difficulty', 'medium'),
-                        source_file=q_data.get('source_file'),
-                        line_number=q_data.get('line_number'),
-                        column_number=q_data.get('column_number')
-                    )
+    def load_bank_from_json(self, strict: bool = False) -> QuestionBank:
+        """Parse and validate the JSON question files"""
+        return QuestionBank.from_json_data(
+            ((filename, self.load_json_file(filename, strict)) for filename in QUESTION_FILES),
+            strict=strict
+        )
+
+    def load_bank(self, use_snapshot: bool = True, strict: bool = False) -> QuestionBank:
+        """Load the compiled snapshot, falling back to JSON if it is missing or stale
+
+        With strict, a malformed file or record raises instead of being
+        skipped, so a half-edited file cannot remove its questions.
+        """
+        if use_snapshot:
+            bank = load_snapshot(self.questions_dir)
+            if bank is not None:
+                return bank
+            print("Question snapshot missing or stale, parsing JSON files")
+        return self.load_bank_from_json(strict)
+
+    async def load_all_questions(self, session: AsyncSession, use_snapshot: bool = True):
+        """Load all questions into database and publish the catalog and search index"""
+        # Parse off the event loop so updates keep flowing during startup
+        bank = await asyncio.to_thread(self.load_bank, use_snapshot)
+        diff, id_by_key = await self.sync_bank(session, bank)
+        await self.publish_bank(bank, id_by_key)
+
+        if diff.updated or diff.retired:
+            print(f"Question bank: {diff}")
+        print(f"Loaded {diff.inserted} new questions into database")
+        return diff.inserted
+
+    async def sync_bank(
+        self,
+        session: AsyncSession,
+        bank: QuestionBank,
+        apply: bool = True
+    ) -> Tuple[BankDiff, dict]:
+        """Diff a bank against the questions table and apply it in one transaction
+
+        Records are matched by their stable key (source_file, question_text).
+        New ones are inserted and changed ones updated in place, so question
+        ids never change. Rows whose key left the bank are retired: they stay
+        in the table, since answers, review queues and quizzes in flight refer
+        to them, but get no id in the returned map and so are left out of the
+        catalog and search index. With apply=False the diff is only computed.
+        Returns the diff and the key -> id map of the bank's records.
+        """
+        # One query for every existing row instead of one lookup per record
+        result = await session.execute(
+            select(Question.id, *(getattr(Question, name) for name in FIELDS))
+        )
+        rows = {}
+        for question_id, *values in result:
+            rows.setdefault((values[_SOURCE_FILE], values[_QUESTION_TEXT]), (question_id, values))
+
+        compared = [i for i, name in enumerate(FIELDS) if name not in DB_MANAGED_FIELDS]
+        id_by_key = {}
+        new_questions = []
+        updated = 0
+        for position in range(len(bank)):
+            key = bank.key(position)
+            if key in id_by_key:
+                continue
+            existing = rows.get(key)
+            if existing is None:
+                id_by_key[key] = None
+                if apply:
+                    question = Question(**bank.record_dict(position))
                     session.add(question)
-                    total_loaded += 1
+                    new_questions.append((key, question))
+                continue
 
-        await session.commit()
-        print(f"Loaded {total_loaded} new questions into database")
-        return total_loaded
+            question_id, values = existing
+            id_by_key[key] = question_id
+            record = bank.records[position]
+            changed = {FIELDS[i]: record[i] for i in compared if record[i] != values[i]}
+            if changed:
+                updated += 1
+                if apply:
+                    await session.execute(
+                        update(Question).where(Question.id == question_id).values(**changed)
+                    )
+
+        inserted = sum(1 for question_id in id_by_key.values() if question_id is None)
+        diff = BankDiff(inserted, updated, len(rows.keys() - id_by_key.keys()))
+        if apply:
+            if new_questions:
+                await session.flush()
+                for key, question in new_questions:
+                    id_by_key[key] = question.id
+            await session.commit()
+        return diff, {key: qid for key, qid in id_by_key.items() if qid is not None}
+
+    @staticmethod
+    async def publish_bank(bank: QuestionBank, id_by_key: dict):
+        """Build the catalog and search index of a bank, then swap both in"""
+        excluded = set()
+        if SUPPRESS_NEAR_DUPLICATES:
+            excluded = await asyncio.to_thread(duplicate_positions, bank)
+            print(f"Suppressing {len(excluded)} near-duplicate questions")
+        catalog = QuestionCatalog.from_bank(bank, id_by_key, exclude=excluded)
+        index = await asyncio.to_thread(SearchIndex.from_bank, bank, id_by_key)
+
+        # No await between the swaps: a handler sees both old or both new
+        set_catalog(catalog)
+        set_search_index(index)
 
     async def get_questions_by_category(
         self,
         session: AsyncSession,
         category: str,
-        limit: int = 10
+        limit: int = 10,
+        user_id: Optional[int] = None
     ) -> list:
-        """Get random questions by category"""
+        """Get random questions by category (unseen by user_id first)"""
         from sqlalchemy import func
 
+        catalog = get_catalog()
+        if catalog is not None:
+            if user_id is not None:
+                return await self._sample_unseen(
+                    session, catalog, f"category:{category}", limit, user_id
+                )
+            return await self.get_questions_by_ids(
+                session, catalog.sample_category(category, limit)
+            )
+
         result = await session.execute(
             select(Question)
             .where(Question.category == category)
@@ -100,11 +200,22 @@ class QuestionLoader:
         self,
         session: AsyncSession,
         subcategory: str,
-        limit: int = 10
+        limit: int = 10,
+        user_id: Optional[int] = None
     ) -> list:
-        """Get random questions by subcategory"""
+        """Get random questions by subcategory (unseen by user_id first)"""
         from sqlalchemy import func
 
+        catalog = get_catalog()
+        if catalog is not None:
+            if user_id is not None:
+                return await self._sample_unseen(
+                    session, catalog, f"subcategory:{subcategory}", limit, user_id
+                )
+            return await self.get_questions_by_ids(
+                session, catalog.sample_subcategory(subcategory, limit)
+            )
+
         result = await session.execute(
             select(Question)
             .where(Question.subcategory == subcategory)
@@ -116,11 +227,18 @@ class QuestionLoader:
     async def get_random_questions(
         self,
         session: AsyncSession,
-        limit: int = 10
+        limit: int = 10,
+        user_id: Optional[int] = None
     ) -> list:
-        """Get random questions from all categories"""
+        """Get random questions from all categories (unseen by user_id first)"""
         from sqlalchemy import func
 
+        catalog = get_catalog()
+        if catalog is not None:
+            if user_id is not None:
+                return await self._sample_unseen(session, catalog, ALL_POOL, limit, user_id)
+            return await self.get_questions_by_ids(session, catalog.sample_all(limit))
+
         result = await session.execute(
             select(Question)
             .order_by(func.random())
@@ -128,31 +246,63 @@ class QuestionLoader:
         )
         return result.scalars().all()
 
+    async def _sample_unseen(
+        self,
+        session: AsyncSession,
+        catalog: QuestionCatalog,
+        pool: str,
+        limit: int,
+        user_id: int
+    ) -> list:
+        """Questions from a catalog pool, preferring ones the user has not been served"""
+        question_ids = await coverage_store.sample(
+            session, user_id, pool, catalog.pool(pool), limit
+        )
+        return await self.get_questions_by_ids(session, question_ids)
+
     async def get_question_by_id(
         self,
         session: AsyncSession,
         question_id: int
     ) -> Question:
-        """Get a specific question by ID"""
+        """Get a specific question by ID (no query if the session already loaded it)"""
+        return await session.get(Question, question_id)
+
+    async def get_questions_by_ids(
+        self,
+        session: AsyncSession,
+        question_ids: list
+    ) -> list:
+        """Get questions by ID, keeping the order of question_ids"""
+        if not question_ids:
+            return []
+
         result = await session.execute(
-            select(Question).where(Question.id == question_id)
+            select(Question).where(Question.id.in_(question_ids))
         )
-        return result.scalar_one_or_none()
+        by_id = {q.id: q for q in result.scalars().all()}
+        return [by_id[qid] for qid in question_ids if qid in by_id]
 
     async def get_splat_random_questions(
         self,
         session: AsyncSession,
-        limit: int = 20
+        limit: int = 20,
+        user_id: Optional[int] = None
     ) -> list:
-        """Get random questions from SPLAT tests (all subcategories)"""
+        """Get random questions from SPLAT tests (all subcategories, unseen first)"""
         from sqlalchemy import func
 
-        # Get questions from SPLAT subcategories
-        splat_subcategories = ['badlex', 'badparse', 'badsemantics', 'badexecution', 'goodexecution']
+        catalog = get_catalog()
+        if catalog is not None:
+            if user_id is not None:
+                return await self._sample_unseen(session, catalog, SPLAT_POOL, limit, user_id)
+            return await self.get_questions_by_ids(
+                session, catalog.sample_subcategories(SPLAT_SUBCATEGORIES, limit)
+            )
 
         result = await session.execute(
             select(Question)
-            .where(Question.subcategory.in_(splat_subcategories))
+            .where(Question.subcategory.in_(SPLAT_SUBCATEGORIES))
             .order_by(func.random())
             .limit(limit)
         )
@@ -0,0 +1,107 @@
+"""Hot reload of the question bank without a restart
+
+BankWatcher checks the digest of the JSON bank files every
+QUESTION_RELOAD_SECONDS (0 turns polling off); admins can also force a
+reload with /reload_questions. A reload parses the files off the event loop,
+diffs them against the questions table by stable key (source_file,
+question_text), applies inserts and updates in one transaction, and swaps
+the catalog and search index together (see QuestionLoader.sync_bank and
+publish_bank). Question ids never change and removed records stay in the
+table, so quizzes in flight keep resolving their questions; they just stop
+being drawn for new quizzes. The compiled snapshot is rebuilt afterwards so
+the next start takes the fast path.
+
+With WORKERS > 1 the supervisor applies the changes and the workers only
+republish, once the database matches the new files (so polling must stay
+on for /reload_questions to take effect).
+"""
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from .loader import BankDiff, QuestionLoader
+from .snapshot import build_snapshot, sources_digest
+
+logger = logging.getLogger(__name__)
+
+RELOAD_INTERVAL = 10.0
+
+
+def reload_interval() -> float:
+    """QUESTION_RELOAD_SECONDS, read when a watcher is started (after .env is loaded)"""
+    return float(os.getenv("QUESTION_RELOAD_SECONDS", str(RELOAD_INTERVAL)))
+
+
+class BankWatcher:
+    """Reload the question bank when its JSON files change"""
+
+    def __init__(
+        self,
+        loader: QuestionLoader = None,
+        session_maker=None,
+        interval: float = RELOAD_INTERVAL,
+        apply: bool = True,
+        publish: bool = True
+    ):
+        self.loader = loader or QuestionLoader()
+        self.session_maker = session_maker
+        self.interval = interval
+        self.apply = apply
+        self.publish = publish
+        self.digest: Optional[bytes] = None
+        self.reloads = 0
+        self._lock = asyncio.Lock()
+
+    def _sessions(self):
+        if self.session_maker is None:
+            from ..database.db import async_session_maker
+            self.session_maker = async_session_maker
+        return self.session_maker()
+
+    async def reload(self, force: bool = False) -> Optional[BankDiff]:
+        """Apply and publish the bank if its files changed (or if forced)
+
+        Returns the diff, or None if nothing was reloaded: the files did not
+        change, or (for a worker) the database does not have them yet.
+        Invalid files raise and leave the published bank as it was.
+        """
+        async with self._lock:
+            directory = self.loader.questions_dir
+            digest = await asyncio.to_thread(sources_digest, directory)
+            if digest == self.digest and not force:
+                return None
+
+            bank = await asyncio.to_thread(self.loader.load_bank, True, True)
+            async with self._sessions() as session:
+                diff, id_by_key = await self.loader.sync_bank(session, bank, apply=self.apply)
+            if not self.apply and (diff.inserted or diff.updated):
+                # The supervisor has not applied the files yet; retry on the next check
+                return None
+            if self.publish:
+                await self.loader.publish_bank(bank, id_by_key)
+            changed, self.digest = digest != self.digest, digest
+            self.reloads += 1
+
+            logger.info(f"Question bank reloaded: {diff}")
+            if self.apply and changed:
+                try:
+                    await asyncio.to_thread(build_snapshot, directory)
+                except OSError as e:
+                    logger.warning(f"Question snapshot not rebuilt: {e}")
+            return diff
+
+    async def run(self):
+        """Poll the bank files until cancelled; the bank loaded at startup is current"""
+        if self.interval <= 0:
+            return
+        self.digest = await asyncio.to_thread(sources_digest, self.loader.questions_dir)
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.warning(f"Question bank reload failed: {e}")
+
+
+bank_watcher = BankWatcher()
@@ -0,0 +1,199 @@
+"""Spaced-repetition review scheduling (Leitner boxes)"""
+import heapq
+import struct
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import ReviewState, UserAnswer
+
+# Review interval in minutes for each Leitner box. A wrong answer sends the
+# question back to box 0, a correct one moves it up a box.
+BOX_INTERVALS = [10, 1440, 3 * 1440, 7 * 1440, 14 * 1440, 30 * 1440]
+MAX_BOX = len(BOX_INTERVALS) - 1
+
+STATE_VERSION = 1
+_HEADER = struct.Struct("<B")
+_RECORD = struct.Struct("<IIB")  # question_id, due (minutes since epoch), box
+
+
+def now_minutes(moment: Optional[datetime] = None) -> int:
+    """Minutes since the Unix epoch (UTC)"""
+    moment = moment or datetime.utcnow()
+    return int((moment - datetime(1970, 1, 1)).total_seconds() // 60)
+
+
+class ReviewQueue:
+    """Per-user Leitner state with a due heap kept up to date incrementally
+
+    `entries` maps question_id -> (due, box). The heap holds (due, question_id)
+    pairs; entries superseded by a later answer stay in the heap and are
+    skipped when they surface, so recording an answer is O(log n).
+    """
+
+    def __init__(self, entries: Dict[int, Tuple[int, int]] = None):
+        self.entries = entries or {}
+        self._heap = [(due, qid) for qid, (due, _) in self.entries.items()]
+        heapq.heapify(self._heap)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def record(self, question_id: int, is_correct: bool, at_minute: int):
+        """Move a question between boxes after an answer"""
+        _, box = self.entries.get(question_id, (0, 0))
+        box = min(box + 1, MAX_BOX) if is_correct else 0
+        due = at_minute + BOX_INTERVALS[box]
+        self.entries[question_id] = (due, box)
+        heapq.heappush(self._heap, (due, question_id))
+        if len(self._heap) > 2 * len(self.entries) + 16:
+            self._compact()
+
+    def _compact(self):
+        self._heap = [(due, qid) for qid, (due, _) in self.entries.items()]
+        heapq.heapify(self._heap)
+
+    def due(self, limit: int, at_minute: int) -> List[int]:
+        """Up to `limit` question ids that are due, most overdue first
+
+        Pops at most `limit` live entries plus any stale ones, then pushes the
+        live ones back: O(k log n) without touching the answer history.
+        """
+        picked = []
+        while self._heap and len(picked) < limit:
+            due, qid = self._heap[0]
+            if due > at_minute:
+                break
+            heapq.heappop(self._heap)
+            if self.entries.get(qid, (None,))[0] == due:
+                picked.append((due, qid))
+        for item in picked:
+            heapq.heappush(self._heap, item)
+        return [qid for _, qid in picked]
+
+    def next_due(self) -> Optional[int]:
+        """Minute at which the earliest question becomes due"""
+        while self._heap:
+            due, qid = self._heap[0]
+            if self.entries.get(qid, (None,))[0] == due:
+                return due
+            heapq.heappop(self._heap)
+        return None
+
+    def to_bytes(self) -> bytes:
+        """Pack as a version byte followed by 9-byte records"""
+        parts = [_HEADER.pack(STATE_VERSION)]
+        parts.extend(
+            _RECORD.pack(qid, due, box) for qid, (due, box) in self.entries.items()
+        )
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ReviewQueue":
+        """Unpack state written by to_bytes"""
+        if not data or _HEADER.unpack_from(data)[0] != STATE_VERSION:
+            return cls()
+        body = memoryview(data)[_HEADER.size:]
+        return cls({qid: (due, box) for qid, due, box in _RECORD.iter_unpack(body)})
+
+
+class ReviewStore:
+    """Load, cache and persist review queues
+
+    Queues are loaded lazily from `review_states`; a user without saved state
+    is bootstrapped once by replaying their answer history. The cache is an
+    LRU bounded by `max_users`; every change is written through, so evicting
+    a queue never loses data.
+    """
+
+    def __init__(self, max_users: int = 5000):
+        self.max_users = max_users
+        self._cache: "OrderedDict[int, Tuple[ReviewQueue, bool]]" = OrderedDict()
+
+    async def get_queue(self, session: AsyncSession, user_id: int) -> ReviewQueue:
+        """Review queue for a user, loading or bootstrapping it on first use"""
+        cached = self._cache.get(user_id)
+        if cached is not None:
+            self._cache.move_to_end(user_id)
+            return cached[0]
+
+        result = await session.execute(
+            select(ReviewState.data).where(ReviewState.user_id == user_id)
+        )
+        data = result.scalar_one_or_none()
+        if data is not None:
+            queue, persisted = ReviewQueue.from_bytes(data), True
+        else:
+            queue, persisted = await self._replay_history(session, user_id), False
+
+        self._remember(user_id, queue, persisted)
+        return queue
+
+    async def _replay_history(self, session: AsyncSession, user_id: int) -> ReviewQueue:
+        queue = ReviewQueue()
+        result = await session.execute(
+            select(UserAnswer.question_id, UserAnswer.is_correct, UserAnswer.answered_at)
+            .where(UserAnswer.user_id == user_id)
+            .order_by(UserAnswer.id)
+        )
+        for question_id, is_correct, answered_at in result:
+            queue.record(question_id, is_correct, now_minutes(answered_at))
+        return queue
+
+    def _remember(self, user_id: int, queue: ReviewQueue, persisted: bool):
+        self._cache[user_id] = (queue, persisted)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.max_users:
+            self._cache.popitem(last=False)
+
+    async def record_answer(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        question_id: int,
+        is_correct: bool
+    ):
+        """Update the user's queue and stage the packed state in the session"""
+        await self.record_answers(session, user_id, [(question_id, is_correct)])
+
+    async def record_answers(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        answers: List[Tuple[int, bool]]
+    ):
+        """Apply (question_id, is_correct) answers in order with one state write"""
+        queue = await self.get_queue(session, user_id)
+        minute = now_minutes()
+        for question_id, is_correct in answers:
+            queue.record(question_id, is_correct, minute)
+
+        persisted = self._cache[user_id][1]
+        values = {'data': queue.to_bytes(), 'updated_at': datetime.utcnow()}
+        if persisted:
+            await session.execute(
+                update(ReviewState).where(ReviewState.user_id == user_id).values(**values)
+            )
+        else:
+            await session.execute(insert(ReviewState).values(user_id=user_id, **values))
+            self._cache[user_id] = (queue, True)
+
+    async def due_question_ids(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        limit: int = 10
+    ) -> List[int]:
+        """Question ids due for review right now"""
+        queue = await self.get_queue(session, user_id)
+        return queue.due(limit, now_minutes())
+
+    def forget(self, user_id: int):
+        """Drop a cached queue, e.g. after a rolled back transaction"""
+        self._cache.pop(user_id, None)
+
+
+review_store = ReviewStore()
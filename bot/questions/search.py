@@ -0,0 +1,303 @@
+"""Full-text question search over an in-process inverted index
+
+The index is built from the QuestionBank by QuestionLoader.load_all_questions
+alongside the question catalog, so it always matches the imported bank and
+works with any database backend. Queries are ranked with BM25 over the
+question text, code and explanation (question text weighted higher); query
+words are reduced to crude stems ("ambiguity" and "ambiguous" both index
+as "ambigu") and query terms also match longer stems they prefix. Ranked
+results are cached per normalized query, so paging through results and
+repeated searches skip scoring.
+
+`python -m bot.questions.search bench [questions]` compares query latency
+with a LIKE scan and SQLite FTS5 on a synthetic bank.
+"""
+import bisect
+import re
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9_]+")
+STOPWORDS = frozenset((
+    "a an and are as at be by does do for from how in is it its of on or that the "
+    "this to was what when which why will with"
+).split())
+
+# Stripped from the end of a word when at least MIN_STEM characters remain
+SUFFIXES = (
+    "ations", "ation", "ities", "ness", "ions", "ity", "ing", "ous", "ion", "ers",
+    "ed", "es", "er", "ly", "s", "e"
+)
+MIN_STEM = 3
+
+# Field weights in term frequency
+FIELD_WEIGHTS = (('question_text', 2.0), ('code', 1.0), ('explanation', 1.0))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+PREFIX_WEIGHT = 0.5
+MAX_EXPANSIONS = 20
+MAX_RESULTS = 100
+CACHE_SIZE = 512
+TITLE_LENGTH = 80
+
+
+def stem(word: str) -> str:
+    """Strip one common English suffix"""
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM:
+            if suffix == "s" and word.endswith("ss"):
+                continue
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Stemmed lowercase tokens without stopwords and single characters"""
+    if not text:
+        return []
+    return [
+        stem(token) for token in TOKEN_RE.findall(text.lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+class SearchHit(NamedTuple):
+    """A ranked search result"""
+    question_id: int
+    category: str
+    title: str
+
+
+class SearchPage(NamedTuple):
+    """One page of results and the total number of matches (capped at MAX_RESULTS)"""
+    total: int
+    hits: List[SearchHit]
+
+
+class SearchIndex:
+    """BM25-ranked inverted index over question records"""
+
+    def __init__(
+        self,
+        question_ids: List[int],
+        categories: List[str],
+        titles: List[str],
+        documents: List[Dict[str, float]]
+    ):
+        self.question_ids = question_ids
+        self.categories = categories
+        self.titles = titles
+
+        lengths = np.array([sum(doc.values()) for doc in documents], dtype=np.float64)
+        average = lengths.mean() if len(lengths) else 1.0
+        norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(average, 1e-9))
+
+        postings: Dict[str, Tuple[list, list]] = {}
+        for position, doc in enumerate(documents):
+            for term, frequency in doc.items():
+                docs, frequencies = postings.setdefault(term, ([], []))
+                docs.append(position)
+                frequencies.append(frequency)
+
+        # Each posting stores its full BM25 contribution: queries only add them up
+        count = len(documents)
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, (docs, frequencies) in postings.items():
+            docs = np.array(docs, dtype=np.int32)
+            frequencies = np.array(frequencies, dtype=np.float64)
+            idf = np.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            weights = idf * frequencies * (BM25_K1 + 1) / (frequencies + norms[docs])
+            self.postings[term] = (docs, weights)
+        self.vocabulary = sorted(self.postings)
+        self._cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.question_ids)
+
+    @classmethod
+    def from_bank(cls, bank, id_by_key: dict) -> "SearchIndex":
+        """Index the records of a QuestionBank that have database ids"""
+        question_ids, categories, titles, documents = [], [], [], []
+        for position in range(len(bank)):
+            question_id = id_by_key.get(bank.key(position))
+            if question_id is None:
+                continue
+            record = bank.record_dict(position)
+            doc: Dict[str, float] = {}
+            for field, weight in FIELD_WEIGHTS:
+                for token in tokenize(record[field]):
+                    doc[token] = doc.get(token, 0.0) + weight
+            question_ids.append(question_id)
+            categories.append(record['category'])
+            title = " ".join(record['question_text'].split())
+            if len(title) > TITLE_LENGTH:
+                title = title[:TITLE_LENGTH - 1] + "…"
+            titles.append(title)
+            documents.append(doc)
+        return cls(question_ids, categories, titles, documents)
+
+    def _expand(self, term: str) -> List[Tuple[str, float]]:
+        """The term itself plus vocabulary words it prefixes"""
+        expansions = [(term, 1.0)] if term in self.postings else []
+        if len(term) >= 3:
+            start = bisect.bisect_left(self.vocabulary, term)
+            for word in self.vocabulary[start:start + MAX_EXPANSIONS + 1]:
+                if not word.startswith(term):
+                    break
+                if word != term:
+                    expansions.append((word, PREFIX_WEIGHT))
+        return expansions[:MAX_EXPANSIONS]
+
+    def _rank(self, terms: tuple) -> np.ndarray:
+        scores = np.zeros(len(self.question_ids), dtype=np.float64)
+        for term in terms:
+            for word, weight in self._expand(term):
+                docs, weights = self.postings[word]
+                scores[docs] += weight * weights
+        matched = np.flatnonzero(scores)
+        if len(matched) > MAX_RESULTS:
+            matched = matched[np.argpartition(-scores[matched], MAX_RESULTS)[:MAX_RESULTS]]
+        # Highest score first, ties by bank order
+        return matched[np.lexsort((matched, -scores[matched]))]
+
+    def ranked(self, query: str) -> np.ndarray:
+        """Positions of matching records, best first (cached per query)"""
+        terms = tuple(dict.fromkeys(tokenize(query)))
+        cached = self._cache.get(terms)
+        if cached is not None:
+            self._cache.move_to_end(terms)
+            return cached
+        result = self._rank(terms) if terms else np.empty(0, dtype=np.int64)
+        self._cache[terms] = result
+        if len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return result
+
+    def search(self, query: str, offset: int = 0, limit: int = 5) -> SearchPage:
+        """A page of ranked results for a query"""
+        ranked = self.ranked(query)
+        hits = [
+            SearchHit(self.question_ids[p], self.categories[p], self.titles[p])
+            for p in ranked[offset:offset + limit].tolist()
+        ]
+        return SearchPage(len(ranked), hits)
+
+
+_index: Optional[SearchIndex] = None
+
+
+def get_search_index() -> Optional[SearchIndex]:
+    """The current index, or None until the bank has been imported"""
+    return _index
+
+
+def set_search_index(index: Optional[SearchIndex]):
+    """Publish a new index (a single reference swap)"""
+    global _index
+    _index = index
+
+
+def _synthetic_bank(size: int):
+    """The real bank repeated with varied wording up to `size` records"""
+    import random
+    from pathlib import Path
+    from .loader import QuestionLoader
+    from .snapshot import QuestionBank, FIELDS
+
+    bank = QuestionLoader(str(Path(__file__).parent)).load_bank(use_snapshot=False)
+    rng = random.Random(7)
+    words = sorted({token for record in bank.records for token in tokenize(" ".join(
+        str(value) for value in record if isinstance(value, str)
+    ))})
+    text_i, source_i = FIELDS.index('question_text'), FIELDS.index('source_file')
+    records = []
+    for i in range(size):
+        record = list(bank.records[i % len(bank)])
+        record[text_i] = f"{record[text_i]} ({' '.join(rng.sample(words, 3))} #{i})"
+        record[source_i] = f"synthetic_{i}"
+        records.append(tuple(record))
+    return QuestionBank(records)
+
+
+def _benchmark(size: int, rounds: int = 200):
+    import sqlite3
+    import time
+
+    queries = [
+        "ambiguity", "ambiguous grammar", "undeclared variable", "lexer exception",
+        "parse tree", "ambig", "return type mismatch", "java interface abstract class",
+    ]
+
+    def timed(fn) -> Tuple[float, float]:
+        samples = []
+        for _ in range(rounds):
+            for query in queries:
+                start = time.perf_counter()
+                fn(query)
+                samples.append(time.perf_counter() - start)
+        samples.sort()
+        return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.99)] * 1000
+
+    bank = _synthetic_bank(size)
+    id_by_key = {bank.key(p): p + 1 for p in range(len(bank))}
+    start = time.perf_counter()
+    index = SearchIndex.from_bank(bank, id_by_key)
+    print(f"{len(index)} questions, {len(index.vocabulary)} terms, "
+          f"index built in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def uncached(query):
+        index._cache.clear()
+        index.search(query)
+
+    connection = sqlite3.connect(":memory:")
+    connection.execute(
+        "CREATE TABLE questions (id INTEGER PRIMARY KEY, question_text TEXT, code TEXT, "
+        "explanation TEXT)"
+    )
+    connection.execute(
+        "CREATE VIRTUAL TABLE questions_fts USING fts5(question_text, code, explanation)"
+    )
+    rows = [
+        (p + 1, *(bank.record_dict(p)[field] or "" for field, _ in FIELD_WEIGHTS))
+        for p in range(len(bank))
+    ]
+    connection.executemany("INSERT INTO questions VALUES (?, ?, ?, ?)", rows)
+    connection.executemany("INSERT INTO questions_fts (rowid, question_text, code, "
+                           "explanation) VALUES (?, ?, ?, ?)", rows)
+
+    def like_scan(query):
+        terms = tokenize(query)
+        where = " AND ".join(
+            "(question_text LIKE ? OR code LIKE ? OR explanation LIKE ?)" for _ in terms
+        )
+        params = [f"%{term}%" for term in terms for _ in range(3)]
+        connection.execute(f"SELECT id FROM questions WHERE {where} LIMIT 5", params).fetchall()
+
+    def fts5(query):
+        match = " OR ".join(f"{term}*" for term in tokenize(query))
+        connection.execute(
+            "SELECT rowid FROM questions_fts WHERE questions_fts MATCH ? "
+            "ORDER BY bm25(questions_fts, 2.0, 1.0, 1.0) LIMIT 5", (match,)
+        ).fetchall()
+
+    for label, fn in (
+        ("inverted index (uncached)", uncached),
+        ("inverted index (cached)", index.search),
+        ("LIKE scan", like_scan),
+        ("SQLite FTS5", fts5),
+    ):
+        p50, p99 = timed(fn)
+        print(f"{label:<28}p50 {p50:8.3f} ms   p99 {p99:8.3f} ms")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        _benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 12000)
+    else:
+        print("usage: python -m bot.questions.search bench [questions]")
+        sys.exit(2)
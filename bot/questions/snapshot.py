@@ -0,0 +1,257 @@
+"""Compiled question-bank snapshot for fast cold start
+
+`python -m bot.questions.snapshot build` compiles the JSON banks into one
+binary file holding validated records, category/subcategory indexes and
+pre-escaped HTML. At startup the snapshot loads in a few milliseconds; if it
+is missing, corrupt, built by another Python version or older than the JSON
+files, the loader falls back to parsing the JSON.
+
+`python -m bot.questions.snapshot bench` times both cold-start paths.
+"""
+import hashlib
+import marshal
+import struct
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ..utils.text import escape_html
+
+QUESTION_FILES = [
+    'splat_tests.json',
+    'cfg_grammar.json',
+    'compiler_phases.json',
+    'java_basics.json'
+]
+
+SNAPSHOT_FILE = 'bank.snapshot'
+SNAPSHOT_MAGIC = b"SPQB"
+SNAPSHOT_VERSION = 1
+
+# magic, format version, marshal version, python major/minor, digest of JSON sources
+_HEADER = struct.Struct("<4sHHBB32s")
+
+FIELDS = (
+    'category', 'subcategory', 'question_text', 'code',
+    'option_a', 'option_b', 'option_c', 'option_d', 'option_e',
+    'correct_answer', 'explanation', 'difficulty',
+    'source_file', 'line_number', 'column_number'
+)
+HTML_FIELDS = ('question_text', 'code', 'explanation')
+REQUIRED_FIELDS = (
+    'category', 'question_text', 'option_a', 'option_b', 'correct_answer', 'explanation'
+)
+
+_FIELD_INDEX = {name: i for i, name in enumerate(FIELDS)}
+
+
+class BankValidationError(ValueError):
+    """A question record is malformed"""
+
+
+def validate_record(data: dict, filename: str, position: int) -> tuple:
+    """Check a JSON question record and return it as a FIELDS tuple"""
+    where = f"{filename}[{position}]"
+    if not isinstance(data, dict):
+        raise BankValidationError(f"{where}: expected an object")
+    for name in REQUIRED_FIELDS:
+        if not data.get(name):
+            raise BankValidationError(f"{where}: missing {name}")
+
+    correct = data['correct_answer']
+    if correct not in ('A', 'B', 'C', 'D', 'E'):
+        raise BankValidationError(f"{where}: correct_answer must be A-E, got {correct!r}")
+    if not data.get(f"option_{correct.lower()}"):
+        raise BankValidationError(f"{where}: correct_answer {correct} has no option text")
+
+    record = dict(data)
+    record.setdefault('difficulty', 'medium')
+    return tuple(record.get(name) for name in FIELDS)
+
+
+def sources_digest(questions_dir: Path, files: Iterable[str] = QUESTION_FILES) -> bytes:
+    """Digest of the JSON bank files; a snapshot is fresh only if it matches"""
+    digest = hashlib.blake2b(digest_size=32)
+    for filename in files:
+        digest.update(filename.encode())
+        try:
+            digest.update((questions_dir / filename).read_bytes())
+        except FileNotFoundError:
+            digest.update(b"\0missing")
+    return digest.digest()
+
+
+class QuestionBank:
+    """Validated question records with precomputed indexes
+
+    Records are tuples ordered as FIELDS. Indexes map a category or
+    subcategory to record positions; `html` holds pre-escaped copies of
+    HTML_FIELDS per record.
+    """
+
+    def __init__(
+        self,
+        records: List[tuple],
+        by_category: Dict[str, List[int]] = None,
+        by_subcategory: Dict[str, List[int]] = None,
+        html: List[tuple] = None
+    ):
+        self.records = records
+        if by_category is None or by_subcategory is None:
+            by_category, by_subcategory = self._build_indexes(records)
+        self.by_category = by_category
+        self.by_subcategory = by_subcategory
+        if html is None:
+            html = [
+                tuple(escape_html(record[_FIELD_INDEX[name]]) for name in HTML_FIELDS)
+                for record in records
+            ]
+        self.html = html
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @staticmethod
+    def _build_indexes(records: List[tuple]) -> Tuple[dict, dict]:
+        by_category, by_subcategory = {}, {}
+        category_i, subcategory_i = _FIELD_INDEX['category'], _FIELD_INDEX['subcategory']
+        for position, record in enumerate(records):
+            by_category.setdefault(record[category_i], []).append(position)
+            if record[subcategory_i]:
+                by_subcategory.setdefault(record[subcategory_i], []).append(position)
+        return by_category, by_subcategory
+
+    @classmethod
+    def from_json_data(cls, files: Iterable[Tuple[str, list]], strict: bool = False):
+        """Build a bank from parsed JSON lists, skipping invalid records unless strict"""
+        records = []
+        for filename, items in files:
+            for position, data in enumerate(items):
+                try:
+                    records.append(validate_record(data, filename, position))
+                except BankValidationError as e:
+                    if strict:
+                        raise
+                    print(f"Skipping invalid question: {e}")
+        return cls(records)
+
+    def record_dict(self, position: int) -> dict:
+        """A record as a column -> value dict"""
+        return dict(zip(FIELDS, self.records[position]))
+
+    def key(self, position: int) -> Tuple[Optional[str], str]:
+        """Stable identity of a record: (source_file, question_text)"""
+        record = self.records[position]
+        return record[_FIELD_INDEX['source_file']], record[_FIELD_INDEX['question_text']]
+
+    def to_bytes(self, digest: bytes) -> bytes:
+        """Serialize with a header that pins the format and the JSON sources"""
+        header = _HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, marshal.version,
+            sys.version_info.major, sys.version_info.minor, digest
+        )
+        payload = marshal.dumps((
+            FIELDS, self.records, self.by_category, self.by_subcategory, self.html
+        ))
+        return header + payload
+
+    @classmethod
+    def from_bytes(cls, data: bytes, digest: bytes = None) -> Optional["QuestionBank"]:
+        """Deserialize a snapshot; None if it is foreign, stale or corrupt"""
+        if len(data) < _HEADER.size:
+            return None
+        magic, version, marshal_version, major, minor, stored_digest = _HEADER.unpack_from(data)
+        if (magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION
+                or marshal_version != marshal.version
+                or (major, minor) != sys.version_info[:2]):
+            return None
+        if digest is not None and stored_digest != digest:
+            return None
+        try:
+            fields, records, by_category, by_subcategory, html = marshal.loads(
+                memoryview(data)[_HEADER.size:]
+            )
+        except (EOFError, ValueError, TypeError):
+            return None
+        if tuple(fields) != FIELDS:
+            return None
+        return cls(records, by_category, by_subcategory, html)
+
+
+def build_snapshot(questions_dir: Path, output: Path = None) -> Path:
+    """Compile the JSON banks into a snapshot file (strict validation)"""
+    from ..utils import codec
+
+    output = output or questions_dir / SNAPSHOT_FILE
+    files = []
+    for filename in QUESTION_FILES:
+        path = questions_dir / filename
+        if path.exists():
+            files.append((filename, codec.load_file(path)))
+    bank = QuestionBank.from_json_data(files, strict=True)
+
+    tmp = output.with_suffix(output.suffix + '.tmp')
+    tmp.write_bytes(bank.to_bytes(sources_digest(questions_dir)))
+    tmp.replace(output)
+    print(f"Compiled {len(bank)} questions into {output}")
+    return output
+
+
+def load_snapshot(questions_dir: Path, path: Path = None) -> Optional[QuestionBank]:
+    """Load the snapshot if it exists and matches the current JSON files"""
+    path = path or questions_dir / SNAPSHOT_FILE
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return None
+    return QuestionBank.from_bytes(data, sources_digest(questions_dir))
+
+
+async def _benchmark(questions_dir: Path, rounds: int = 50):
+    """Time JSON vs snapshot loading and a full cold-start import"""
+    import time
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from ..database.models import Base
+    from .loader import QuestionLoader
+
+    build_snapshot(questions_dir)
+    loader = QuestionLoader(str(questions_dir))
+
+    def timed(fn):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            fn()
+        return (time.perf_counter() - start) / rounds * 1000
+
+    json_ms = timed(loader.load_bank_from_json)
+    snapshot_ms = timed(lambda: load_snapshot(questions_dir))
+    print(f"{'parse + validate JSON:':<36}{json_ms:8.2f} ms")
+    print(f"{'load snapshot:':<36}{snapshot_ms:8.2f} ms")
+
+    for use_snapshot in (False, True):
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        label = "snapshot" if use_snapshot else "json"
+        for boot in ("first boot", "restart"):
+            start = time.perf_counter()
+            async with session_maker() as session:
+                await loader.load_all_questions(session, use_snapshot=use_snapshot)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"{f'cold start ({label}, {boot}):':<36}{elapsed:8.2f} ms")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    import asyncio
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "build"
+    directory = Path(__file__).parent
+    if command == "build":
+        build_snapshot(directory)
+    elif command == "bench":
+        asyncio.run(_benchmark(directory))
+    else:
+        print("usage: python -m bot.questions.snapshot [build|bench]")
+        sys.exit(2)
@@ -0,0 +1,414 @@
+"""Sharded multi-process update dispatch
+
+With WORKERS > 1 the bot runs as a supervisor and N worker processes. The
+supervisor owns ingress: it either long-polls getUpdates or serves the
+webhook (WEBHOOK_URL), and routes each raw update to worker
+`telegram_id % N`. One user's updates always land on the same worker and
+are handled there in arrival order, while different users spread across
+cores.
+
+Workers run the regular dispatcher with its middlewares and warm-up, send
+through their own SendScheduler with a 1/N share of the global rate, and
+write a heartbeat the supervisor checks. A worker that exits or stops
+beating is restarted. In-memory state that spans users (leaderboards,
+daily challenge counters) is refreshed from the database periodically,
+since each worker only sees its own users' answers. Answer rollups run in
+the supervisor only.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from typing import Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+from aiogram import Bot, Dispatcher
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from .utils import codec
+from .utils.event_loop import run
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 2.0
+HEARTBEAT_TIMEOUT = float(os.getenv("WORKER_HEARTBEAT_TIMEOUT", "30"))
+START_TIMEOUT = 120.0
+SHARED_STATE_REFRESH = float(os.getenv("SHARED_STATE_REFRESH", "30"))
+POLLING_TIMEOUT = 30
+
+# Update field -> key holding the user who caused it
+_USER_FIELDS = {
+    'message': 'from',
+    'edited_message': 'from',
+    'callback_query': 'from',
+    'inline_query': 'from',
+    'chosen_inline_result': 'from',
+    'shipping_query': 'from',
+    'pre_checkout_query': 'from',
+    'poll_answer': 'user',
+    'my_chat_member': 'from',
+    'chat_member': 'from',
+    'chat_join_request': 'from',
+    'message_reaction': 'user',
+}
+
+
+def update_user_id(update: dict) -> Optional[int]:
+    """Telegram id of the user behind a raw update, if it has one"""
+    for field, user_key in _USER_FIELDS.items():
+        payload = update.get(field)
+        if payload is None:
+            continue
+        user = payload.get(user_key)
+        if user is not None:
+            return user.get('id')
+        chat = payload.get('chat')  # anonymous admins and channels
+        return chat.get('id') if chat else None
+    return None
+
+
+def shard_for(update: dict, workers: int) -> int:
+    """Worker index for a raw update"""
+    user_id = update_user_id(update)
+    if user_id is None:
+        return update.get('update_id', 0) % workers
+    return user_id % workers
+
+
+class _Worker:
+    """Feed routed updates into a dispatcher, in order per user"""
+
+    def __init__(self, bot: Bot, dp: Dispatcher):
+        self.bot = bot
+        self.dp = dp
+        self.stopped = asyncio.Event()
+        self._tails: Dict[int, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def deliver(self, update: Optional[dict]):
+        """Schedule an update; None asks the worker to stop"""
+        if update is None:
+            self.stopped.set()
+            return
+
+        key = update_user_id(update)
+        previous = self._tails.get(key) if key is not None else None
+        task = asyncio.create_task(self._process(update, previous))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        if key is not None:
+            self._tails[key] = task
+            task.add_done_callback(lambda t, key=key: self._release(key, t))
+
+    def _release(self, key: int, task: asyncio.Task):
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+    async def _process(self, update: dict, previous: Optional[asyncio.Task]):
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await self.dp.feed_raw_update(self.bot, update)
+        except Exception as e:
+            logger.error(f"Update {update.get('update_id')} failed: {e}", exc_info=True)
+
+    async def drain(self, timeout: float = 10.0):
+        """Wait for updates already delivered to finish"""
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+
+def _read_updates(updates, loop: asyncio.AbstractEventLoop, deliver):
+    """Blocking reader thread: decode updates from the process queue for the loop"""
+    while True:
+        try:
+            packed = updates.get()
+        except (EOFError, OSError):
+            packed = None
+        update = codec.unpack(packed) if packed is not None else None
+        loop.call_soon_threadsafe(deliver, update)
+        if update is None:
+            return
+
+
+async def _heartbeat(index: int, heartbeats, worker: _Worker, parent_pid: int):
+    """Report liveness; stop if the supervisor has gone away"""
+    while True:
+        heartbeats[index] = time.time()
+        if os.getppid() != parent_pid:
+            logger.warning(f"Worker {index}: supervisor exited, stopping")
+            worker.deliver(None)
+            return
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+
+async def _refresh_shared_state():
+    """Pick up answers counted by other workers"""
+    from .database import async_session_maker
+    from .questions.daily import daily_challenges
+    from .utils.leaderboard import leaderboards
+    from .utils.readiness import readiness, LEADERBOARDS
+
+    await readiness.wait((LEADERBOARDS,))
+    while True:
+        await asyncio.sleep(SHARED_STATE_REFRESH)
+        try:
+            async with async_session_maker() as session:
+                await leaderboards.load(session)
+                await daily_challenges.refresh(session)
+        except Exception as e:
+            logger.warning(f"Shared state refresh failed: {e}")
+
+
+async def _run_worker(index: int, workers: int, updates, heartbeats, parent_pid: int):
+    from .database.db import close_db
+    from .main import create_bot, create_dispatcher, warm_up, resume_broadcasts, watch_questions
+    from .middlewares.send_scheduler import GLOBAL_RATE
+    from .questions.answer_writer import answer_writer
+    from .questions.reload import bank_watcher
+    from .utils.broadcast import broadcaster, BROADCAST_RATE
+    from .utils.loop_monitor import loop_monitor
+    from .utils.profiler import profiler
+
+    # The global flood limit is per bot token, so workers split it
+    bot, send_scheduler = create_bot(global_rate=GLOBAL_RATE / workers)
+    broadcaster.rate = BROADCAST_RATE / workers
+    # The supervisor applies question changes; workers only republish them
+    bank_watcher.apply = False
+    dp = create_dispatcher()
+    worker = _Worker(bot, dp)
+    profiler.install_signal_handler()
+    loop_monitor.start()
+
+    loop = asyncio.get_running_loop()
+    threading.Thread(
+        target=_read_updates, args=(updates, loop, worker.deliver),
+        name=f"updates-{index}", daemon=True
+    ).start()
+
+    background = [
+        asyncio.create_task(warm_up()),
+        asyncio.create_task(_heartbeat(index, heartbeats, worker, parent_pid)),
+        asyncio.create_task(_refresh_shared_state()),
+        asyncio.create_task(answer_writer.run()),
+        asyncio.create_task(watch_questions()),
+        # A broadcast resumes on the worker of the admin who started it
+        asyncio.create_task(resume_broadcasts(
+            bot, lambda broadcast: broadcast.created_by % workers == index
+        )),
+    ]
+    logger.info(f"Worker {index} started (pid {os.getpid()})")
+    try:
+        await worker.stopped.wait()
+        await worker.drain()
+    finally:
+        for task in background:
+            task.cancel()
+        loop_monitor.stop()
+        await broadcaster.close()
+        await answer_writer.close()
+        await send_scheduler.close()
+        await dp.storage.close()
+        await close_db()
+        await bot.session.close()
+        logger.info(f"Worker {index} stopped")
+
+
+def _worker_main(index: int, workers: int, updates, heartbeats, parent_pid: int):
+    """Entry point of a worker process"""
+    # Ctrl+C reaches the whole process group; shutdown is driven by the supervisor
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    run(_run_worker(index, workers, updates, heartbeats, parent_pid))
+
+
+class Supervisor:
+    """Run N worker processes and route updates to them by user"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._ctx = multiprocessing.get_context("spawn")
+        self.heartbeats = self._ctx.Array('d', workers, lock=False)
+        self.queues: List = [None] * workers
+        self.processes: List = [None] * workers
+        self.restarts = [0] * workers
+        self.routed = [0] * workers
+        self._spawned_at = [0.0] * workers
+
+    def _spawn(self, index: int):
+        # A fresh queue per process: a killed worker may hold the old queue's lock
+        old_queue = self.queues[index]
+        if old_queue is not None:
+            old_queue.close()
+            old_queue.cancel_join_thread()
+        self.queues[index] = self._ctx.Queue()
+        self.heartbeats[index] = 0.0
+        self._spawned_at[index] = time.time()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self.workers, self.queues[index], self.heartbeats, os.getpid()),
+            name=f"bot-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self.processes[index] = process
+
+    def start(self):
+        """Start all workers"""
+        for index in range(self.workers):
+            self._spawn(index)
+        logger.info(f"Started {self.workers} workers")
+
+    def route(self, update: dict):
+        """Queue a raw update on its user's worker, packed (cheaper to pickle)"""
+        index = shard_for(update, self.workers)
+        self.queues[index].put(codec.pack(update))
+        self.routed[index] += 1
+
+    async def monitor(self):
+        """Restart workers that exited or stopped sending heartbeats"""
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            now = time.time()
+            for index, process in enumerate(self.processes):
+                # Until the first heartbeat the worker is still importing
+                last_beat = self.heartbeats[index]
+                silent_for = now - (last_beat or self._spawned_at[index])
+                limit = HEARTBEAT_TIMEOUT if last_beat else START_TIMEOUT
+                if not process.is_alive():
+                    logger.error(
+                        f"Worker {index} exited with code {process.exitcode}, restarting"
+                    )
+                elif silent_for > limit:
+                    logger.error(
+                        f"Worker {index} silent for {silent_for:.0f}s, restarting"
+                    )
+                    process.kill()
+                    await asyncio.to_thread(process.join, 5)
+                else:
+                    continue
+                self.restarts[index] += 1
+                self._spawn(index)
+
+    async def stop(self, timeout: float = 15.0):
+        """Ask workers to finish their current updates, then stop them"""
+        for index, process in enumerate(self.processes):
+            if process is not None and process.is_alive():
+                self.queues[index].put(None)
+
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            if process is None:
+                continue
+            await asyncio.to_thread(process.join, max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+        logger.info(f"Workers stopped; routed {self.routed}, restarts {self.restarts}")
+
+    async def poll(self, bot: Bot, allowed_updates: List[str]):
+        """Single getUpdates fetcher fanning out to the workers"""
+        await bot.delete_webhook()
+        offset = None
+        backoff = 1.0
+        while True:
+            try:
+                updates = await bot.get_updates(
+                    offset=offset, timeout=POLLING_TIMEOUT, allowed_updates=allowed_updates
+                )
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                continue
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logger.warning(f"getUpdates failed: {e}; retrying in {backoff:.0f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+
+            backoff = 1.0
+            for update in updates:
+                offset = update.update_id + 1
+                self.route(update.model_dump(mode="json", exclude_unset=True, by_alias=True))
+
+    async def serve_webhook(self, bot: Bot, allowed_updates: List[str], url: str):
+        """Webhook endpoint routing request bodies to the workers"""
+        from aiohttp import web
+
+        secret = os.getenv("WEBHOOK_SECRET") or None
+        host = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+        port = int(os.getenv("WEBHOOK_PORT", "8080"))
+
+        async def handle(request: web.Request) -> web.Response:
+            if secret and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret:
+                return web.Response(status=401)
+            self.route(await request.json(loads=codec.loads))
+            return web.Response()
+
+        app = web.Application()
+        app.router.add_post(urlparse(url).path or "/", handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        await bot.set_webhook(url, secret_token=secret, allowed_updates=allowed_updates)
+        logger.info(f"Webhook listening on {host}:{port} for {url}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+
+async def _prepare_database():
+    """Create tables and import questions once, before workers start"""
+    from .database.db import engine, init_db, close_db
+    from .main import load_questions_to_db
+
+    await init_db()
+    if engine.dialect.name == "sqlite":
+        # Let workers read while another one writes
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    await load_questions_to_db()
+    await close_db()
+
+
+async def run_supervisor(workers: int):
+    """Run the bot as a supervisor with `workers` worker processes"""
+    from .database import async_session_maker, rollups
+    from .main import create_api_session, create_dispatcher, get_bot_token
+    from .questions.reload import BankWatcher, reload_interval
+
+    logger.info("Preparing database...")
+    await _prepare_database()
+
+    allowed_updates = create_dispatcher().resolve_used_update_types()
+    bot = Bot(token=get_bot_token(), session=create_api_session())
+    supervisor = Supervisor(workers)
+    supervisor.start()
+
+    loop = asyncio.get_running_loop()
+    ingress_task = asyncio.current_task()
+    loop.add_signal_handler(signal.SIGTERM, ingress_task.cancel)
+
+    webhook_url = os.getenv("WEBHOOK_URL")
+    monitor_task = asyncio.create_task(supervisor.monitor())
+    maintenance_task = asyncio.create_task(
+        rollups.maintain(async_session_maker, **rollups.settings())
+    )
+    watch_task = asyncio.create_task(
+        BankWatcher(interval=reload_interval(), publish=False).run()
+    )
+    try:
+        if webhook_url:
+            await supervisor.serve_webhook(bot, allowed_updates, webhook_url)
+        else:
+            logger.info("Polling for updates")
+            await supervisor.poll(bot, allowed_updates)
+    except asyncio.CancelledError:
+        logger.info("Supervisor stopping")
+    finally:
+        monitor_task.cancel()
+        maintenance_task.cancel()
+        watch_task.cancel()
+        await supervisor.stop()
+        await bot.session.close()
@@ -0,0 +1,256 @@
+"""Announcements to every user, resumable and within flood limits
+
+A Broadcast row holds the HTML text and a checkpoint: the users.id up to
+which every recipient has been handled. Broadcaster reads recipients in id
+order, BATCH_SIZE at a time (users.id > checkpoint, skipping blocked_users),
+and sends each batch with at most CONCURRENCY messages in flight, started
+no faster than BROADCAST_RATE per second. Messages go through the bot
+session, so SendScheduler still enforces the global and per-chat limits and
+retries flood errors; BROADCAST_RATE stays below the global rate, leaving
+room for replies to users. After each batch the checkpoint and counters are
+committed together, so a restarted bot resumes where it stopped. On
+shutdown, close() lets started messages finish and checkpoints the batch
+before the first one not started, so nobody gets a message twice. The
+checkpoint is only written while the broadcast is still running, so a
+cancel handled by another worker stops it at the next batch.
+
+Users who blocked the bot or deleted their account are added to
+blocked_users and skipped by later broadcasts until they /start again.
+
+tests/test_broadcast.py runs broadcasts against the fake Bot API, with a
+restart in the middle.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramRetryAfter
+)
+from sqlalchemy import select, update
+
+from ..database.models import BlockedUser, Broadcast, User
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "20"))
+CONCURRENCY = 8
+BATCH_SIZE = 200
+MAX_ATTEMPTS = 5
+CLOSE_TIMEOUT = 10.0
+
+RUNNING, DONE, CANCELLED = "running", "done", "cancelled"
+SENT, BLOCKED, FAILED, SKIPPED = "sent", "blocked", "failed", "skipped"
+
+
+class Broadcaster:
+    """Create, run, resume and cancel broadcasts"""
+
+    def __init__(
+        self,
+        session_maker=None,
+        rate: float = BROADCAST_RATE,
+        concurrency: int = CONCURRENCY,
+        batch_size: int = BATCH_SIZE
+    ):
+        self.session_maker = session_maker
+        self.rate = rate
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._next_send = 0.0
+        self._closing = False
+
+    def _sessions(self):
+        if self.session_maker is None:
+            from ..database.db import async_session_maker
+            self.session_maker = async_session_maker
+        return self.session_maker()
+
+    def is_running(self, broadcast_id: int) -> bool:
+        task = self._tasks.get(broadcast_id)
+        return task is not None and not task.done()
+
+    async def create(self, text: str, created_by: int) -> Broadcast:
+        """Store a new broadcast; start() sends it"""
+        async with self._sessions() as session:
+            broadcast = Broadcast(text=text, created_by=created_by, status=RUNNING)
+            session.add(broadcast)
+            await session.commit()
+            return broadcast
+
+    async def get(self, broadcast_id: Optional[int] = None) -> Optional[Broadcast]:
+        """A broadcast by id, or the latest one"""
+        async with self._sessions() as session:
+            statement = select(Broadcast)
+            if broadcast_id is None:
+                statement = statement.order_by(Broadcast.id.desc()).limit(1)
+            else:
+                statement = statement.where(Broadcast.id == broadcast_id)
+            return (await session.execute(statement)).scalar_one_or_none()
+
+    def start(self, bot: Bot, broadcast_id: int) -> asyncio.Task:
+        """Send a broadcast in the background from its checkpoint"""
+        task = self._tasks.get(broadcast_id)
+        if task is None or task.done():
+            task = asyncio.create_task(self.run(bot, broadcast_id))
+            self._tasks[broadcast_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
+        return task
+
+    async def resume(self, bot: Bot, owns: Callable[[Broadcast], bool] = None) -> int:
+        """Restart unfinished broadcasts (those `owns` accepts); returns how many"""
+        async with self._sessions() as session:
+            result = await session.execute(select(Broadcast).where(Broadcast.status == RUNNING))
+            broadcasts = [b for b in result.scalars() if owns is None or owns(b)]
+        for broadcast in broadcasts:
+            logger.info(f"Resuming broadcast {broadcast.id} after user {broadcast.last_user_id}")
+            self.start(bot, broadcast.id)
+        return len(broadcasts)
+
+    async def cancel(self, broadcast_id: int) -> bool:
+        """Stop a running broadcast; False if it was not running
+
+        A broadcast running elsewhere (another worker) stops at its next
+        checkpoint.
+        """
+        async with self._sessions() as session:
+            result = await session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id, Broadcast.status == RUNNING)
+                .values(status=CANCELLED, finished_at=datetime.utcnow())
+            )
+            await session.commit()
+        task = self._tasks.get(broadcast_id)
+        if task is not None:
+            task.cancel()
+        return result.rowcount > 0
+
+    async def run(self, bot: Bot, broadcast_id: int):
+        """Send a broadcast batch by batch until every user is handled"""
+        async with self._sessions() as session:
+            broadcast = await session.get(Broadcast, broadcast_id)
+            if broadcast is None or broadcast.status != RUNNING:
+                return
+            text, checkpoint = broadcast.text, broadcast.last_user_id
+
+        limit = asyncio.Semaphore(self.concurrency)
+        while True:
+            async with self._sessions() as session:
+                recipients = await self._recipients(session, checkpoint)
+            if not recipients:
+                break
+
+            outcomes = await asyncio.gather(*(
+                self._deliver(bot, limit, telegram_id, text) for _, telegram_id in recipients
+            ))
+            closing = SKIPPED in outcomes
+            if closing:
+                # Checkpoint before the first recipient skipped; the resume sends the rest
+                handled = outcomes.index(SKIPPED)
+                recipients, outcomes = recipients[:handled], outcomes[:handled]
+
+            if recipients:
+                checkpoint = recipients[-1][0]
+                blocked = [user_id for (user_id, _), outcome in zip(recipients, outcomes)
+                           if outcome == BLOCKED]
+                async with self._sessions() as session:
+                    for user_id in blocked:
+                        await session.merge(BlockedUser(user_id=user_id))
+                    result = await session.execute(
+                        update(Broadcast)
+                        .where(Broadcast.id == broadcast_id, Broadcast.status == RUNNING)
+                        .values(
+                            last_user_id=checkpoint,
+                            sent=Broadcast.sent + outcomes.count(SENT),
+                            blocked=Broadcast.blocked + len(blocked),
+                            failed=Broadcast.failed + outcomes.count(FAILED)
+                        )
+                    )
+                    await session.commit()
+                if result.rowcount == 0:
+                    # Cancelled, possibly by another process that cannot reach this task
+                    logger.info(f"Broadcast {broadcast_id} stopped after user {checkpoint}")
+                    return
+            if closing:
+                logger.info(f"Broadcast {broadcast_id} paused after user {checkpoint}")
+                return
+
+        async with self._sessions() as session:
+            await session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id, Broadcast.status == RUNNING)
+                .values(status=DONE, finished_at=datetime.utcnow())
+            )
+            await session.commit()
+        logger.info(f"Broadcast {broadcast_id} finished")
+
+    async def _recipients(self, session, after: int) -> List[Tuple[int, int]]:
+        """Next batch of (users.id, telegram_id) after a checkpoint"""
+        blocked = select(BlockedUser.user_id).where(BlockedUser.user_id == User.id).exists()
+        result = await session.execute(
+            select(User.id, User.telegram_id)
+            .where(User.id > after, ~blocked)
+            .order_by(User.id)
+            .limit(self.batch_size)
+        )
+        return result.all()
+
+    async def _pace(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        start = max(now, self._next_send)
+        self._next_send = start + 1.0 / self.rate
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def _deliver(self, bot: Bot, limit: asyncio.Semaphore, chat_id: int, text: str) -> str:
+        async with limit:
+            if self._closing:
+                return SKIPPED
+            for _ in range(MAX_ATTEMPTS):
+                await self._pace()
+                try:
+                    await bot.send_message(chat_id, text, parse_mode="HTML")
+                    return SENT
+                except TelegramRetryAfter as e:
+                    # SendScheduler gave up retrying; wait and try again
+                    await asyncio.sleep(e.retry_after)
+                except TelegramForbiddenError:
+                    return BLOCKED
+                except TelegramBadRequest as e:
+                    if "chat not found" in e.message.lower():
+                        return BLOCKED
+                    logger.warning(f"Broadcast to {chat_id} rejected: {e.message}")
+                    return FAILED
+                except Exception as e:
+                    logger.warning(f"Broadcast to {chat_id} failed: {e}")
+                    return FAILED
+            return FAILED
+
+    async def close(self, timeout: float = CLOSE_TIMEOUT):
+        """Stop running broadcasts at a checkpoint; they resume from it
+
+        Messages already started are sent, the rest of their batch is left
+        for the resume. Broadcasts still running after `timeout` are
+        cancelled (messages of their unfinished batch may be sent twice).
+        """
+        tasks = list(self._tasks.values())
+        if not tasks:
+            return
+        self._closing = True
+        try:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            self._closing = False
+
+
+broadcaster = Broadcaster()
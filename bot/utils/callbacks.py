@@ -0,0 +1,299 @@
+"""Compact callback data and an O(1) callback dispatch table
+
+Hot quiz buttons carry a versioned binary payload instead of underscore
+separated strings: CALLBACK_PREFIX followed by unpadded urlsafe base64 of
+
+    version (1 byte) | action (1 byte) | action fields (big-endian struct)
+
+An answer button is 7 bytes (11 characters of callback data). Buttons sent
+before the codec existed ("answer_<id>_<option>", "next_question",
+"end_quiz") still decode to the same actions.
+
+CallbackRouter resolves callbacks from dicts keyed by action (encoded
+payloads) or by the exact callback string (fixed menu buttons) before
+falling back to the router's filter-registered handlers, and passes the
+decoded fields to the handler as `payload`. Handler flags and inner
+middlewares apply as for filter-registered handlers.
+
+`python -m bot.utils.callbacks bench` compares routing cost with the
+aiogram filter chain.
+"""
+import base64
+import binascii
+import struct
+from enum import IntEnum
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from aiogram import Router
+from aiogram.dispatcher.event.bases import UNHANDLED, SkipHandler
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.dispatcher.event.telegram import TelegramEventObserver
+from aiogram.types import TelegramObject
+
+CALLBACK_PREFIX = "~"
+CODEC_VERSION = 1
+OPTIONS = "ABCDE"
+
+
+class Action(IntEnum):
+    """Callback actions with an encoded payload (values are part of the format)"""
+    ANSWER = 1
+    NEXT = 2
+    END = 3
+
+
+class AnswerPayload(NamedTuple):
+    question_id: int
+    option: str
+
+
+class Callback(NamedTuple):
+    """A decoded callback: the action and its fields (None when it has none)"""
+    action: Action
+    payload: Optional[tuple]
+
+
+_HEADER = struct.Struct(">BB")
+_FIELDS = {
+    Action.ANSWER: struct.Struct(">IB"),
+    Action.NEXT: struct.Struct(""),
+    Action.END: struct.Struct(""),
+}
+
+_LEGACY = {
+    "next_question": Callback(Action.NEXT, None),
+    "end_quiz": Callback(Action.END, None),
+}
+_LEGACY_ANSWER = "answer_"
+
+
+def encode(action: Action, *fields: int) -> str:
+    """Callback data for an action and its integer fields"""
+    raw = _HEADER.pack(CODEC_VERSION, action) + _FIELDS[action].pack(*fields)
+    return CALLBACK_PREFIX + base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def encode_answer(question_id: int, option: str) -> str:
+    """Callback data for choosing `option` (A-E) on a question"""
+    return encode(Action.ANSWER, question_id, OPTIONS.index(option))
+
+
+NEXT_QUESTION = encode(Action.NEXT)
+END_QUIZ = encode(Action.END)
+
+
+def _decode_legacy(data: str) -> Optional[Callback]:
+    callback = _LEGACY.get(data)
+    if callback is not None or not data.startswith(_LEGACY_ANSWER):
+        return callback
+    try:
+        _, question_id, option = data.split("_")
+        return Callback(Action.ANSWER, AnswerPayload(int(question_id), option))
+    except ValueError:
+        return None
+
+
+def decode(data: Optional[str]) -> Optional[Callback]:
+    """Decode callback data; None if it is not an action callback"""
+    if not data:
+        return None
+    if data[0] != CALLBACK_PREFIX:
+        return _decode_legacy(data)
+
+    encoded = data[1:]
+    try:
+        raw = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+        version, action = _HEADER.unpack_from(raw)
+        if version != CODEC_VERSION:
+            return None
+        action = Action(action)
+        fields = _FIELDS[action].unpack_from(raw, _HEADER.size)
+    except (binascii.Error, struct.error, ValueError):
+        return None
+
+    if action is Action.ANSWER:
+        question_id, option = fields
+        if option >= len(OPTIONS):
+            return None
+        return Callback(action, AnswerPayload(question_id, OPTIONS[option]))
+    return Callback(action, None)
+
+
+class CallbackTableObserver(TelegramEventObserver):
+    """callback_query observer that resolves handlers by dict lookup first"""
+
+    def __init__(self, router: Router, event_name: str):
+        super().__init__(router=router, event_name=event_name)
+        self.by_action: Dict[Action, HandlerObject] = {}
+        self.by_data: Dict[str, HandlerObject] = {}
+        self.filtered = []
+
+    def register(self, callback, *filters, flags: dict = None, **kwargs):
+        result = super().register(callback, *filters, flags=flags, **kwargs)
+        self.filtered.append(self.handlers[-1])
+        return result
+
+    def _add(self, callback: Callable, flags: Optional[dict]) -> HandlerObject:
+        handler = HandlerObject(callback=callback, filters=[], flags=dict(flags or {}))
+        # Listed in handlers so the update type counts as used
+        self.handlers.append(handler)
+        return handler
+
+    def action(self, action: Action, flags: dict = None):
+        """Decorator: handle callbacks encoding `action`"""
+        def wrapper(callback):
+            if action in self.by_action:
+                raise ValueError(f"Callback action {action.name} is already registered")
+            self.by_action[action] = self._add(callback, flags)
+            return callback
+        return wrapper
+
+    def exact(self, *values: str, flags: dict = None):
+        """Decorator: handle callbacks whose data is one of `values`"""
+        def wrapper(callback):
+            handler = self._add(callback, flags)
+            for value in values:
+                if value in self.by_data:
+                    raise ValueError(f"Callback data {value!r} is already registered")
+                self.by_data[value] = handler
+            return callback
+        return wrapper
+
+    def resolve(self, data: Optional[str]) -> Tuple[Optional[HandlerObject], Any]:
+        """Handler and payload for callback data, (None, None) if not in the table"""
+        handler = self.by_data.get(data)
+        if handler is not None:
+            return handler, None
+        decoded = decode(data)
+        if decoded is not None:
+            handler = self.by_action.get(decoded.action)
+            if handler is not None:
+                return handler, decoded.payload
+        return None, None
+
+    async def _call(self, handler: HandlerObject, event: TelegramObject, kwargs: dict) -> Any:
+        kwargs["handler"] = handler
+        wrapped_inner = self.outer_middleware.wrap_middlewares(
+            self._resolve_middlewares(),
+            handler.call,
+        )
+        return await wrapped_inner(event, kwargs)
+
+    async def trigger(self, event: TelegramObject, **kwargs: Any) -> Any:
+        handler, payload = self.resolve(getattr(event, "data", None))
+        if handler is not None:
+            try:
+                return await self._call(handler, event, dict(kwargs, payload=payload))
+            except SkipHandler:
+                pass
+
+        # Same as TelegramEventObserver.trigger, over filter-registered handlers only
+        for handler in self.filtered:
+            kwargs["handler"] = handler
+            result, data = await handler.check(event, **kwargs)
+            if result:
+                kwargs.update(data)
+                try:
+                    return await self._call(handler, event, kwargs)
+                except SkipHandler:
+                    continue
+        return UNHANDLED
+
+
+class CallbackRouter(Router):
+    """Router whose callback_query observer is a CallbackTableObserver"""
+
+    def __init__(self, *, name: str = None):
+        super().__init__(name=name)
+        self.callback_query = CallbackTableObserver(router=self, event_name="callback_query")
+        self.observers["callback_query"] = self.callback_query
+
+
+async def _benchmark(rounds: int = 20000):
+    import time
+    from datetime import datetime
+    from aiogram import F
+    from aiogram.types import CallbackQuery, Chat, Message, User
+
+    user = User(id=1, is_bot=False, first_name="Bench")
+    message = Message(
+        message_id=1, date=datetime.now(), chat=Chat(id=1, type="private"), text="quiz"
+    )
+    menu = ["back_to_menu", "menu_quiz", "menu_splat_tests", "help"]
+    categories = ["quiz_lexer", "quiz_parser", "quiz_semantics", "quiz_executor", "quiz_cfg",
+                  "quiz_java", "quiz_mixed", "quiz_review", "splat_badlex", "splat_badparse",
+                  "splat_badsemantics", "splat_badexecution", "splat_goodexecution",
+                  "splat_random"]
+
+    async def handler(callback: CallbackQuery):
+        return True
+
+    async def legacy_answer(callback: CallbackQuery):
+        parts = callback.data.split('_')
+        return int(parts[1]), parts[2]
+
+    async def table_answer(callback: CallbackQuery, payload: AnswerPayload):
+        return payload.question_id, payload.option
+
+    def build(table: bool) -> Router:
+        # Router order and filters as in create_dispatcher before this module
+        root = Router()
+        start = Router()
+        for data in menu:
+            start.callback_query(F.data == data)(handler)
+        if table:
+            quiz = CallbackRouter()
+            quiz.callback_query.exact(*categories)(handler)
+            quiz.callback_query.action(Action.ANSWER)(table_answer)
+            quiz.callback_query.action(Action.NEXT)(handler)
+            quiz.callback_query.action(Action.END)(handler)
+            root.include_routers(quiz, start)
+        else:
+            quiz = Router()
+            quiz.callback_query(F.data.in_(categories))(handler)
+            quiz.callback_query(F.data.startswith("answer_"))(legacy_answer)
+            quiz.callback_query(F.data == "next_question")(handler)
+            quiz.callback_query(F.data == "end_quiz")(handler)
+            root.include_routers(start, quiz)
+        stats, leaderboard, daily, search = Router(), Router(), Router(), Router()
+        stats.callback_query(F.data == "my_stats")(handler)
+        leaderboard.callback_query(F.data.startswith("lb_"))(handler)
+        daily.callback_query(F.data == "daily_challenge")(handler)
+        search.callback_query(F.data.startswith("search_page_"))(handler)
+        search.callback_query(F.data.startswith("search_q_"))(handler)
+        root.include_routers(stats, leaderboard, daily, search)
+        return root
+
+    cases = [
+        ("answer", "answer_1234_C", encode_answer(1234, "C")),
+        ("next question", "next_question", NEXT_QUESTION),
+        ("end quiz", "end_quiz", END_QUIZ),
+        ("start quiz", "quiz_java", "quiz_java"),
+    ]
+    routers = {False: build(False), True: build(True)}
+    for label, legacy_data, table_data in cases:
+        timings = []
+        for table, data in ((False, legacy_data), (True, table_data)):
+            event = CallbackQuery(
+                id="1", from_user=user, chat_instance="1", message=message, data=data
+            )
+            router = routers[table]
+            for _ in range(rounds // 10):
+                await router.propagate_event("callback_query", event)
+            start = time.perf_counter()
+            for _ in range(rounds):
+                await router.propagate_event("callback_query", event)
+            timings.append((time.perf_counter() - start) / rounds * 1e6)
+        print(f"{label:<16}filter chain {timings[0]:7.1f} us   dispatch table "
+              f"{timings[1]:7.1f} us   ({len(table_data)} bytes)")
+
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        asyncio.run(_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 20000))
+    else:
+        print("usage: python -m bot.utils.callbacks bench [rounds]")
+        sys.exit(2)
@@ -0,0 +1,193 @@
+"""Serialization: JSON and a compact binary format, on the fastest backend installed
+
+Everything the bot serializes goes through here: the question bank files
+(QuestionLoader, snapshot builds, SplatTestAnalyzer output), Bot API
+requests and responses (create_bot), FSM data in Redis (FSM_STORAGE=redis),
+export and archive JSON Lines, and updates routed from the supervisor to
+the workers.
+
+  JSON    orjson if installed, else the stdlib json module. Output is UTF-8
+          (non-ASCII kept as is), compact, or indented by 2 like
+          json.dump(indent=2). Values orjson does not take (ints beyond 64
+          bits, datetimes, dataclasses) go through the stdlib encoder, so
+          both backends accept and reject the same objects.
+  binary  pack()/unpack(): msgpack if installed, else orjson, else marshal
+          (faster than stdlib JSON or pickle). Only for internal state read
+          back by the same deployment: marshal output is tied to the Python
+          version, and keys should be strings (JSON makes other keys
+          strings, the others keep them).
+
+CODEC_BACKEND=stdlib forces the stdlib backends (for comparing outputs).
+`pip install orjson msgpack` (the `speedups` extra) enables the fast ones.
+
+`python -m bot.utils.codec bench` times each path on both backends.
+"""
+import json
+import marshal
+import os
+import sys
+from pathlib import Path
+from typing import Any, Union
+
+if os.getenv("CODEC_BACKEND", "auto") == "stdlib":
+    orjson = msgpack = None
+else:
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+    try:
+        import msgpack
+    except ImportError:
+        msgpack = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+if msgpack is not None:
+    BINARY_BACKEND = "msgpack"
+else:
+    BINARY_BACKEND = "orjson" if orjson is not None else "marshal"
+
+# Raised by loads() and load_file() on invalid JSON (orjson's error subclasses it)
+DecodeError = json.JSONDecodeError
+
+
+def _std_dumps(obj: Any, indent: bool = False) -> bytes:
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+if orjson is not None:
+    # Types the stdlib rejects are passed through, so they fail the same way
+    _OPTIONS = (
+        orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+    )
+
+    def dumps(obj: Any, indent: bool = False) -> bytes:
+        """JSON as UTF-8 bytes, compact or indented by 2"""
+        try:
+            option = _OPTIONS | orjson.OPT_INDENT_2 if indent else _OPTIONS
+            return orjson.dumps(obj, option=option)
+        except TypeError:
+            return _std_dumps(obj, indent)
+
+    loads = orjson.loads
+else:
+    dumps = _std_dumps
+    loads = json.loads
+
+
+def dumps_text(obj: Any) -> str:
+    """Compact JSON as str (for APIs that want text: aiogram, text files)"""
+    return dumps(obj).decode('utf-8')
+
+
+def load_file(path: Union[str, Path]) -> Any:
+    """Parse a JSON file"""
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def dump_file(path: Union[str, Path], obj: Any, indent: bool = False):
+    """Write obj to a JSON file"""
+    with open(path, 'wb') as f:
+        f.write(dumps(obj, indent))
+
+
+if msgpack is not None:
+    def pack(obj: Any) -> bytes:
+        """Compact binary encoding of plain data (dicts, lists, str, numbers)"""
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def unpack(data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+elif orjson is not None:
+    pack = dumps
+    unpack = loads
+else:
+    pack = marshal.dumps
+    unpack = marshal.loads
+
+
+def _benchmark(repeat: int = 5):
+    """Per-path timings, stdlib against the selected backends"""
+    import pickle
+    import timeit
+
+    questions_dir = Path(__file__).resolve().parent.parent / "questions"
+    from ..questions.snapshot import QUESTION_FILES
+
+    def best(func, number: int) -> float:
+        return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+    def row(label: str, baseline: float, fast: float, unit: str = "ms", scale: float = 1e3):
+        print(f"  {label:<34} {baseline * scale:9.2f} {unit}  {fast * scale:9.2f} {unit}  "
+              f"x{baseline / fast:5.1f}")
+
+    print(f"JSON: {JSON_BACKEND}, binary: {BINARY_BACKEND}")
+    print(f"  {'path':<34} {'stdlib':>12}  {'selected':>12}")
+
+    # Question bank load: QuestionLoader.load_json_file for every bank file
+    sources = [
+        (questions_dir / filename).read_bytes()
+        for filename in QUESTION_FILES if (questions_dir / filename).exists()
+    ]
+    size = sum(len(data) for data in sources)
+    row(f"bank load ({size / 1e6:.1f} MB)",
+        best(lambda: [json.loads(data) for data in sources], 3),
+        best(lambda: [loads(data) for data in sources], 3))
+
+    # Generator output: SplatTestAnalyzer.save_questions (indent=2)
+    banks = [json.loads(data) for data in sources]
+    row("bank save (indent=2)",
+        best(lambda: [json.dumps(bank, indent=2, ensure_ascii=False) for bank in banks], 3),
+        best(lambda: [dumps(bank, indent=True) for bank in banks], 3))
+
+    # FSM data of a quiz in progress, written and read back on every answer
+    state = {
+        'quiz_id': 81234, 'questions': list(range(120450, 120470)), 'current_index': 7,
+        'correct_count': 5, 'start_time': 1761000000.25, 'answered_key': [81234, 6],
+    }
+    row("FSM data set+get (aiogram text)",
+        best(lambda: json.loads(json.dumps(state)), 20000),
+        best(lambda: loads(dumps_text(state)), 20000), "us", 1e6)
+
+    # Supervisor -> worker: an update through multiprocessing.Queue (pickled there)
+    update = {
+        'update_id': 912345678,
+        'callback_query': {
+            'id': '4382bfdwdsb323b2d9', 'chat_instance': '-5838471129', 'data': 'ans:2',
+            'from': {'id': 123456789, 'is_bot': False, 'first_name': 'Ann',
+                     'username': 'ann', 'language_code': 'en'},
+            'message': {
+                'message_id': 4711, 'date': 1761000000,
+                'chat': {'id': 123456789, 'first_name': 'Ann', 'type': 'private'},
+                'text': 'Question 8/20\n\nWhat does this SPLAT program print?\n' * 3,
+                'reply_markup': {'inline_keyboard': [
+                    [{'text': f'Option {i}', 'callback_data': f'ans:{i}'}] for i in range(4)
+                ]},
+            },
+        },
+    }
+    row("worker IPC (pickle vs pack)",
+        best(lambda: pickle.loads(pickle.dumps(update)), 20000),
+        best(lambda: unpack(pickle.loads(pickle.dumps(pack(update)))), 20000), "us", 1e6)
+
+    # Bot API response parsing (aiogram session json_loads)
+    response = json.dumps({'ok': True, 'result': update['callback_query']['message']})
+    row("Bot API response parse",
+        best(lambda: json.loads(response), 20000),
+        best(lambda: loads(response), 20000), "us", 1e6)
+
+    if orjson is None:
+        print("orjson is not in use (not installed, or CODEC_BACKEND=stdlib)")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "bench":
+        _benchmark()
+    else:
+        print("usage: python -m bot.utils.codec bench")
+        sys.exit(2)
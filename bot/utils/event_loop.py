@@ -0,0 +1,87 @@
+"""Event loop selection at startup
+
+run() replaces asyncio.run() in main, the supervisor and the workers. With
+EVENT_LOOP=auto (the default) it runs on uvloop when that is installed
+(`pip install uvloop`, the `speedups` extra; not on Windows), and on the
+stdlib loop otherwise; EVENT_LOOP=uvloop requires it, EVENT_LOOP=asyncio
+turns it off. The profiler and the loop monitor work with both.
+
+`python -m bot.utils.event_loop bench` compares the loops.
+"""
+import asyncio
+import os
+import sys
+import time
+from typing import Any, Callable, Coroutine, Optional
+
+EVENT_LOOP = os.getenv("EVENT_LOOP", "auto")
+
+
+def loop_factory() -> Optional[Callable[[], asyncio.AbstractEventLoop]]:
+    """uvloop's loop constructor if selected and installed, else None (stdlib)"""
+    if EVENT_LOOP == "asyncio":
+        return None
+    try:
+        import uvloop
+    except ImportError:
+        if EVENT_LOOP == "uvloop":
+            raise RuntimeError("EVENT_LOOP=uvloop but uvloop is not installed")
+        return None
+    return uvloop.new_event_loop
+
+
+def run(main: Coroutine, factory: Callable[[], asyncio.AbstractEventLoop] = None) -> Any:
+    """asyncio.run() on the selected event loop"""
+    with asyncio.Runner(loop_factory=factory or loop_factory()) as runner:
+        return runner.run(main)
+
+
+def loop_name() -> str:
+    """Module of the running loop's class: asyncio or uvloop"""
+    return type(asyncio.get_running_loop()).__module__.split('.')[0]
+
+
+async def _workload(seconds: float) -> float:
+    """Tasks passing futures and callbacks around, as updates do; rounds per second"""
+    loop = asyncio.get_running_loop()
+
+    async def hop(future: asyncio.Future):
+        await asyncio.sleep(0)
+        loop.call_soon(future.set_result, None)
+
+    rounds = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        futures = [loop.create_future() for _ in range(100)]
+        for future in futures:
+            loop.create_task(hop(future))
+        await asyncio.gather(*futures)
+        rounds += 1
+    return rounds * 100 / seconds
+
+
+def _benchmark(seconds: float = 2.0):
+    factories = [("asyncio", asyncio.new_event_loop)]
+    try:
+        import uvloop
+        factories.append(("uvloop", uvloop.new_event_loop))
+    except ImportError:
+        pass
+
+    for name, factory in factories:
+        rate = run(_workload(seconds), factory)
+        print(f"{name:8} {rate:10.0f} tasks/s")
+    if len(factories) == 1:
+        print("uvloop is not installed")
+    else:
+        selected = loop_factory()
+        print(f"selected: {'uvloop' if selected is not None else 'asyncio'}")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "bench":
+        _benchmark(float(sys.argv[2]) if len(sys.argv) > 2 else 2.0)
+    else:
+        print("usage: python -m bot.utils.event_loop bench [seconds]")
+        sys.exit(2)
@@ -0,0 +1,134 @@
+"""Local fake Bot API session that enforces Telegram flood limits
+
+Plug it into a Bot to exercise outbound code without network access:
+    bot = Bot(token="42:TEST", session=FakeTelegramSession())
+
+tests/test_send_scheduler.py pushes bursts of sends and edits through it.
+"""
+import asyncio
+import math
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import AsyncGenerator, Dict, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import EditMessageText, SendMessage, SendPoll, TelegramMethod
+from aiogram.types import Chat, Message, Poll, PollOption
+
+
+class FakeTelegramSession(BaseSession):
+    """Bot API stand-in with global and per-group-chat sliding-window limits"""
+
+    def __init__(
+        self,
+        global_limit: int = 30,
+        chat_limit: int = 1,
+        window: float = 1.0,
+        latency: float = 0.0,
+        blocked_chats: Optional[set] = None
+    ):
+        super().__init__()
+        self.global_limit = global_limit
+        self.chat_limit = chat_limit
+        self.window = window
+        self.latency = latency
+        self.blocked_chats = blocked_chats or set()
+        self._global_calls = deque()
+        self._chat_calls: Dict[int, deque] = defaultdict(deque)
+        self._next_message_id = 1
+        self.calls = []
+        self.rejected = 0
+
+    @staticmethod
+    def _prune(calls: deque, now: float, window: float):
+        while calls and now - calls[0] >= window:
+            calls.popleft()
+
+    def _retry_after(self, calls: deque, limit: int, window: float, now: float) -> int:
+        self._prune(calls, now, window)
+        if len(calls) < limit:
+            return 0
+        return max(1, math.ceil(window - (now - calls[0])))
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        chat_id = getattr(method, "chat_id", None)
+
+        if chat_id in self.blocked_chats:
+            raise TelegramForbiddenError(method, "Forbidden: bot was blocked by the user")
+
+        retry_after = self._retry_after(self._global_calls, self.global_limit, self.window, now)
+        group = chat_id is not None and (not isinstance(chat_id, int) or chat_id < 0)
+        if group:
+            retry_after = max(retry_after, self._retry_after(
+                self._chat_calls[chat_id], self.chat_limit, self.window, now
+            ))
+        if retry_after:
+            self.rejected += 1
+            raise TelegramRetryAfter(method, "Too Many Requests", retry_after)
+
+        self._global_calls.append(now)
+        if group:
+            self._chat_calls[chat_id].append(now)
+        self.calls.append(method)
+        return self._result_for(method, chat_id)
+
+    def _result_for(self, method: TelegramMethod, chat_id):
+        if isinstance(method, (SendMessage, EditMessageText)) and chat_id is not None:
+            message_id = getattr(method, "message_id", None)
+            if message_id is None:
+                message_id = self._next_message_id
+                self._next_message_id += 1
+            return Message(
+                message_id=message_id,
+                date=datetime.utcnow(),
+                chat=Chat(id=chat_id, type="private"),
+                text=method.text
+            )
+        if isinstance(method, SendPoll) and chat_id is not None:
+            message_id = self._next_message_id
+            self._next_message_id += 1
+            poll = Poll(
+                id=f"poll{message_id}",
+                question=method.question,
+                options=[
+                    PollOption(
+                        persistent_id=str(i), text=getattr(option, "text", option), voter_count=0
+                    )
+                    for i, option in enumerate(method.options)
+                ],
+                total_voter_count=0,
+                is_closed=False,
+                is_anonymous=bool(method.is_anonymous),
+                type=method.type or "regular",
+                allows_multiple_answers=False,
+                allows_revoting=False,
+                members_only=False,
+                correct_option_ids=method.correct_option_ids
+            )
+            return Message(
+                message_id=message_id,
+                date=datetime.utcnow(),
+                chat=Chat(id=chat_id, type="private"),
+                poll=poll
+            )
+        return True
+
+    async def stream_content(
+        self,
+        url: str,
+        headers: Optional[dict] = None,
+        timeout: int = 30,
+        chunk_size: int = 65536,
+        raise_for_status: bool = True
+    ) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self):
+        pass
+
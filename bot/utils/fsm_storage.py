@@ -0,0 +1,229 @@
+"""Bounded in-memory FSM storage
+
+Drop-in replacement for aiogram's MemoryStorage in a long-running process.
+MemoryStorage keeps a record for every user that ever sent an update
+(reads create records too), and abandoned quizzes keep their state forever.
+BoundedMemoryStorage
+  - drops quiz state (the default destiny) after `ttl` seconds without
+    access; since every access moves a key to the end of an OrderedDict and
+    all keys share the TTL, the least recently used key is also the first to
+    expire, and eviction only looks at the front
+  - caps each table at `max_entries` keys, evicting least recently used
+  - keeps other destinies (user settings) without a TTL, under the cap
+  - frees a key as soon as its state and data are cleared
+  - stores data compactly: the key tuple is shared between all records with
+    the same keys, values sit in a tuple and question id lists become
+    array('I') (4 bytes per id instead of a pointer plus an int object)
+
+create_storage() in bot.main sets both from FSM_IDLE_TTL_HOURS and
+FSM_MAX_SESSIONS.
+
+`python -m bot.utils.fsm_storage bench [sessions]` compares memory with
+MemoryStorage.
+"""
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType, DEFAULT_DESTINY
+
+IDLE_TTL = 24 * 3600
+MAX_SESSIONS = 100000
+
+# Quiz state fields holding lists of question ids
+ID_LIST_FIELDS = frozenset(('questions',))
+
+
+class _Record:
+    __slots__ = ('state', 'shape', 'values', 'touched')
+
+    def __init__(self, touched: float):
+        self.state: Optional[str] = None
+        self.shape: Tuple[str, ...] = ()
+        self.values: tuple = ()
+        self.touched = touched
+
+
+def _pack_value(name: str, value: Any) -> Any:
+    if name in ID_LIST_FIELDS and type(value) is list:
+        try:
+            return array('I', value)
+        except (OverflowError, TypeError):
+            return value
+    return value
+
+
+def _unpack_value(value: Any) -> Any:
+    return value.tolist() if type(value) is array else value
+
+
+class BoundedMemoryStorage(BaseStorage):
+    """In-memory FSM storage with idle TTL, LRU cap and compact records"""
+
+    def __init__(
+        self,
+        ttl: float = IDLE_TTL,
+        max_entries: int = MAX_SESSIONS,
+        clock=time.monotonic
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.evicted = 0
+        self._sessions: "OrderedDict[StorageKey, _Record]" = OrderedDict()
+        self._settings: "OrderedDict[StorageKey, _Record]" = OrderedDict()
+        self._shapes: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions) + len(self._settings)
+
+    def _table(self, key: StorageKey) -> "OrderedDict[StorageKey, _Record]":
+        return self._sessions if key.destiny == DEFAULT_DESTINY else self._settings
+
+    def _evict(self, now: float):
+        sessions = self._sessions
+        while sessions:
+            oldest = next(iter(sessions.values()))
+            if now - oldest.touched < self.ttl and len(sessions) <= self.max_entries:
+                break
+            sessions.popitem(last=False)
+            self.evicted += 1
+        while len(self._settings) > self.max_entries:
+            self._settings.popitem(last=False)
+            self.evicted += 1
+
+    def _get(self, key: StorageKey, create: bool = False) -> Optional[_Record]:
+        now = self.clock()
+        self._evict(now)
+        table = self._table(key)
+        record = table.get(key)
+        if record is None:
+            if not create:
+                return None
+            record = table[key] = _Record(now)
+            self._evict(now)
+        else:
+            record.touched = now
+            table.move_to_end(key)
+        return record
+
+    def _release_if_empty(self, key: StorageKey, record: _Record):
+        if record.state is None and not record.values:
+            self._table(key).pop(key, None)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        record = self._get(key, create=state is not None)
+        if record is None:
+            return
+        record.state = state
+        self._release_if_empty(key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = self._get(key)
+        return record.state if record is not None else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+        record = self._get(key, create=bool(data))
+        if record is None:
+            return
+        names = tuple(data)
+        record.shape = self._shapes.setdefault(names, names)
+        record.values = tuple(_pack_value(name, value) for name, value in data.items())
+        self._release_if_empty(key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = self._get(key)
+        if record is None:
+            return {}
+        return {
+            name: _unpack_value(value) for name, value in zip(record.shape, record.values)
+        }
+
+    async def close(self) -> None:
+        self._sessions.clear()
+        self._settings.clear()
+
+
+def _benchmark(sessions: int):
+    import asyncio
+    import gc
+    import random
+    import tracemalloc
+    from aiogram.fsm.storage.memory import MemoryStorage
+
+    rng = random.Random(3)
+    now = time.time()
+
+    def quiz_data(i: int) -> dict:
+        return {
+            'quiz_id': 100_000 + i,
+            'questions': rng.sample(range(1, 5000), 10),
+            'current_index': rng.randrange(10),
+            'correct_count': rng.randrange(10),
+            'start_time': now - rng.random() * 86400,
+            'question_start_time': now - rng.random() * 3600,
+            'answered_key': [100_000 + i, 3],
+        }
+
+    keys = [StorageKey(bot_id=42, chat_id=uid, user_id=uid) for uid in range(sessions)]
+
+    async def fill(storage):
+        # Data is built per session, as handlers do, so only the storage holds it
+        rng.seed(3)
+        for i, key in enumerate(keys):
+            await storage.set_state(key, "QuizStates:in_quiz")
+            await storage.set_data(key, quiz_data(i))
+
+    results = {}
+    for label, factory in (
+        ("MemoryStorage", MemoryStorage),
+        ("BoundedMemoryStorage", lambda: BoundedMemoryStorage(max_entries=sessions)),
+    ):
+        gc.collect()
+        storage = factory()
+        start = time.perf_counter()
+        asyncio.run(fill(storage))
+        elapsed = time.perf_counter() - start
+        results[label] = storage = factory()
+        gc.collect()
+        tracemalloc.start()
+        asyncio.run(fill(storage))
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"{label:<22}{size / 2 ** 20:8.1f} MiB for {sessions} idle sessions "
+              f"({size / sessions:.0f} B each), filled in {elapsed:.2f} s")
+
+    async def check():
+        for key in rng.sample(keys, 1000):
+            assert await results["BoundedMemoryStorage"].get_data(key) == \
+                await results["MemoryStorage"].get_data(key)
+            assert await results["BoundedMemoryStorage"].get_state(key) == "QuizStates:in_quiz"
+    asyncio.run(check())
+
+    # Idle eviction: a fake clock jumps past the TTL, the next access sweeps
+    clock = [0.0]
+    storage = BoundedMemoryStorage(ttl=3600, max_entries=sessions, clock=lambda: clock[0])
+    asyncio.run(fill(storage))
+    clock[0] += 3601
+    start = time.perf_counter()
+    asyncio.run(storage.get_state(keys[0]))
+    print(f"after the idle TTL: {len(storage)} sessions left, {storage.evicted} evicted "
+          f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        _benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 100_000)
+    else:
+        print("usage: python -m bot.utils.fsm_storage bench [sessions]")
+        sys.exit(2)
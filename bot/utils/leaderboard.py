@@ -0,0 +1,173 @@
+"""Incremental global and per-category leaderboards"""
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import User
+from ..database.rollups import answer_counts
+
+GLOBAL_BOARD = 'all'
+
+
+class RankIndex:
+    """Order-statistic index over non-negative integer scores
+
+    A Fenwick tree counts members per score, so rank lookups are O(log M)
+    where M is the highest score. Members with equal scores share a rank and
+    are listed in the order they reached that score.
+    """
+
+    def __init__(self, size: int = 64):
+        self._size = size
+        self._tree = [0] * (size + 1)
+        self._buckets: Dict[int, Dict[Hashable, None]] = {}
+        self._scores: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def __contains__(self, member) -> bool:
+        return member in self._scores
+
+    def _grow(self, score: int):
+        size = self._size
+        while size <= score:
+            size *= 2
+        self._size = size
+        self._tree = [0] * (size + 1)
+        for bucket_score, members in self._buckets.items():
+            self._add(bucket_score, len(members))
+
+    def _add(self, score: int, delta: int):
+        i = score + 1
+        while i <= self._size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _count_at_most(self, score: int) -> int:
+        i = min(score + 1, self._size)
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _score_of_kth_smallest(self, k: int) -> int:
+        """Lowest score s such that at least k members score <= s"""
+        position = 0
+        step = 1 << (self._size.bit_length() - 1)
+        while step:
+            nxt = position + step
+            if nxt <= self._size and self._tree[nxt] < k:
+                position = nxt
+                k -= self._tree[nxt]
+            step >>= 1
+        return position
+
+    def score(self, member) -> int:
+        """Current score of a member (0 if not ranked)"""
+        return self._scores.get(member, 0)
+
+    def set(self, member, score: int):
+        """Set a member's score; a score of 0 removes the member"""
+        old = self._scores.pop(member, None)
+        if old is not None:
+            bucket = self._buckets[old]
+            del bucket[member]
+            if not bucket:
+                del self._buckets[old]
+            self._add(old, -1)
+        if score <= 0:
+            return
+        if score >= self._size:
+            self._grow(score)
+        self._scores[member] = score
+        self._buckets.setdefault(score, {})[member] = None
+        self._add(score, 1)
+
+    def increment(self, member, delta: int = 1):
+        """Add to a member's score"""
+        self.set(member, self.score(member) + delta)
+
+    def rank(self, member) -> Optional[int]:
+        """1-based rank (ties share a rank) or None if the member is unranked"""
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        return len(self._scores) - self._count_at_most(score) + 1
+
+    def top(self, n: int) -> List[Tuple[Hashable, int]]:
+        """Up to n (member, score) pairs, highest score first"""
+        result = []
+        total = len(self._scores)
+        while len(result) < n and len(result) < total:
+            # Members not yet listed all score at most the next score to visit
+            score = self._score_of_kth_smallest(total - len(result))
+            for member in self._buckets[score]:
+                result.append((member, score))
+                if len(result) == n:
+                    break
+        return result
+
+
+class Leaderboards:
+    """Global and per-category boards of correct answers, keyed by telegram id
+
+    Loaded once from the database with two aggregate queries, then kept up
+    to date by record_answer() as answers are committed.
+    """
+
+    def __init__(self):
+        self.boards: Dict[str, RankIndex] = {GLOBAL_BOARD: RankIndex()}
+        self.names: Dict[int, str] = {}
+        self.loaded = False
+
+    def board(self, category: str) -> RankIndex:
+        """Board for a category (GLOBAL_BOARD for all topics)"""
+        board = self.boards.get(category)
+        if board is None:
+            board = self.boards[category] = RankIndex()
+        return board
+
+    async def load(self, session: AsyncSession):
+        """Rebuild all boards from users and user_answers"""
+        self.boards = {GLOBAL_BOARD: RankIndex()}
+        self.names = {}
+
+        users = await session.execute(
+            select(User.telegram_id, User.first_name, User.correct_answers)
+            .where(User.correct_answers > 0)
+        )
+        for telegram_id, first_name, correct in users:
+            self.names[telegram_id] = first_name or str(telegram_id)
+            self.boards[GLOBAL_BOARD].set(telegram_id, correct)
+
+        # Daily rollups plus answers not rolled up yet
+        counts = answer_counts()
+        per_category = await session.execute(
+            select(User.telegram_id, counts.c.category, func.sum(counts.c.correct))
+            .join(User, User.id == counts.c.user_id)
+            .group_by(User.telegram_id, counts.c.category)
+            .having(func.sum(counts.c.correct) > 0)
+        )
+        for telegram_id, category, correct in per_category:
+            self.board(category).set(telegram_id, correct)
+
+        self.loaded = True
+
+    async def ensure_loaded(self, session: AsyncSession):
+        """Load the boards on first use"""
+        if not self.loaded:
+            await self.load(session)
+
+    def record_answer(self, telegram_id: int, name: str, category: str, is_correct: bool):
+        """Apply a committed answer to the global and category boards"""
+        if not self.loaded or not is_correct:
+            return
+        self.names[telegram_id] = name or str(telegram_id)
+        self.boards[GLOBAL_BOARD].increment(telegram_id)
+        self.board(category).increment(telegram_id)
+
+
+leaderboards = Leaderboards()
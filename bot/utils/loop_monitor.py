@@ -0,0 +1,193 @@
+"""Event loop lag monitor and blocking-code reporter
+
+Synchronous work on the event loop stalls every user at once. LoopMonitor
+runs a watchdog thread that schedules a no-op on the loop every
+LOOP_MONITOR_INTERVAL_MS and times how long the loop takes to run it: that
+is the scheduling lag, kept over a sliding window for /loop_stats. If the
+loop does not respond within LOOP_STALL_MS, the watchdog captures the
+loop thread's stack while it is still blocked, attributes it to a handler
+(see bot.utils.profiler), and logs it with the stall's duration once the
+loop is back. LOOP_STALL_MS=0 turns the monitor off.
+
+Test mode: with LOOP_STRICT=1, LoopBudgetMiddleware (bot.middlewares) makes a
+handler that blocked the loop for longer than LOOP_STALL_MS fail with
+LoopBlockedError; in tests, `with loop_budget(0.05, "name"):` does the same
+for any block.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from .profiler import attribute
+
+logger = logging.getLogger(__name__)
+
+STALL_THRESHOLD = float(os.getenv("LOOP_STALL_MS", "100")) / 1000
+PING_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "50")) / 1000
+STRICT = os.getenv("LOOP_STRICT", "0") == "1"
+LAG_WINDOW = 1200  # pings kept for percentiles (one minute at 50 ms)
+STALLS_KEPT = 50
+STACK_DEPTH = 12
+
+
+class Stall:
+    """The loop was blocked: where, and for how long"""
+    __slots__ = ('started', 'duration', 'owner', 'codes', 'stack')
+
+    def __init__(self, started: float, codes: tuple):
+        self.started = started
+        self.duration: Optional[float] = None  # known once the loop responds again
+        self.owner = attribute(codes)
+        self.codes = frozenset(codes)
+        self.stack: List[traceback.FrameSummary] = []
+
+    def format(self) -> str:
+        duration = f"{self.duration * 1000:.0f} ms" if self.duration is not None else "a while"
+        frames = "".join(traceback.format_list(self.stack[-STACK_DEPTH:]))
+        return f"Event loop blocked for {duration} by {self.owner}:\n{frames}"
+
+
+class LoopBlockedError(AssertionError):
+    """A handler or block kept the event loop busy for longer than its budget"""
+
+    def __init__(self, name: str, budget: float, stall: Stall):
+        self.name = name
+        self.budget = budget
+        self.stall = stall
+        super().__init__(
+            f"{name} blocked the event loop for more than {budget * 1000:.0f} ms\n"
+            f"{stall.format()}"
+        )
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+class LoopMonitor:
+    """Measure event loop lag and catch the code that blocks it"""
+
+    def __init__(
+        self,
+        threshold: float = STALL_THRESHOLD,
+        interval: float = PING_INTERVAL,
+        log_stalls: bool = True
+    ):
+        self.threshold = threshold
+        self.interval = interval
+        self.log_stalls = log_stalls
+        self.lags: deque = deque(maxlen=LAG_WINDOW)
+        self.stalls: deque = deque(maxlen=STALLS_KEPT)
+        self.stall_count = 0
+        self.max_lag = 0.0
+        self._stop: Optional[threading.Event] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Watch the running event loop (call from the loop's thread)"""
+        if self.running or self.threshold <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._watch,
+            args=(loop, threading.get_ident(), self._stop),
+            name="loop-monitor",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+        self._thread = None
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, loop_thread: int, stop: threading.Event):
+        while not stop.is_set():
+            answered = threading.Event()
+            sent = time.monotonic()
+            try:
+                loop.call_soon_threadsafe(answered.set)
+            except RuntimeError:
+                return  # the loop is closed
+
+            stall = None
+            if not answered.wait(self.threshold):
+                frame = sys._current_frames().get(loop_thread)
+                if frame is not None:
+                    codes = []
+                    walk = frame
+                    while walk is not None:
+                        codes.append(walk.f_code)
+                        walk = walk.f_back
+                    codes.reverse()
+                    # Recorded before the loop resumes, so LoopBudgetMiddleware sees it
+                    stall = Stall(sent, tuple(codes))
+                    self.stalls.append(stall)
+                    self.stall_count += 1
+                    stack = traceback.StackSummary.extract(
+                        traceback.walk_stack(frame), lookup_lines=False
+                    )
+                    stack.reverse()
+                    stall.stack = stack
+                while not answered.wait(1.0):
+                    if stop.is_set() or loop.is_closed():
+                        return
+
+            lag = time.monotonic() - sent
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if stall is not None:
+                stall.duration = lag
+                if self.log_stalls:
+                    logger.warning(stall.format())
+            stop.wait(self.interval)
+
+    def stalls_since(self, count: int) -> List[Stall]:
+        """Stalls recorded after stall_count was `count`"""
+        new = self.stall_count - count
+        return list(self.stalls)[-new:] if new > 0 else []
+
+    def metrics(self) -> Dict[str, Any]:
+        lags = sorted(self.lags)
+        last = self.stalls[-1] if self.stalls else None
+        return {
+            'lag_p50_ms': _percentile(lags, 0.5) * 1000,
+            'lag_p99_ms': _percentile(lags, 0.99) * 1000,
+            'lag_max_ms': self.max_lag * 1000,
+            'stalls': self.stall_count,
+            'last_stall_owner': last.owner if last else None,
+            'last_stall_ms': (last.duration or 0) * 1000 if last else None,
+        }
+
+
+loop_monitor = LoopMonitor()
+
+
+@contextmanager
+def loop_budget(budget: float, name: str = "block"):
+    """Fail with the blocking stack if the loop is blocked longer than budget
+
+    Usage in tests (inside a running loop):
+        with loop_budget(0.05, 'cmd_stats'):
+            await cmd_stats(message, session)
+    """
+    monitor = LoopMonitor(threshold=budget, interval=budget / 4, log_stalls=False)
+    monitor.start()
+    try:
+        yield monitor
+    finally:
+        monitor.stop()
+    if monitor.stalls:
+        raise LoopBlockedError(name, budget, monitor.stalls[0])
@@ -0,0 +1,58 @@
+"""Map of sent quiz polls to the questions they ask
+
+A PollAnswer update carries the poll id and the voter, but no chat or
+message, so every quiz poll the bot sends is remembered here until it is
+answered. Entries expire after POLL_TTL_MINUTES; all entries share the TTL,
+so insertion order is expiry order and eviction only looks at the oldest.
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+POLL_TTL = float(os.getenv("POLL_TTL_MINUTES", "60")) * 60
+MAX_POLLS = 100_000
+
+
+class PollEntry(NamedTuple):
+    """What a sent quiz poll asks, and of whom"""
+    user_id: int
+    chat_id: int
+    quiz_id: int
+    index: int  # position of the question in the quiz
+    question_id: int
+    category: str
+    letters: str  # option letter of each poll option, in poll order
+    correct: str  # correct option letter
+    sent_at: float  # time.monotonic()
+
+
+class PollMap:
+    """Poll id -> PollEntry with TTL and size bounds"""
+
+    def __init__(self, ttl: float = POLL_TTL, max_size: int = MAX_POLLS):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, PollEntry]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self, now: float):
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if now - entry.sent_at < self.ttl and len(self._entries) <= self.max_size:
+                break
+            self._entries.popitem(last=False)
+
+    def add(self, poll_id: str, entry: PollEntry):
+        self._entries[poll_id] = entry
+        self._evict(entry.sent_at)
+
+    def pop(self, poll_id: str) -> Optional[PollEntry]:
+        """Take the entry of an answered poll (None if unknown or expired)"""
+        self._evict(time.monotonic())
+        return self._entries.pop(poll_id, None)
+
+
+poll_map = PollMap()
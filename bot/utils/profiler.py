@@ -0,0 +1,328 @@
+"""On-demand sampling profiler for the running event loop
+
+Nothing runs while profiling is off. When started (`/profile [seconds]` by
+an admin, or SIGUSR2), an interval timer raises SIGALRM every
+PROFILE_INTERVAL_MS of wall time for the given time, and the signal handler
+records the stack it interrupted. It runs on the event loop thread itself,
+so samples are not biased towards moments the loop releases the GIL, and a
+loop waiting in select() is seen as idle. Each sample is attributed to the
+handler on the stack (its outermost frame under bot/handlers), or else to
+aiogram, a background task of the bot, or idle time waiting for I/O. Two
+files go to PROFILE_DIR:
+
+  *.collapsed  "handler;frame;frame count" lines, for flamegraph.pl,
+               speedscope or inferno
+  *.pstats     readable with pstats.Stats or snakeviz; a synthetic
+               <handler> function per handler sits at the root, so
+               print_callees() breaks the time down per handler
+
+Times are estimates: samples x interval. Only code running on the loop is
+seen; threads started with to_thread are not sampled. Needs a POSIX
+setitimer and the loop in the main thread (as in main and the workers).
+
+`python -m bot.utils.profiler bench` measures the sampling overhead.
+"""
+import asyncio
+import logging
+import marshal
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "data/profiles"))
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+DEFAULT_SECONDS = 10.0
+MAX_SECONDS = 120.0
+
+IDLE = "(idle)"
+DISPATCH = "(aiogram)"
+OTHER = "(other)"
+
+_ASYNCIO_DIR = os.path.dirname(asyncio.__file__) + os.sep
+_SELECTORS_FILE = "selectors.py"
+_BOT_DIR = str(Path(__file__).resolve().parent.parent) + os.sep
+_HANDLERS_DIR = _BOT_DIR + "handlers" + os.sep
+_AIOGRAM_MARK = os.sep + "aiogram" + os.sep
+
+
+class ProfileReport(NamedTuple):
+    """Summary of one profiling run"""
+    seconds: float
+    samples: int
+    busy: int  # samples not waiting for I/O
+    by_handler: List[Tuple[str, int]]  # busy samples per handler, most first
+    hot: List[Tuple[str, int]]  # self samples per function, most first
+    collapsed_path: Path
+    pstats_path: Path
+
+
+def _label(code) -> str:
+    """function (file:line) with the file relative to the bot or site-packages"""
+    filename = code.co_filename
+    if filename.startswith(_BOT_DIR):
+        filename = "bot/" + filename[len(_BOT_DIR):].replace(os.sep, "/")
+    else:
+        for marker in ("site-packages" + os.sep, "lib" + os.sep + "python"):
+            index = filename.rfind(marker)
+            if index != -1:
+                filename = filename[index + len(marker):]
+                break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _task_frames(stack: tuple) -> tuple:
+    """Frames of the running callback: what follows the event loop's own frames"""
+    index = 0
+    while index < len(stack) and not stack[index].co_filename.startswith(_ASYNCIO_DIR):
+        index += 1
+    if index == len(stack):
+        return stack
+    while index < len(stack) and stack[index].co_filename.startswith(_ASYNCIO_DIR):
+        index += 1
+    return stack[index:]
+
+
+def _owner(frames: tuple) -> str:
+    """Handler (or other activity) a sample is attributed to"""
+    if not frames or frames[-1].co_filename.endswith(_SELECTORS_FILE):
+        return IDLE
+    for code in frames:
+        if code.co_filename.startswith(_HANDLERS_DIR):
+            return f"{Path(code.co_filename).stem}.{code.co_name}"
+    if any(_AIOGRAM_MARK in code.co_filename for code in frames):
+        return DISPATCH
+    for code in frames:
+        if code.co_filename.startswith(_BOT_DIR):
+            return f"{Path(code.co_filename).stem}.{code.co_name}"
+    return OTHER
+
+
+def attribute(stack: tuple) -> str:
+    """Handler or activity that a stack of code objects (outermost first) belongs to"""
+    return _owner(_task_frames(stack))
+
+
+def _write(stacks: Counter, interval: float, seconds: float, base: Path) -> ProfileReport:
+    """Write collapsed stacks and pstats, and summarize"""
+    by_owner: Counter = Counter()
+    hot: Counter = Counter()
+    lines = []
+    # pstats layout: func -> [primitive calls, calls, self time, cumulative time, callers]
+    stats: Dict[tuple, list] = {}
+
+    def entry(func: tuple) -> list:
+        if func not in stats:
+            stats[func] = [0, 0, 0.0, 0.0, {}]
+        return stats[func]
+
+    total = 0
+    for stack, count in stacks.items():
+        total += count
+        frames = _task_frames(stack)
+        owner = _owner(frames)
+        by_owner[owner] += count
+        if owner == IDLE:
+            continue
+
+        labels = [owner] + [_label(code) for code in frames]
+        lines.append(f"{';'.join(labels)} {count}")
+        funcs = [("<handler>", 0, owner)] + [
+            (code.co_filename, code.co_firstlineno, code.co_name) for code in frames
+        ]
+        hot[labels[-1]] += count
+        elapsed = count * interval
+        seen = set()
+        for depth, func in enumerate(funcs):
+            record = entry(func)
+            if func not in seen:  # recursion counts once per sample
+                seen.add(func)
+                record[0] += count
+                record[1] += count
+                record[3] += elapsed
+            if depth:
+                callers = record[4]
+                caller = funcs[depth - 1]
+                nc, cc, tt, ct = callers.get(caller, (0, 0, 0.0, 0.0))
+                callers[caller] = (nc + count, cc + count, tt, ct + elapsed)
+        record = entry(funcs[-1])
+        record[2] += elapsed
+        caller = funcs[-2] if len(funcs) > 1 else None
+        if caller is not None:
+            nc, cc, tt, ct = record[4][caller]
+            record[4][caller] = (nc, cc, tt + elapsed, ct)
+
+    base.parent.mkdir(parents=True, exist_ok=True)
+    collapsed_path = base.with_suffix(".collapsed")
+    collapsed_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    pstats_path = base.with_suffix(".pstats")
+    with open(pstats_path, "wb") as f:
+        marshal.dump({func: tuple(record) for func, record in stats.items()}, f)
+
+    busy = total - by_owner.get(IDLE, 0)
+    return ProfileReport(
+        seconds=seconds,
+        samples=total,
+        busy=busy,
+        by_handler=[(name, n) for name, n in by_owner.most_common() if name != IDLE],
+        hot=hot.most_common(),
+        collapsed_path=collapsed_path,
+        pstats_path=pstats_path
+    )
+
+
+class SamplingProfiler:
+    """Sample the event loop thread for a while and write the profile"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, output_dir: Path = PROFILE_DIR):
+        self.interval = interval
+        self.output_dir = Path(output_dir)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @staticmethod
+    def _check_supported():
+        if not hasattr(signal, "setitimer"):
+            raise RuntimeError("Profiling needs signal.setitimer, which this platform lacks")
+        if threading.current_thread() is not threading.main_thread():
+            raise RuntimeError("Profiling needs the event loop in the main thread")
+
+    async def profile(self, seconds: float) -> ProfileReport:
+        """Sample the loop this coroutine runs on for `seconds`"""
+        self._check_supported()
+        stacks: Counter = Counter()
+
+        def on_alarm(signum, frame):
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            codes.reverse()
+            stacks[tuple(codes)] += 1
+
+        logger.info(f"Profiling the event loop for {seconds:g}s")
+        previous = signal.signal(signal.SIGALRM, on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+        name = f"profile-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+        report = await asyncio.to_thread(
+            _write, stacks, self.interval, seconds, self.output_dir / name
+        )
+        logger.info(
+            f"Profile written to {report.collapsed_path} and {report.pstats_path}: "
+            f"loop busy {report.busy}/{report.samples} samples"
+        )
+        return report
+
+    def start(
+        self,
+        seconds: float = DEFAULT_SECONDS,
+        notify: Callable[[ProfileReport], Awaitable] = None
+    ) -> asyncio.Task:
+        """Profile in the background, then pass the report to `notify`"""
+        if self.running:
+            raise RuntimeError("A profile is already being taken")
+        self._check_supported()
+
+        async def run():
+            try:
+                report = await self.profile(min(seconds, MAX_SECONDS))
+            except Exception as e:
+                logger.error(f"Profiling failed: {e}", exc_info=True)
+                raise
+            if notify is not None:
+                await notify(report)
+            return report
+
+        self._task = asyncio.create_task(run())
+        return self._task
+
+    def install_signal_handler(self, signum: int = getattr(signal, "SIGUSR2", None)):
+        """Start a DEFAULT_SECONDS profile on a signal (POSIX only)"""
+        if signum is None:
+            return
+
+        def on_signal():
+            if self.running:
+                logger.info("Profile already running, signal ignored")
+            else:
+                self.start()
+
+        try:
+            asyncio.get_running_loop().add_signal_handler(signum, on_signal)
+        except (NotImplementedError, RuntimeError):
+            pass  # no signal support on this platform or outside the main thread
+
+
+profiler = SamplingProfiler()
+
+
+def format_report(report: ProfileReport, top: int = 8) -> str:
+    """Plain-text summary of a profile"""
+    busy = report.busy or 1
+    lines = [
+        f"{report.seconds:g}s, {report.samples} samples, "
+        f"loop busy {report.busy * 100 / max(report.samples, 1):.1f}%",
+        "",
+        "Busy time by handler:",
+    ]
+    lines += [f"  {n * 100 / busy:5.1f}%  {name}" for name, n in report.by_handler[:top]]
+    lines += ["", "Hottest functions (self):"]
+    lines += [f"  {n * 100 / busy:5.1f}%  {name}" for name, n in report.hot[:top]]
+    lines += ["", f"{report.collapsed_path}", f"{report.pstats_path}"]
+    return "\n".join(lines)
+
+
+async def _benchmark(seconds: float = 3.0):
+    """Throughput of a CPU-bound coroutine workload with and without sampling"""
+    import tempfile
+
+    def work():
+        return sum(len(str(i) * 3) for i in range(2000))
+
+    async def loop_for(duration: float) -> int:
+        done = 0
+        end = time.perf_counter() + duration
+        while time.perf_counter() < end:
+            work()
+            done += 1
+            await asyncio.sleep(0)
+        return done
+
+    await loop_for(0.5)  # warm up
+    with tempfile.TemporaryDirectory() as directory:
+        sampler = SamplingProfiler(output_dir=Path(directory))
+        before = await loop_for(seconds)
+        task = sampler.start(seconds)
+        sampled = await loop_for(seconds)
+        report = await task
+        baseline = (before + await loop_for(seconds)) / 2
+        print(f"profiling off: {baseline / seconds:9.0f} iterations/s")
+        print(f"profiling on:  {sampled / seconds:9.0f} iterations/s "
+              f"({(1 - sampled / baseline) * 100:+.1f}% slower at "
+              f"{sampler.interval * 1000:g} ms interval, {report.samples} samples)")
+        print(format_report(report, top=3))
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "bench":
+        asyncio.run(_benchmark(float(sys.argv[2]) if len(sys.argv) > 2 else 3.0))
+    else:
+        print("usage: python -m bot.utils.profiler bench [seconds]")
+        sys.exit(2)
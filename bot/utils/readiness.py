@@ -0,0 +1,85 @@
+"""Startup readiness tracking for components warmed up in the background"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Components warmed up at startup
+DATABASE = 'database'
+QUESTIONS = 'questions'
+LEADERBOARDS = 'leaderboards'
+
+
+class ComponentFailed(RuntimeError):
+    """A component a handler depends on failed to warm up"""
+
+
+class Readiness:
+    """Named readiness events with timing relative to process start"""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.ready_after: Dict[str, float] = {}
+        self.first_response_after: Optional[float] = None
+        self._events: Dict[str, asyncio.Event] = {}
+        self._errors: Dict[str, BaseException] = {}
+
+    def _event(self, name: str) -> asyncio.Event:
+        event = self._events.get(name)
+        if event is None:
+            event = self._events[name] = asyncio.Event()
+        return event
+
+    def elapsed(self) -> float:
+        """Seconds since process start"""
+        return time.monotonic() - self.started_at
+
+    def is_ready(self, name: str) -> bool:
+        """Whether a component finished warming up successfully"""
+        return name in self.ready_after
+
+    def mark_ready(self, name: str):
+        """Mark a component ready and release waiting handlers"""
+        self.ready_after[name] = self.elapsed()
+        self._event(name).set()
+
+    def mark_failed(self, name: str, error: BaseException):
+        """Record a failed component; waiters get ComponentFailed"""
+        self._errors[name] = error
+        self._event(name).set()
+
+    async def wait(self, names: Iterable[str], timeout: float = None):
+        """Wait until all named components are ready"""
+        for name in names:
+            if name in self.ready_after:
+                continue
+            await asyncio.wait_for(self._event(name).wait(), timeout)
+            if name in self._errors:
+                raise ComponentFailed(f"{name} failed to start") from self._errors[name]
+
+    async def run(self, name: str, coro: Awaitable):
+        """Run a warm-up step and mark its component ready or failed"""
+        start = time.monotonic()
+        try:
+            result = await coro
+        except Exception as e:
+            logger.error(f"Warm-up of {name} failed: {e}", exc_info=True)
+            self.mark_failed(name, e)
+            raise
+        self.mark_ready(name)
+        logger.info(
+            f"{name} ready in {time.monotonic() - start:.3f}s "
+            f"({self.elapsed():.3f}s after start)"
+        )
+        return result
+
+    def record_response(self):
+        """Log time to first response once"""
+        if self.first_response_after is None:
+            self.first_response_after = self.elapsed()
+            logger.info(f"First response {self.first_response_after:.3f}s after start")
+
+
+readiness = Readiness()
@@ -1,9 +1,10 @@
 """SPLAT test file analyzer to generate questions"""
 import os
-import json
 from pathlib import Path
 from typing import Dict, List, Tuple
 
+from . import codec
+
 
 class SplatTestAnalyzer:
     """Analyze SPLAT test files and generate quiz questions"""
@@ -239,8 +240,7 @@ class SplatTestAnalyzer:
     def save_questions(self, output_file: str):
         """Save generated questions to JSON file"""
         questions = self.analyze_all_tests()
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(questions, f, indent=2, ensure_ascii=False)
+        codec.dump_file(output_file, questions, indent=True)
         print(f"Generated {len(questions)} questions from SPLAT tests")
         print(f"Saved to {output_file}")
 
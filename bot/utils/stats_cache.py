@@ -0,0 +1,102 @@
+"""Cache of rendered "My Stats" messages
+
+Every recorded answer bumps the user's version; a rendered view is stored
+under the version read before its queries ran and the UTC day (the "last 7
+days" block moves at midnight). A view is served only while both still
+match, so repeated taps between quizzes cost no database access and no
+rendering, and a view rendered while an answer was being written is never
+stored as current.
+
+Users are kept in an LRU bounded by max_users (STATS_CACHE_SIZE, set by
+create_dispatcher()); bumping drops the cached text, so forgetting a
+version never revives an outdated view.
+"""
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+MAX_USERS = 10000
+
+
+class _Entry:
+    __slots__ = ('version', 'day', 'text')
+
+    def __init__(self):
+        self.version = 0
+        self.day: Optional[str] = None
+        self.text: Optional[str] = None
+
+
+def _today() -> str:
+    return datetime.utcnow().date().isoformat()
+
+
+class StatsViewCache:
+    """Rendered stats text per telegram user, keyed by an answer version"""
+
+    def __init__(self, max_users: int = MAX_USERS):
+        self.max_users = max_users
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def _entry(self, telegram_id: int) -> _Entry:
+        entry = self._entries.get(telegram_id)
+        if entry is None:
+            entry = self._entries[telegram_id] = _Entry()
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._entries.move_to_end(telegram_id)
+        return entry
+
+    def version(self, telegram_id: int) -> int:
+        """Current version; read it before the queries of a render"""
+        entry = self._entries.get(telegram_id)
+        return entry.version if entry is not None else 0
+
+    def get(self, telegram_id: int) -> Optional[str]:
+        """Cached text if no answer was recorded since and the day is the same"""
+        entry = self._entries.get(telegram_id)
+        if entry is not None and entry.text is not None and entry.day == _today():
+            self._entries.move_to_end(telegram_id)
+            self.hits += 1
+            return entry.text
+        self.misses += 1
+        return None
+
+    def put(self, telegram_id: int, version: int, text: str):
+        """Store a render made at `version`; ignored if an answer came in meanwhile"""
+        if self.version(telegram_id) != version:
+            return
+        entry = self._entry(telegram_id)
+        entry.day = _today()
+        entry.text = text
+
+    def bump(self, telegram_id: int):
+        """An answer was recorded: outdate the user's cached view"""
+        entry = self._entry(telegram_id)
+        entry.version += 1
+        entry.text = None
+
+    def metrics(self) -> dict:
+        return {
+            'users': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hit_ratio,
+            'evictions': self.evictions,
+        }
+
+
+stats_views = StatsViewCache()
@@ -0,0 +1,122 @@
+"""Shared fixtures: one event loop, an in-memory database and a fake Bot API
+
+The bot's modules keep process-wide state (engine, catalog, caches), so the
+database and the dispatcher are set up once per session and each test talks
+to them as its own Telegram user.
+"""
+
+import asyncio
+import itertools
+import os
+from datetime import datetime
+from typing import List
+
+os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///:memory:"
+os.environ.setdefault("BOT_TOKEN", "42:TEST")
+
+import pytest
+from aiogram import Bot
+from aiogram.methods import EditMessageText, SendMessage
+from aiogram.types import CallbackQuery, Chat, Message, MessageEntity, Update
+from aiogram.types import User as TelegramUser
+
+_update_ids = itertools.count(1)
+
+
+class Client:
+    """A Telegram user sending updates to the dispatcher"""
+
+    def __init__(self, dp, bot: Bot, api, telegram_id: int):
+        self.dp = dp
+        self.bot = bot
+        self.api = api
+        self.user = TelegramUser(id=telegram_id, is_bot=False, first_name=f"U{telegram_id}")
+        self.chat = Chat(id=telegram_id, type="private")
+
+    def _message(self, text: str = "", entities=None) -> Message:
+        return Message(
+            message_id=next(_update_ids),
+            date=datetime.now(),
+            chat=self.chat,
+            from_user=self.user,
+            text=text,
+            entities=entities,
+        )
+
+    async def command(self, text: str):
+        command = text.split()[0]
+        entities = [MessageEntity(type="bot_command", offset=0, length=len(command))]
+        update = Update(update_id=next(_update_ids), message=self._message(text, entities))
+        await self.dp.feed_update(self.bot, update)
+
+    async def press(self, data: str):
+        callback = CallbackQuery(
+            id=str(next(_update_ids)),
+            from_user=self.user,
+            chat_instance="test",
+            data=data,
+            message=self._message("menu"),
+        )
+        await self.dp.feed_update(
+            self.bot, Update(update_id=next(_update_ids), callback_query=callback)
+        )
+
+    async def user_id(self) -> int:
+        """users.id of this user (the row exists after their first update)"""
+        from sqlalchemy import select
+
+        from bot.database import async_session_maker
+        from bot.database.models import User
+
+        async with async_session_maker() as session:
+            return await session.scalar(select(User.id).where(User.telegram_id == self.user.id))
+
+    def sent(self) -> list:
+        """Messages sent or edited in this user's chat"""
+        return [
+            call
+            for call in self.api.calls
+            if isinstance(call, (SendMessage, EditMessageText)) and call.chat_id == self.chat.id
+        ]
+
+    def buttons(self) -> List[str]:
+        """Callback data of the last inline keyboard shown to this user"""
+        for call in reversed(self.sent()):
+            if call.reply_markup is not None:
+                return [b.callback_data for row in call.reply_markup.inline_keyboard for b in row]
+        return []
+
+
+@pytest.fixture(scope="session")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def run(loop):
+    """Run a coroutine to completion on the session's event loop"""
+    return loop.run_until_complete
+
+
+@pytest.fixture(scope="session")
+def dispatcher(run):
+    """Dispatcher and bot on a warmed-up in-memory database"""
+    from bot import main
+    from bot.database.db import close_db
+    from bot.utils.fake_api import FakeTelegramSession
+
+    api = FakeTelegramSession(global_limit=100_000, chat_limit=100_000)
+    bot = Bot(token="42:TEST", session=api)
+    dp = main.create_dispatcher()
+    run(main.warm_up())
+    yield dp, bot, api
+    run(close_db())
+
+
+@pytest.fixture
+def client(dispatcher):
+    """Factory of Clients; give each test its own telegram ids"""
+    dp, bot, api = dispatcher
+    return lambda telegram_id: Client(dp, bot, api, telegram_id)
@@ -0,0 +1,115 @@
+"""Broadcasts on the fake Bot API, at SCALE times the real rates"""
+
+import asyncio
+
+import pytest
+from aiogram import Bot
+from aiogram.methods import SendMessage
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from bot.database.models import Base, User
+from bot.middlewares.send_scheduler import CHAT_RATE, GLOBAL_RATE, SendScheduler
+from bot.utils.broadcast import BROADCAST_RATE, CANCELLED, DONE, Broadcaster
+from bot.utils.fake_api import FakeTelegramSession
+
+SCALE = 10
+USERS = 300
+BATCH_SIZE = 50
+BLOCKED_CHATS = {1000 + i for i in range(0, USERS, 25)}
+
+
+@pytest.fixture
+def session_maker(run):
+    """A database of its own with USERS users"""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_maker() as session:
+            session.add_all(User(telegram_id=1000 + i, first_name=f"U{i}") for i in range(USERS))
+            await session.commit()
+        return session_maker
+
+    yield run(setup())
+    run(engine.dispose())
+
+
+@pytest.fixture
+def api(run):
+    api = FakeTelegramSession(window=1.0 / SCALE, blocked_chats=BLOCKED_CHATS)
+    scheduler = SendScheduler(global_rate=GLOBAL_RATE * SCALE, chat_rate=CHAT_RATE * SCALE)
+    api.middleware(scheduler)
+    yield api
+    run(scheduler.close())
+
+
+def broadcaster(session_maker) -> Broadcaster:
+    return Broadcaster(session_maker, rate=BROADCAST_RATE * SCALE, batch_size=BATCH_SIZE)
+
+
+def sent_to(api, start: int = 0) -> list:
+    return [call.chat_id for call in api.calls[start:] if isinstance(call, SendMessage)]
+
+
+def test_cancel_from_another_worker_stops_at_next_checkpoint(run, session_maker, api):
+    bot = Bot(token="42:TEST", session=api)
+    worker, other = broadcaster(session_maker), broadcaster(session_maker)
+
+    async def scenario():
+        broadcast = await worker.create("announcement", created_by=1)
+        task = worker.start(bot, broadcast.id)
+        await asyncio.sleep(USERS / (BROADCAST_RATE * SCALE) / 4)
+        assert await other.cancel(broadcast.id)
+        cancelled_after = len(sent_to(api))
+        await asyncio.wait_for(task, timeout=5)
+        return broadcast.id, cancelled_after
+
+    broadcast_id, cancelled_after = run(scenario())
+    assert run(other.get(broadcast_id)).status == CANCELLED
+    # Only the batch in flight when it was cancelled is finished
+    assert len(sent_to(api)) <= cancelled_after + BATCH_SIZE
+    assert len(sent_to(api)) < USERS - len(BLOCKED_CHATS)
+
+
+def test_restart_sends_to_everyone_once(run, session_maker, api):
+    bot = Bot(token="42:TEST", session=api)
+
+    async def scenario():
+        first = broadcaster(session_maker)
+        broadcast = await first.create("📣 <b>New SPLAT tests added</b>", created_by=1)
+        first.start(bot, broadcast.id)
+        await asyncio.sleep(USERS / (BROADCAST_RATE * SCALE) / 2)
+        await first.close()  # restart halfway through
+        halfway = len(sent_to(api))
+
+        second = broadcaster(session_maker)
+        assert await second.resume(bot) == 1
+        await asyncio.gather(*second._tasks.values())
+        return broadcast.id, halfway
+
+    broadcast_id, halfway = run(scenario())
+    delivered = sent_to(api)
+    assert 0 < halfway < len(delivered)
+    assert len(delivered) == len(set(delivered))  # nobody got it twice
+    assert set(delivered) == {1000 + i for i in range(USERS)} - BLOCKED_CHATS  # or missed it
+    assert api.rejected == 0
+
+    result = run(broadcaster(session_maker).get(broadcast_id))
+    assert (result.status, result.sent, result.blocked, result.failed) == (
+        DONE,
+        USERS - len(BLOCKED_CHATS),
+        len(BLOCKED_CHATS),
+        0,
+    )
+
+    # The next broadcast skips the users found blocked
+    calls = len(api.calls)
+    again = broadcaster(session_maker)
+    broadcast = run(again.create("second announcement", created_by=1))
+    run(again.run(bot, broadcast.id))
+    assert len(sent_to(api, calls)) == USERS - len(BLOCKED_CHATS)
+    assert not [
+        call for call in api.calls[calls:] if getattr(call, "chat_id", None) in BLOCKED_CHATS
+    ]
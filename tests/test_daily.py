@@ -0,0 +1,27 @@
+"""The daily challenge is drawn from the published question bank"""
+
+from bot.database import async_session_maker
+from bot.questions.catalog import QuestionCatalog, get_catalog, set_catalog
+from bot.questions.daily import DAILY_SIZE, DailyChallengeService
+
+
+def test_daily_set_skips_questions_outside_the_catalog(run, dispatcher):
+    published = get_catalog()
+    # As if every other question had been suppressed
+    by_category = {category: ids[::2] for category, ids in published.by_category.items()}
+    set_catalog(QuestionCatalog(by_category, {}))
+    try:
+
+        async def generate():
+            async with async_session_maker() as session:
+                challenge = await DailyChallengeService().get(session, "2001-02-01")
+                await session.commit()
+                return challenge
+
+        challenge = run(generate())
+    finally:
+        set_catalog(published)
+
+    kept = {qid for ids in by_category.values() for qid in ids}
+    assert len(challenge.question_ids) == DAILY_SIZE
+    assert set(challenge.question_ids) <= kept
@@ -0,0 +1,84 @@
+"""Strict mode catches handlers that block the event loop"""
+
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.filters import Command
+from aiogram.types import Chat, Message, MessageEntity, Update, User
+
+from bot.middlewares import LoopBudgetMiddleware
+from bot.utils.fake_api import FakeTelegramSession
+from bot.utils.loop_monitor import LoopBlockedError, LoopMonitor, loop_budget
+
+THRESHOLD = 0.05
+
+
+def command_update(text: str) -> Update:
+    user = User(id=3001, is_bot=False, first_name="U3001")
+    message = Message(
+        message_id=1,
+        date=datetime.now(),
+        chat=Chat(id=3001, type="private"),
+        from_user=user,
+        text=text,
+        entities=[MessageEntity(type="bot_command", offset=0, length=len(text))],
+    )
+    return Update(update_id=1, message=message)
+
+
+@pytest.fixture
+def strict_dispatcher():
+    router = Router()
+
+    @router.message(Command("blocking"))
+    async def blocking(message: Message):
+        time.sleep(THRESHOLD * 4)
+
+    @router.message(Command("sleeping"))
+    async def sleeping(message: Message):
+        await asyncio.sleep(THRESHOLD * 4)
+
+    monitor = LoopMonitor(threshold=THRESHOLD, interval=THRESHOLD / 4, log_stalls=False)
+    dp = Dispatcher()
+    dp.message.middleware(LoopBudgetMiddleware(monitor))
+    dp.include_router(router)
+    return dp, monitor
+
+
+def feed(run, dp, monitor, text: str):
+    async def scenario():
+        monitor.start()
+        try:
+            bot = Bot(token="42:TEST", session=FakeTelegramSession())
+            await dp.feed_update(bot, command_update(text))
+        finally:
+            monitor.stop()
+
+    run(scenario())
+
+
+def test_strict_mode_fails_a_handler_that_blocks_the_loop(run, strict_dispatcher):
+    dp, monitor = strict_dispatcher
+    with pytest.raises(LoopBlockedError) as failure:
+        feed(run, dp, monitor, "/blocking")
+    assert failure.value.name == "blocking"
+    assert any(frame.name == "blocking" for frame in failure.value.stall.stack)
+
+
+def test_strict_mode_lets_an_awaiting_handler_through(run, strict_dispatcher):
+    dp, monitor = strict_dispatcher
+    feed(run, dp, monitor, "/sleeping")
+    assert monitor.stall_count == 0
+
+
+def test_loop_budget_reports_a_blocking_block(run):
+    async def scenario():
+        with loop_budget(THRESHOLD, "sleep"):
+            time.sleep(THRESHOLD * 4)
+
+    with pytest.raises(LoopBlockedError) as failure:
+        run(scenario())
+    assert failure.value.name == "sleep"
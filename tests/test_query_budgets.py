@@ -0,0 +1,100 @@
+"""Handlers stay within HANDLER_QUERY_BUDGETS (see bot.database.query_counter)
+
+Each update is fed through the real dispatcher and middlewares against the
+in-memory database, so a change that adds statements to a handler fails
+here with the statement list.
+"""
+
+from bot.database.query_counter import HANDLER_QUERY_BUDGETS, query_budget
+from bot.utils.callbacks import NEXT_QUESTION, Action, decode
+
+
+def within_budget(run, handler: str, update):
+    with query_budget(HANDLER_QUERY_BUDGETS[handler], handler) as counter:
+        run(update)
+    return counter
+
+
+def answer_buttons(user) -> list:
+    buttons = [decode(data) for data in user.buttons()]
+    return [
+        data
+        for data, callback in zip(user.buttons(), buttons)
+        if callback is not None and callback.action == Action.ANSWER
+    ]
+
+
+def play_quiz(run, user) -> int:
+    """Answer every question with the first option; returns how many were answered"""
+    answered = 0
+    while True:
+        answers = answer_buttons(user)
+        if not answers:
+            return answered
+        within_budget(run, "process_answer", user.press(answers[0]))
+        answered += 1
+        if NEXT_QUESTION in user.buttons():
+            within_budget(run, "next_question", user.press(NEXT_QUESTION))
+
+
+def test_start_within_budget(run, client):
+    # First contact: the user row is created
+    within_budget(run, "cmd_start", client(1001).command("/start"))
+
+
+def test_start_quiz_within_budget(run, client):
+    # First contact again, plus bootstrapping the user's coverage state
+    user = client(1002)
+    within_budget(run, "start_quiz", user.press("quiz_mixed"))
+    assert answer_buttons(user)
+
+
+def test_answers_within_budget(run, client):
+    user = client(1003)
+    run(user.command("/start"))
+    run(user.press("quiz_lexer"))
+    assert play_quiz(run, user) > 1
+    # A second quiz runs on warm caches
+    run(user.press("quiz_mixed"))
+    assert play_quiz(run, user) > 1
+
+
+def test_stats_within_budget(run, client):
+    user = client(1004)
+    run(user.press("quiz_mixed"))
+    play_quiz(run, user)
+    counter = within_budget(run, "cmd_stats", user.command("/stats"))
+    assert counter.count > 0
+    # Rendered once, then served from the view cache until the next answer
+    assert within_budget(run, "cmd_stats", user.command("/stats")).count == 0
+
+
+def test_review_on_cold_queue_within_budget(run, client, monkeypatch):
+    from bot.questions import review
+    from bot.questions.review import review_store
+
+    user = client(1005)
+    run(user.press("quiz_mixed"))
+    play_quiz(run, user)
+    user_id = run(user.user_id())
+
+    # Two days later, after a restart: the queue is read back from review_states
+    now_minutes = review.now_minutes
+    monkeypatch.setattr(review, "now_minutes", lambda moment=None: now_minutes(moment) + 2880)
+    review_store.forget(user_id)
+    within_budget(run, "start_quiz", user.press("quiz_review"))
+    review_store.forget(user_id)
+    assert play_quiz(run, user) > 0
+
+
+def test_daily_within_budget(run, client, monkeypatch):
+    from bot.handlers import daily
+    from bot.questions.daily import DAILY_SIZE
+
+    # A day nobody has opened yet: the first request generates its set
+    monkeypatch.setattr(daily, "today", lambda: "2001-01-01")
+    user = client(1006)
+    within_budget(run, "cmd_daily", user.command("/daily"))
+    assert play_quiz(run, user) == DAILY_SIZE
+
+    within_budget(run, "daily_challenge_callback", client(1007).press("daily_challenge"))
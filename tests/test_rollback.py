@@ -0,0 +1,120 @@
+"""In-memory state stays in step with the database when a commit fails"""
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.database import async_session_maker
+from bot.database.models import CoverageState, User
+from bot.questions.coverage import Coverage, coverage_store
+from bot.questions.daily import DAILY_SIZE, daily_challenges
+from bot.questions.review import review_store
+from bot.utils.callbacks import Action, decode
+
+
+class CommitFailed(Exception):
+    pass
+
+
+@pytest.fixture
+def failing_commit(monkeypatch):
+    """Make the next commit roll back and raise, as on a lost disk write"""
+
+    def arm():
+        async def commit(self):
+            monkeypatch.undo()
+            await self.rollback()
+            raise CommitFailed("disk I/O error")
+
+        monkeypatch.setattr(AsyncSession, "commit", commit)
+
+    return arm
+
+
+def answer_buttons(user) -> list:
+    return [
+        data
+        for data in user.buttons()
+        if (callback := decode(data)) is not None and callback.action == Action.ANSWER
+    ]
+
+
+async def stored_coverage(telegram_id: int):
+    """The user's coverage as stored, or None without a user or coverage row"""
+    async with async_session_maker() as session:
+        data = (
+            await session.execute(
+                select(CoverageState.data)
+                .join(User, User.id == CoverageState.user_id)
+                .where(User.telegram_id == telegram_id)
+            )
+        ).scalar_one_or_none()
+    return Coverage.from_bytes(data) if data is not None else None
+
+
+async def stored_daily_questions(day: str) -> int:
+    async with async_session_maker() as session:
+        return len(await daily_challenges._select_rows(session, day))
+
+
+async def stored_review_entries(user_id: int) -> dict:
+    review_store.forget(user_id)
+    async with async_session_maker() as session:
+        return dict((await review_store.get_queue(session, user_id)).entries)
+
+
+def test_failed_answer_commit_drops_cached_review_queue(run, client, failing_commit):
+    user = client(2001)
+    run(user.press("quiz_mixed"))
+    run(user.press(answer_buttons(user)[0]))
+    user_id = run(user.user_id())
+    run(user.press(user.buttons()[0]))  # next question
+
+    failing_commit()
+    with pytest.raises(CommitFailed):
+        run(user.press(answer_buttons(user)[0]))
+
+    # The rolled back answer must not linger in a queue marked as persisted
+    cached = review_store._cache.get(user_id)
+    stored = run(stored_review_entries(user_id))
+    assert cached is None or cached[0].entries == stored
+    assert len(stored) == 1
+
+    # The claim was released: answering again is recorded
+    run(user.press(answer_buttons(user)[0]))
+    assert len(run(stored_review_entries(user_id))) == 2
+
+
+def test_failed_quiz_start_commit_drops_cached_coverage(run, client, failing_commit):
+    user = client(2002)
+    failing_commit()
+    with pytest.raises(CommitFailed):
+        run(user.press("quiz_mixed"))
+    assert run(stored_coverage(2002)) is None
+
+    # Starting again stores the coverage of the quiz that was actually started
+    run(user.press("quiz_mixed"))
+    stored = run(stored_coverage(2002))
+    assert stored is not None
+    user_id = run(user.user_id())
+    assert stored.to_bytes() == coverage_store._cache[user_id][0].to_bytes()
+    assert len(answer_buttons(user)) > 0
+
+
+def test_failed_daily_start_commit_drops_generated_day(run, client, failing_commit):
+    from bot.handlers import daily
+
+    user = client(2003)
+    # A patch of its own: the failing commit undoes the fixture's monkeypatch
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(daily, "today", lambda: "2001-03-01")
+        failing_commit()
+        with pytest.raises(CommitFailed):
+            run(user.press("daily_challenge"))
+        assert run(stored_daily_questions("2001-03-01")) == 0
+        assert daily_challenges.cached("2001-03-01") is None
+
+        # The next request generates the day again, and this time it is stored
+        run(user.press("daily_challenge"))
+        assert run(stored_daily_questions("2001-03-01")) == DAILY_SIZE
+        assert len(answer_buttons(user)) > 0
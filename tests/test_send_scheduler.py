@@ -0,0 +1,84 @@
+"""SendScheduler keeps bursts within the flood limits of the fake Bot API
+
+Limits and rates are scaled up SCALE times so the bursts take a fraction
+of a second; the ratios between them are the real ones.
+"""
+
+import asyncio
+
+from aiogram import Bot
+from aiogram.methods import EditMessageText, SendMessage
+
+from bot.middlewares.send_scheduler import CHAT_RATE, GLOBAL_RATE, SendScheduler
+from bot.utils.fake_api import FakeTelegramSession
+
+SCALE = 10
+CHATS = 60
+EDITS_PER_CHAT = 5
+# Group chats (negative ids): the per-chat limit applies to them
+GROUPS = list(range(-CHATS, 0))
+
+
+async def burst(bot: Bot):
+    """One message per chat, then a burst of edits to each; returns the results"""
+
+    async def one_chat(chat_id):
+        sent = await bot.send_message(chat_id, "question")
+        return await asyncio.gather(
+            *(
+                bot.edit_message_text(f"edit {i}", chat_id=chat_id, message_id=sent.message_id)
+                for i in range(EDITS_PER_CHAT)
+            )
+        )
+
+    return await asyncio.gather(*(one_chat(chat_id) for chat_id in GROUPS), return_exceptions=True)
+
+
+def test_burst_without_scheduler_hits_flood_limits(run):
+    api = FakeTelegramSession(window=1.0 / SCALE)
+    results = run(burst(Bot(token="42:TEST", session=api)))
+    assert api.rejected > 0
+    assert any(isinstance(result, Exception) for result in results)
+
+
+def test_scheduler_sends_burst_without_flood_errors(run):
+    api = FakeTelegramSession(window=1.0 / SCALE)
+    scheduler = SendScheduler(global_rate=GLOBAL_RATE * SCALE, chat_rate=CHAT_RATE * SCALE)
+    api.middleware(scheduler)
+    try:
+        results = run(burst(Bot(token="42:TEST", session=api)))
+    finally:
+        run(scheduler.close())
+
+    assert api.rejected == 0
+    assert not [result for result in results if isinstance(result, Exception)]
+    sends = [call for call in api.calls if isinstance(call, SendMessage)]
+    assert sorted(call.chat_id for call in sends) == GROUPS
+
+    # Queued edits of a message collapse into the newest one, which is always sent
+    edits = [call for call in api.calls if isinstance(call, EditMessageText)]
+    assert len(edits) + scheduler.coalesced == CHATS * EDITS_PER_CHAT
+    last_edit = {call.chat_id: call.text for call in edits}
+    assert last_edit == {chat_id: f"edit {EDITS_PER_CHAT - 1}" for chat_id in GROUPS}
+
+
+def test_private_chat_replies_are_not_paced(run):
+    api = FakeTelegramSession(window=1.0 / SCALE)
+    scheduler = SendScheduler(global_rate=GLOBAL_RATE * SCALE, chat_rate=CHAT_RATE * SCALE)
+    api.middleware(scheduler)
+    bot = Bot(token="42:TEST", session=api)
+
+    async def replies():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for i in range(EDITS_PER_CHAT):
+            await bot.send_message(42, f"question {i}")
+        return loop.time() - start
+
+    try:
+        elapsed = run(replies())
+    finally:
+        run(scheduler.close())
+    assert api.rejected == 0
+    # Paced like a group, the replies would take (EDITS_PER_CHAT - 1) chat intervals
+    assert elapsed < scheduler.chat_interval
@@ -0,0 +1,129 @@
+"""Settings from the environment and .env reach the code that uses them
+
+For settings read at import, bot.main is imported once, in a fresh
+interpreter whose .env is DOTENV; the tests check what the modules made of
+it (VALUES, evaluated there). Settings read later are set with monkeypatch.
+"""
+
+import ast
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DOTENV = {
+    "ADMIN_IDS": "123,456",
+    "QUIZ_MODE": "polls",
+    "POLL_TTL_MINUTES": "5",
+    "ANSWER_BATCH_SIZE": "50",
+    "ANSWER_FLUSH_INTERVAL": "2",
+    "STATS_CACHE_SIZE": "123",
+    "LOOP_STALL_MS": "40",
+    "LOOP_MONITOR_INTERVAL_MS": "20",
+    "LOOP_STRICT": "1",
+    "PROFILE_DIR": "data/profiles-test",
+    "PROFILE_INTERVAL_MS": "2",
+    "CODEC_BACKEND": "stdlib",
+    "EVENT_LOOP": "asyncio",
+}
+
+VALUES = {
+    "admin_ids": "sorted(bot.handlers.admin.ADMIN_IDS)",
+    "quiz_mode": "bot.handlers.quiz.QUIZ_MODE",
+    "poll_ttl": "bot.utils.polls.poll_map.ttl",
+    "answer_batch": "(bot.main.answer_writer.batch_size, bot.main.answer_writer.interval)",
+    "stats_cache_size": "bot.main.create_dispatcher() and bot.main.stats_views.max_users",
+    "loop_monitor": "(bot.main.loop_monitor.threshold, bot.main.loop_monitor.interval)",
+    "loop_strict": "bot.main.LOOP_STRICT",
+    "profiler": "(str(bot.main.profiler.output_dir), bot.main.profiler.interval)",
+    "codec": "(bot.main.codec.JSON_BACKEND, bot.main.codec.BINARY_BACKEND)",
+    "event_loop": "bot.utils.event_loop.EVENT_LOOP",
+}
+
+
+@pytest.fixture(scope="module")
+def imported(tmp_path_factory) -> dict:
+    dotenv_file = tmp_path_factory.mktemp("settings") / ".env"
+    dotenv_file.write_text("".join(f"{name}={value}\n" for name, value in DOTENV.items()))
+    values = ", ".join(f"{name!r}: {expression}" for name, expression in VALUES.items())
+    script = (
+        "import functools, dotenv\n"
+        f"dotenv.load_dotenv = functools.partial(dotenv.load_dotenv, {str(dotenv_file)!r})\n"
+        "import bot.main\n"
+        f"print(repr({{{values}}}))\n"
+    )
+    environ = {name: value for name, value in os.environ.items() if name not in DOTENV}
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=ROOT,
+        env=environ,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return ast.literal_eval(result.stdout.splitlines()[-1])
+
+
+def test_fsm_storage_limits(monkeypatch):
+    from bot.main import create_storage
+
+    monkeypatch.setenv("FSM_IDLE_TTL_HOURS", "2")
+    monkeypatch.setenv("FSM_MAX_SESSIONS", "500")
+    storage = create_storage()
+    assert (storage.ttl, storage.max_entries) == (7200, 500)
+
+
+def test_answer_retention(monkeypatch):
+    from bot.database import rollups
+
+    monkeypatch.setenv("ROLLUP_INTERVAL_MINUTES", "15")
+    monkeypatch.setenv("ANSWER_RETENTION_DAYS", "400")
+    monkeypatch.setenv("ANSWER_ARCHIVE_DIR", "data/archive")
+    assert rollups.settings() == {
+        "interval": 900,
+        "retention_days": 400,
+        "archive_dir": "data/archive",
+    }
+
+
+def test_question_reload_can_be_turned_off(run, dispatcher, monkeypatch):
+    from bot.main import watch_questions
+    from bot.questions.reload import bank_watcher
+
+    monkeypatch.setattr(bank_watcher, "interval", bank_watcher.interval)
+    monkeypatch.setenv("QUESTION_RELOAD_SECONDS", "0")
+    run(asyncio.wait_for(watch_questions(), timeout=5))  # returns: no polling
+    assert bank_watcher.interval == 0
+
+
+def test_admin_ids(imported):
+    assert imported["admin_ids"] == [123, 456]
+
+
+def test_poll_mode_settings(imported):
+    assert imported["quiz_mode"] == "polls"
+    assert imported["poll_ttl"] == 300
+    assert imported["answer_batch"] == (50, 2.0)
+
+
+def test_stats_cache_size(imported):
+    assert imported["stats_cache_size"] == 123
+
+
+def test_loop_monitor_settings(imported):
+    assert imported["loop_monitor"] == (0.04, 0.02)
+    assert imported["loop_strict"] is True
+
+
+def test_profiler_settings(imported):
+    assert imported["profiler"] == (str(Path("data/profiles-test")), 0.002)
+
+
+def test_codec_and_event_loop_settings(imported):
+    assert imported["codec"] == ("json", "marshal")
+    assert imported["event_loop"] == "asyncio"
@@ -0,0 +1,35 @@
+"""The question snapshot round-trips and its pre-escaped HTML is what handlers render"""
+
+from types import SimpleNamespace
+
+from bot.questions.catalog import get_catalog, question_html
+from bot.questions.loader import QuestionLoader
+from bot.questions.snapshot import FIELDS, HTML_FIELDS, QuestionBank
+from bot.utils.text import escape_html
+
+
+def test_snapshot_round_trip():
+    bank = QuestionLoader().load_bank_from_json(strict=True)
+    digest = bytes(range(32))
+    loaded = QuestionBank.from_bytes(bank.to_bytes(digest), digest)
+    assert loaded is not None
+    assert loaded.records == bank.records
+    assert loaded.by_category == bank.by_category
+    assert loaded.html == bank.html
+    # Stale: the JSON sources changed since the snapshot was built
+    assert QuestionBank.from_bytes(bank.to_bytes(digest), bytes(32)) is None
+
+
+def test_rendering_uses_the_published_html(dispatcher):
+    catalog = get_catalog()
+    question_id, html = next(iter(catalog.html.items()))
+    assert question_html(SimpleNamespace(id=question_id)) is html
+
+    bank = QuestionLoader().load_bank_from_json()
+    record = dict(zip(FIELDS, bank.records[0]))
+    assert bank.html[0] == tuple(escape_html(record[name]) for name in HTML_FIELDS)
+
+
+def test_questions_outside_the_bank_are_escaped_on_the_fly(dispatcher):
+    question = SimpleNamespace(id=-1, question_text="a < b", code=None, explanation="x & y")
+    assert question_html(question) == ("a &lt; b", "", "x &amp; y")